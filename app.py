@@ -1,6 +1,19 @@
+import time
 import streamlit as st
-from views import home, chat, support  # Changed from "pages" to "views"
-from debug_utils import run_diagnostics
+
+# Measure the whole script run, imports included
+_run_started = time.perf_counter()
+
+# The chat, admin and diagnostics pages are imported when first shown, so a new
+# replica renders Home without loading the Gemini and MongoDB SDKs
+from views import home, support  # Changed from "pages" to "views"
+from config import ADMIN_PAGES_ENABLED, METRICS_ADDR, METRICS_PORT
+from services.metrics import REGISTRY, start_http_server
+from services.assets import stylesheet_html, picture_html
+
+start_http_server(METRICS_PORT, METRICS_ADDR)
+_page_seconds = REGISTRY.histogram("page_render_seconds", "Time spent in a page's show()")
+_run_seconds = REGISTRY.histogram("script_run_seconds", "Time of a full Streamlit script run")
 
 # --- Page Configuration ---
 st.set_page_config(
@@ -14,136 +27,15 @@ st.set_page_config(
 CIC_LOGO_URL = "CIC - 20 Years Logo-Final after el 90 amendments-02.png"
 
 # --- Custom CSS ---
-st.markdown(f"""
-<style>
-    /* General Styles */
-    .stApp {{ 
-        /* Add background or other global styles if desired */
-    }}
-
-    /* Sidebar Styles */
-    [data-testid="stSidebar"] > div:first-child {{
-        padding-top: 1rem;
-        display: flex;
-        flex-direction: column;
-        align-items: center; /* Center logo */
-    }}
-    [data-testid="stSidebar"] .sidebar-content {{
-        padding: 1rem;
-    }}
-    [data-testid="stSidebar"] h2 {{
-        text-align: center; /* Center title */
-        margin-top: 1rem;
-        margin-bottom: 1rem;
-    }}
-
-    /* Logo */
-    .sidebar-logo {{
-        width: 80%; /* Adjust size as needed */
-        margin-bottom: 1rem;
-        max-width: 200px; /* Max size */
-    }}
-
-    /* Headers */
-    .main-header {{
-        font-size: 2.2rem; /* Slightly smaller */
-        color: #00447C; /* Dark Blue - Adjust if CIC has specific brand colors */
-        margin-bottom: 0.5rem;
-        border-bottom: 2px solid #00447C;
-        padding-bottom: 0.3rem;
-    }}
-    .sub-header {{
-        font-size: 1.4rem;
-        color: #555;
-        margin-bottom: 1.5rem;
-    }}
-
-    /* Chat Messages */
-    .chat-message {{
-        padding: 0.8rem 1rem;
-        border-radius: 0.5rem;
-        margin-bottom: 0.7rem;
-        color: white;
-        border-left: 5px solid transparent;
-        box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-    }}
-    .user-message {{
-        background-color: #007bff; /* Standard blue for user */
-        border-left-color: #0056b3;
-        margin-left: auto; /* Align user messages to the right */
-        max-width: 75%;
-        text-align: left;
-    }}
-    .bot-message {{
-        background-color: #f0f2f5; /* Light grey for bot */
-        color: #333; /* Darker text for bot */
-        border-left-color: #ccc;
-        margin-right: auto; /* Align bot messages to the left */
-        max-width: 75%;
-        text-align: left;
-    }}
-    .chat-message strong {{
-        display: block;
-        margin-bottom: 0.3rem;
-        font-size: 0.9rem;
-    }}
-    .chat-message a {{
-        color: #0056b3; /* Link color for bot messages */
-    }}
-    .user-message a {{
-        color: #ffffff; /* Link color for user messages */
-        text-decoration: underline;
-    }}
-
-    /* Expander styling */
-    .st-expander {{ 
-        border: 1px solid #ddd;
-        border-radius: 0.5rem;
-        margin-bottom: 1rem;
-    }}
-    .st-expander header {{
-        font-weight: bold;
-        background-color: #f7f7f7;
-        padding: 0.8rem 1rem;
-        border-top-left-radius: 0.5rem;
-        border-top-right-radius: 0.5rem;
-    }}
-
-    /* Button styling */
-    .stButton>button {{
-        border-radius: 0.3rem;
-        /* Add more button styles if needed */
-    }}
-
-</style>
-""", unsafe_allow_html=True)
-
-# --- Sidebar Navigation ---
-# Add custom CSS to modify sidebar appearance
-st.markdown("""
-<style>
-    /* Hide the development menu text items that show up in dev mode if possible */
-    section[data-testid="stSidebarNav"] {
-        visibility: hidden;
-        height: 0;
-        position: absolute;
-    }
-    
-    /* Increase space above logo */
-    [data-testid="stSidebar"] > div:first-child {
-        padding-top: 2rem;
-    }
-    
-    /* Make nav buttons more prominent */
-    .sidebar-nav-button {
-        margin-bottom: 0.8rem;
-        border: none;
-    }
-</style>
-""", unsafe_allow_html=True)
+# The stylesheet lives in assets/app.css; once built it is a cached static file
+st.markdown(stylesheet_html(), unsafe_allow_html=True)
 
 # Logo at top of sidebar
-st.sidebar.image(CIC_LOGO_URL, use_container_width=True, output_format='PNG')
+logo_html = picture_html("logo", "CIC logo", sizes="240px", lazy=False)
+if logo_html:
+    st.sidebar.markdown(logo_html, unsafe_allow_html=True)
+else:
+    st.sidebar.image(CIC_LOGO_URL, use_container_width=True, output_format='PNG')
 
 # Remove Navigation header text and use space instead
 st.sidebar.markdown("&nbsp;", unsafe_allow_html=True)
@@ -151,6 +43,8 @@ st.sidebar.markdown('<div class="sidebar-content">', unsafe_allow_html=True)
 
 # Define page options
 page_options = ["Home", "Chat Assistant", "Contact & Resources"]
+if ADMIN_PAGES_ENABLED:
+    page_options += ["Admin", "Diagnostics"]
 
 # Use session state to manage the current page
 if 'page' not in st.session_state:
@@ -175,15 +69,27 @@ if 'chat_history' not in st.session_state:
 # --- Page Routing ---
 current_page = st.session_state.get('page', "Home")
 
-if current_page == "Home":
-    home.show()
-elif current_page == "Chat Assistant":
-    # Update page title for consistency
-    st.session_state.page = "Chat Assistant" # Ensure state is correct if navigated directly
-    chat.show()
-elif current_page == "Contact & Resources":
-    support.show()
-else:
-    # Default to home if state is invalid
-    st.session_state.page = "Home"
-    home.show()
\ No newline at end of file
+try:
+    # st.rerun() raises out of show(), so the timers are closed in finally blocks
+    with _page_seconds.time(page=current_page):
+        if current_page == "Home":
+            home.show()
+        elif current_page == "Chat Assistant":
+            # Update page title for consistency
+            st.session_state.page = "Chat Assistant" # Ensure state is correct if navigated directly
+            from views import chat
+            chat.show()
+        elif current_page == "Contact & Resources":
+            support.show()
+        elif current_page == "Admin" and ADMIN_PAGES_ENABLED:
+            from views import admin
+            admin.show()
+        elif current_page == "Diagnostics" and ADMIN_PAGES_ENABLED:
+            from debug_utils import run_diagnostics
+            run_diagnostics()
+        else:
+            # Default to home if state is invalid
+            st.session_state.page = "Home"
+            home.show()
+finally:
+    _run_seconds.observe(time.perf_counter() - _run_started)
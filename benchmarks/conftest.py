@@ -0,0 +1,18 @@
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Before config is imported: no metrics port, no spool next to the real one
+os.environ.setdefault("METRICS_PORT", "0")
+os.environ.setdefault("MONGODB_SPOOL_PATH", os.path.join(tempfile.mkdtemp(prefix="cic-bench-"), "spool.sqlite3"))
+os.environ.setdefault("GEMINI_API_KEY", "offline")
+
+sys.path.insert(0, ROOT)
+# app.py loads the logo by a relative path
+os.chdir(ROOT)
+
+from benchmarks import fakes  # noqa: E402
+
+fakes.install()
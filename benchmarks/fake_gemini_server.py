@@ -0,0 +1,151 @@
+"""Local stand-in for the Gemini REST API, for load tests.
+
+Serves `models/<model>:generateContent` and `:streamGenerateContent` (as a
+JSON array, or server-sent events with `alt=sse`) with a configurable
+latency and error distribution. Point the app at it with:
+
+    GEMINI_TRANSPORT=rest GEMINI_API_ENDPOINT=http://127.0.0.1:8089 streamlit run app.py
+
+Usage:
+    python -m benchmarks.fake_gemini_server [--port 8089] [--latency-ms 800] [--error-rate 0.01]
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+class FakeGeminiServer(ThreadingHTTPServer):
+    """HTTP server answering every prompt after a log-normally distributed delay.
+
+    `latency_ms` is the median delay of a full answer and `latency_sigma`
+    the spread of its logarithm (0 for a fixed delay). A fraction
+    `error_rate` of requests fails with `error_status`; streamed answers
+    are split into `chunks` parts spread over the delay.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, port=0, latency_ms=800.0, latency_sigma=0.5, error_rate=0.0, error_status=503,
+                 answer_words=80, chunks=8, seed=None):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.answer_words = answer_words
+        self.chunks = chunks
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="fake-gemini", daemon=True).start()
+        return self
+
+    def sample(self):
+        """Return (delay in seconds, whether to fail) for one request"""
+        with self._lock:
+            self.requests += 1
+            delay = self.latency_ms * math.exp(self._random.gauss(0, self.latency_sigma)) if self.latency_sigma \
+                else self.latency_ms
+            fail = self._random.random() < self.error_rate
+            if fail:
+                self.errors += 1
+        return delay / 1000, fail
+
+
+def _candidate(text, last):
+    candidate = {"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}
+    if last:
+        candidate["finishReason"] = "STOP"
+    return {"candidates": [candidate]}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if ":generateContent" not in url.path and ":streamGenerateContent" not in url.path:
+            self.send_error(404)
+            return
+        delay, fail = self.server.sample()
+        if fail:
+            time.sleep(delay / 4)
+            self._send_json(self.server.error_status, {"error": {
+                "code": self.server.error_status, "message": "Injected failure", "status": "UNAVAILABLE"}})
+            return
+        try:
+            contents = json.loads(body or b"{}").get("contents") or [{}]
+            question = (contents[-1].get("parts") or [{}])[0].get("text", "")
+        except (ValueError, AttributeError):
+            question = ""
+        words = [f"About {question[:40]}:"] + ["CIC"] * self.server.answer_words
+        if ":streamGenerateContent" in url.path:
+            self._stream(words, delay, "sse" in parse_qs(url.query).get("alt", []))
+        else:
+            time.sleep(delay)
+            self._send_json(200, _candidate(" ".join(words), True))
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, words, delay, sse):
+        chunks = max(1, self.server.chunks)
+        size = math.ceil(len(words) / chunks)
+        parts = [" ".join(words[i:i + size]) + " " for i in range(0, len(words), size)]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream" if sse else "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, text in enumerate(parts):
+            time.sleep(delay / len(parts))
+            item = json.dumps(_candidate(text, i == len(parts) - 1))
+            if sse:
+                piece = f"data: {item}\r\n\r\n"
+            else:
+                piece = ("[" if i == 0 else ",\r\n") + item + ("]" if i == len(parts) - 1 else "")
+            self._write_chunk(piece.encode("utf-8"))
+        self._write_chunk(b"")
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Gemini REST API")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=800.0, help="median answer latency")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="log-normal spread (0 = fixed)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of failed requests")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--chunks", type=int, default=8, help="chunks per streamed answer")
+    args = parser.parse_args()
+    server = FakeGeminiServer(args.port, args.latency_ms, args.latency_sigma, args.error_rate,
+                              args.error_status, chunks=args.chunks)
+    print(f"Fake Gemini API listening on {server.url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Offline stand-ins for Gemini and MongoDB used by the benchmarks."""
+import time
+
+import google.generativeai as genai
+import mongomock
+
+
+class FakeResponse:
+    """Mimics a generate_content response, streamed word by word"""
+
+    def __init__(self, text):
+        self.text = text
+
+    def __iter__(self):
+        for word in self.text.split(" "):
+            yield FakeResponse(word + " ")
+
+
+class FakeGenerativeModel:
+    """Answers instantly (or after `latency` seconds) with a deterministic text"""
+
+    latency = 0.0
+    answer_words = 60
+    calls = 0
+
+    def __init__(self, model_name=None, generation_config=None, **kwargs):
+        self.model_name = model_name
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        FakeGenerativeModel.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        question = contents[-1]["parts"][0] if isinstance(contents, list) else str(contents)
+        words = ["CIC"] * self.answer_words
+        return FakeResponse(f"About {question[:40]}: " + " ".join(words))
+
+
+class _Readiness:
+    state = "ready"
+    ready = True
+    error = None
+
+
+def install_mongomock():
+    """Route the app's MongoDB calls to an in-memory mongomock client"""
+    import database.mongodb
+
+    client = mongomock.MongoClient()
+    client.readiness = _Readiness()
+    database.mongodb.get_client = lambda: client
+    return client
+
+
+def install(latency=0.0):
+    """Route the app's Gemini and MongoDB calls to in-process fakes"""
+    FakeGenerativeModel.latency = latency
+    genai.GenerativeModel = FakeGenerativeModel
+    genai.configure = lambda **kwargs: None
+    return install_mongomock()
@@ -0,0 +1,83 @@
+"""Summarize where import time goes, from `python -X importtime`.
+
+Each module is imported in a fresh interpreter, so the numbers are cold
+imports. `app` runs app.py once in Streamlit's bare mode, which covers
+every import the first Home page render needs.
+
+Usage:
+    python -m benchmarks.import_report [app views.chat ...] [--top 15] [--json report.json]
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# SDKs that should only load once the chat or diagnostics path needs them
+HEAVY_PACKAGES = ("google.generativeai", "grpc", "pymongo", "bson")
+
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def import_times(module):
+    """Return [(module, self_us, cumulative_us, depth)] for a cold import of `module`"""
+    env = dict(os.environ, METRICS_PORT="0", PYTHONDONTWRITEBYTECODE="1")
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=ROOT, env=env, capture_output=True, text=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            rows.append((match.group(4), int(match.group(1)), int(match.group(2)), len(match.group(3)) // 2))
+    if result.returncode != 0 and not rows:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    return rows
+
+
+def summarize(module, top=15):
+    rows = import_times(module)
+    by_package = {}
+    for name, self_us, _, _ in rows:
+        package = name.split(".")[0]
+        by_package[package] = by_package.get(package, 0) + self_us
+    loaded = {name for name, _, _, _ in rows}
+    return {
+        "module": module,
+        "total_ms": round(sum(self_us for _, self_us, _, _ in rows) / 1000, 1),
+        "modules": len(rows),
+        "packages_ms": {package: round(us / 1000, 1) for package, us in
+                        sorted(by_package.items(), key=lambda item: -item[1])[:top]},
+        "slowest_ms": {name: round(cumulative / 1000, 1) for name, _, cumulative, _ in
+                       sorted(rows, key=lambda row: -row[2])[:top]},
+        "heavy_loaded": [package for package in HEAVY_PACKAGES
+                         if any(name == package or name.startswith(package + ".") for name in loaded)],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize cold import time per package")
+    parser.add_argument("modules", nargs="*", default=["app"], help="modules to import (default: app)")
+    parser.add_argument("--top", type=int, default=15, help="packages and modules to list")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    reports = [summarize(module, args.top) for module in args.modules]
+    for report in reports:
+        print(f"{report['module']}: {report['total_ms']} ms in {report['modules']} modules")
+        print(f"  heavy packages loaded: {', '.join(report['heavy_loaded']) or 'none'}")
+        print("  self time by package:")
+        for package, ms in report["packages_ms"].items():
+            print(f"    {ms:8.1f} ms  {package}")
+        print("  slowest imports (cumulative):")
+        for name, ms in report["slowest_ms"].items():
+            print(f"    {ms:8.1f} ms  {name}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
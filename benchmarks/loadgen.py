@@ -0,0 +1,248 @@
+"""Concurrent multi-session load generator for capacity planning.
+
+Simulates `--sessions` users asking `--turns` questions each, at the same
+time, through the real GeminiConnector and MongoDBConnector code. Gemini is
+served by the local stand-in in benchmarks/fake_gemini_server.py (started
+in-process unless --gemini-endpoint is given) and MongoDB by mongomock
+unless --mongo-uri points at a local mongod.
+
+Two modes:
+    direct   each session is a thread calling the connectors like the chat page does
+    apptest  each session is a streamlit AppTest instance driving app.py; AppTest
+             is not thread-safe, so script runs are serialized and the latency
+             includes the wait for the other sessions' runs
+
+Each simulated user asks back to back, far faster than a person would, so
+the per-session rate limit (GEMINI_SESSION_RPM) is off unless --session-rpm
+is given; otherwise the run measures that limit instead of capacity. The
+global cap and quota keep the app's settings unless overridden.
+
+Usage:
+    python -m benchmarks.loadgen --sessions 50 --turns 5 [--mode apptest] [--json results.json]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+QUESTIONS = [
+    "What programs are offered at CIC?",
+    "What are the admission requirements for Engineering?",
+    "Tell me about the New Cairo campus.",
+    "How can I apply to CIC?",
+    "What are the tuition fees?",
+    "Can I study part of my degree in Canada?",
+    "What majors are in Mass Communication?",
+    "Is there a Computer Science program?",
+]
+
+
+def _rss_kib():
+    """Resident set size of this process (Linux), falling back to the peak RSS"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(int(q * len(ordered)), len(ordered) - 1)], 1)
+
+
+class Results:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies_ms = []
+        self.first_chunk_ms = []
+        self.errors = 0
+        self.turns = 0
+
+    def record(self, latency_ms, first_chunk_ms=None, error=False):
+        with self._lock:
+            self.turns += 1
+            self.latencies_ms.append(latency_ms)
+            if first_chunk_ms is not None:
+                self.first_chunk_ms.append(first_chunk_ms)
+            if error:
+                self.errors += 1
+
+
+def _question(args, session, turn):
+    question = QUESTIONS[(session + turn) % len(QUESTIONS)]
+    # Unique questions bypass the answer caches and measure the Gemini path itself
+    return f"{question} (session {session}, turn {turn})" if args.unique else question
+
+
+def run_direct_session(args, session, results, start):
+    from database.mongodb import MongoDBConnector
+    from patterns.singleton import GeminiConnector
+
+    gemini = GeminiConnector()
+    db = MongoDBConnector()
+    session_id = f"load-{session}"
+    start.wait()
+    for turn in range(args.turns):
+        question = _question(args, session, turn)
+        started = time.perf_counter()
+        first_chunk_ms = None
+        chunks = []
+        try:
+            for chunk in gemini.get_response_stream(question, session_id=session_id):
+                if first_chunk_ms is None:
+                    first_chunk_ms = (time.perf_counter() - started) * 1000
+                chunks.append(chunk)
+            latency_ms = (time.perf_counter() - started) * 1000
+            db.save_turn(question, "".join(chunks), session_id=session_id, latency_ms=latency_ms)
+            results.record(latency_ms, first_chunk_ms)
+        except Exception:
+            results.record((time.perf_counter() - started) * 1000, error=True)
+        time.sleep(args.think_ms / 1000)
+
+
+# AppTest patches process-wide Streamlit state while a script runs, so runs take turns
+_apptest_lock = threading.Lock()
+# Every AppTest reports the same Streamlit session id; the running session's id is kept here instead
+_apptest_session = ["default"]
+
+
+def _apptest_session_id(default="default"):
+    return _apptest_session[0]
+
+
+def run_apptest_session(args, session, results, start):
+    from streamlit.testing.v1 import AppTest
+
+    with _apptest_lock:
+        _apptest_session[0] = f"load-{session}"
+        at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=120)
+        at.session_state.page = "Chat Assistant"
+        at.run()
+    start.wait()
+    for turn in range(args.turns):
+        at.text_input(key="input_message").input(_question(args, session, turn))
+        started = time.perf_counter()
+        with _apptest_lock:
+            _apptest_session[0] = f"load-{session}"
+            at.button(key="send_button").click().run()
+        latency_ms = (time.perf_counter() - started) * 1000
+        history = at.session_state.chat_history
+        error = bool(at.exception) or not history or history[-1]["content"].startswith("Sorry, I encountered an error")
+        results.record(latency_ms, error=error)
+        time.sleep(args.think_ms / 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate concurrent chat sessions against local stand-ins")
+    parser.add_argument("--sessions", type=int, default=20, help="concurrent sessions")
+    parser.add_argument("--turns", type=int, default=5, help="questions per session")
+    parser.add_argument("--mode", choices=("direct", "apptest"), default="direct")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="pause between a session's questions")
+    parser.add_argument("--unique", action="store_true", help="make every question unique (no cache hits)")
+    parser.add_argument("--gemini-endpoint", help="use a running stand-in instead of starting one")
+    parser.add_argument("--latency-ms", type=float, default=800.0, help="median stand-in answer latency")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="log-normal spread of the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of failed Gemini requests")
+    parser.add_argument("--mongo-uri", help="local mongod to write to (default: mongomock)")
+    parser.add_argument("--max-concurrent", type=int, help="Gemini calls in flight at once (GEMINI_MAX_CONCURRENT)")
+    parser.add_argument("--quota-rpm", type=float, help="Gemini calls started per minute, 0 for no quota "
+                                                        "(GEMINI_QUOTA_RPM)")
+    parser.add_argument("--session-rpm", type=float, default=0.0,
+                        help="calls per minute per session, 0 for no limit (GEMINI_SESSION_RPM, default 0)")
+    parser.add_argument("--session-burst", type=int, help="burst size per session (GEMINI_SESSION_BURST)")
+    parser.add_argument("--queue-deadline", type=float, help="seconds a call may wait for a slot "
+                                                             "(GEMINI_QUEUE_DEADLINE)")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    import google.generativeai as genai
+    if not hasattr(genai, "GenerativeModel"):
+        # GeminiConnector only prints its setup errors, every turn would then fail the same way
+        sys.exit(f"google-generativeai {getattr(genai, '__version__', '?')} has no GenerativeModel, "
+                 f"install the version pinned in requirements.txt")
+
+    server = None
+    if not args.gemini_endpoint:
+        from benchmarks.fake_gemini_server import FakeGeminiServer
+        server = FakeGeminiServer(latency_ms=args.latency_ms, latency_sigma=args.latency_sigma,
+                                  error_rate=args.error_rate).start()
+        args.gemini_endpoint = server.url
+
+    # Configure the app before config.py is imported
+    os.environ["GEMINI_API_ENDPOINT"] = args.gemini_endpoint
+    os.environ["GEMINI_TRANSPORT"] = "rest"
+    os.environ.setdefault("GEMINI_API_KEY", "load-test")
+    os.environ.setdefault("METRICS_PORT", "0")
+    os.environ.setdefault("MONGODB_SPOOL_PATH", os.path.join(tempfile.mkdtemp(prefix="cic-load-"), "spool.sqlite3"))
+    if args.mongo_uri:
+        os.environ["MONGODB_CONNECTION_STRING"] = args.mongo_uri
+    for name, value in (("GEMINI_MAX_CONCURRENT", args.max_concurrent), ("GEMINI_QUOTA_RPM", args.quota_rpm),
+                        ("GEMINI_SESSION_RPM", args.session_rpm), ("GEMINI_SESSION_BURST", args.session_burst),
+                        ("GEMINI_QUEUE_DEADLINE", args.queue_deadline)):
+        if value is not None:
+            os.environ[name] = str(value)
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    if not args.mongo_uri:
+        from benchmarks.fakes import install_mongomock
+        install_mongomock()
+
+    from database.mongodb import get_writer
+    from patterns.singleton import GeminiConnector
+
+    if args.mode == "apptest":
+        import patterns.singleton
+        import views.chat
+        patterns.singleton.current_session_id = _apptest_session_id
+        views.chat.current_session_id = _apptest_session_id
+
+    # Initialize once up front, so the first sessions don't measure startup
+    GeminiConnector()
+    rss_before = _rss_kib()
+
+    results = Results()
+    target = run_apptest_session if args.mode == "apptest" else run_direct_session
+    start = threading.Barrier(args.sessions + 1)
+    threads = [threading.Thread(target=target, args=(args, i, results, start), daemon=True)
+               for i in range(args.sessions)]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    get_writer().flush()
+
+    report = {
+        "mode": args.mode,
+        "sessions": args.sessions,
+        "turns": results.turns,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_turns_per_s": round(results.turns / elapsed, 2) if elapsed else None,
+        "latency_ms": {q: _percentile(results.latencies_ms, p) for q, p in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))},
+        "first_chunk_ms": {q: _percentile(results.first_chunk_ms, p) for q, p in (("p50", 0.5), ("p99", 0.99))},
+        "error_rate": results.errors / results.turns if results.turns else 0.0,
+        "rss_per_session_kib": round((_rss_kib() - rss_before) / args.sessions, 1),
+        "gemini_requests": server.requests if server else None,
+        "session_pool": GeminiConnector().sessions.stats(),
+        "scheduler": GeminiConnector().scheduler.stats(),
+        "writer": get_writer().stats(),
+    }
+    print(json.dumps(report, indent=2, default=str))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Rerun cost of the chat page, driven through AppTest with offline fakes.
+
+Run with:
+    python -m pytest benchmarks --benchmark-json=benchmarks/results/<version>.json
+
+Each result carries the peak Python memory allocated during one rerun in
+`extra_info`, next to pytest-benchmark's wall time statistics.
+"""
+import time
+import tracemalloc
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+from views.chat import DEFAULT_SAMPLE_QUESTIONS
+
+HISTORY_SIZES = (10, 100, 1000)
+
+
+def _history(messages):
+    history = []
+    for i in range(messages):
+        if i % 2 == 0:
+            history.append({"role": "user", "content": f"Question {i} about CIC admissions?", "timestamp": time.time()})
+        else:
+            history.append({"role": "assistant", "content": "CIC answer " * 40, "timestamp": time.time()})
+    return history
+
+
+def _chat_app(messages=0):
+    """A chat page that has already rendered once with `messages` in its history"""
+    at = AppTest.from_file("app.py", default_timeout=60)
+    at.session_state.page = "Chat Assistant"
+    at.session_state.chat_history = _history(messages)
+    at.run()
+    assert not at.exception
+    return at
+
+
+def _peak_kib(func):
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.mark.parametrize("messages", HISTORY_SIZES)
+def test_rerun_with_history(benchmark, messages):
+    at = _chat_app(messages)
+    benchmark.extra_info["messages"] = messages
+    benchmark.extra_info["peak_kib"] = _peak_kib(at.run)
+    benchmark(at.run)
+    assert not at.exception
+    assert len(at.session_state.chat_history) == messages
+
+
+@pytest.mark.parametrize("messages", HISTORY_SIZES)
+def test_send_question(benchmark, messages):
+    def setup():
+        at = _chat_app(messages)
+        at.text_input(key="input_message").input("What are the tuition fees?")
+        return (at,), {}
+
+    def send(at):
+        at.button(key="send_button").click().run()
+        assert not at.exception
+
+    benchmark.extra_info["messages"] = messages
+    benchmark.pedantic(send, setup=setup, rounds=5)
+
+
+def test_sample_question(benchmark):
+    def setup():
+        at = _chat_app(10)
+        at.button(key="show_samples_btn").click().run()
+        return (at,), {}
+
+    def ask_sample(at):
+        at.button(key=f"sample_{DEFAULT_SAMPLE_QUESTIONS[0]}").click().run()
+        assert not at.exception
+
+    benchmark.pedantic(ask_sample, setup=setup, rounds=5)
+
+
+def test_toggle_samples(benchmark):
+    at = _chat_app(10)
+
+    def toggle():
+        at.button(key="show_samples_btn").click().run()
+        assert not at.exception
+
+    benchmark(toggle)
+
+
+def test_prefill_from_home(benchmark):
+    def setup():
+        at = _chat_app(10)
+        at.session_state.prefill_chat = "Tell me about the admission process"
+        return (at,), {}
+
+    def open_chat(at):
+        at.run()
+        assert not at.exception
+
+    benchmark.pedantic(open_chat, setup=setup, rounds=5)
@@ -0,0 +1,132 @@
+"""Isolation of event bus observers, and that durable transcripts are never dropped.
+
+A hung observer may hold one worker thread, never the whole pool, and
+the threads and queue stay bounded however many events keep arriving.
+"""
+import threading
+import time
+
+from patterns.observer import (ChatObserver, DatabaseChatObserver, EventBus, EventDispatcher,
+                               RESPONSE_READY)
+
+
+class Hung(ChatObserver):
+    def __init__(self, release):
+        self.release = release
+
+    def update(self, message):
+        self.release.wait()
+
+
+class Recorder(ChatObserver):
+    def __init__(self):
+        self.seen = []
+
+    def update(self, message):
+        self.seen.append(message["n"])
+
+
+def _wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_hung_observer_does_not_starve_the_others():
+    release = threading.Event()
+    dispatcher = EventDispatcher(workers=2, max_queue=100, watch_interval=0.01)
+    bus = EventBus("session", dispatcher)
+    recorder = Recorder()
+    bus.subscribe(Hung(release), timeout=0.05)
+    bus.subscribe(recorder, timeout=0.05)
+    try:
+        for n in range(50):
+            bus.publish(RESPONSE_READY, n=n, question="q", answer="a")
+        assert _wait_for(lambda: len(recorder.seen) == 50)
+        stats = dispatcher.stats()
+        # Calls that started before the first timeout was noticed hang too, one per worker at most;
+        # each gets a replacement worker and later deliveries to the hung observer are skipped
+        assert 1 <= stats["timeouts"] <= 2
+        assert stats["threads"] == 2 + stats["timeouts"]
+        assert stats["skipped"] == 50 - stats["timeouts"]
+    finally:
+        release.set()
+    assert _wait_for(lambda: dispatcher.stats()["threads"] == 2 and dispatcher.stats()["stuck"] == 0)
+
+
+def test_threads_stay_bounded():
+    release = threading.Event()
+    dispatcher = EventDispatcher(workers=2, max_queue=10, watch_interval=0.01, max_stuck=2)
+
+    def hung_kind():
+        return type("HungKind", (Hung,), {})(release)
+
+    try:
+        buses = []
+        for _ in range(6):
+            bus = EventBus("session", dispatcher)
+            bus.subscribe(hung_kind(), timeout=0.02)
+            buses.append(bus)
+        for bus in buses:
+            bus.publish(RESPONSE_READY, question="q", answer="a")
+        time.sleep(0.3)
+        assert dispatcher.stats()["threads"] <= 4
+    finally:
+        release.set()
+
+
+class Db:
+    def __init__(self):
+        self.saved = []
+
+    def save_turn(self, question, answer, **fields):
+        self.saved.append(question)
+
+
+def test_transcripts_survive_a_full_queue():
+    release = threading.Event()
+    dispatcher = EventDispatcher(workers=1, max_queue=2, block_timeout=0, watch_interval=0.01)
+    bus = EventBus("session", dispatcher)
+    db = Db()
+    bus.subscribe(Hung(release), timeout=None)
+    bus.subscribe(DatabaseChatObserver(db), RESPONSE_READY, durable=True)
+    try:
+        for n in range(20):
+            bus.publish(RESPONSE_READY, question=f"q{n}", answer="a")
+        stats = dispatcher.stats()
+        # The hung observer's events are dropped, the transcripts are saved on the publisher's thread
+        assert stats["dropped"] > 0 and stats["inline"] > 0
+    finally:
+        release.set()
+    assert _wait_for(lambda: len(db.saved) == 20)
+    assert sorted(db.saved) == sorted(f"q{n}" for n in range(20))
+
+
+def test_transcripts_are_saved_while_their_observer_is_stuck():
+    release = threading.Event()
+    calls = []
+
+    class SlowDb(Db):
+        def save_turn(self, question, answer, **fields):
+            calls.append(question)
+            if len(calls) == 1:
+                release.wait()
+            super().save_turn(question, answer)
+
+    dispatcher = EventDispatcher(workers=2, max_queue=100, watch_interval=0.01)
+    bus = EventBus("session", dispatcher)
+    db = SlowDb()
+    bus.subscribe(DatabaseChatObserver(db), RESPONSE_READY, timeout=0.02, durable=True)
+    try:
+        bus.publish(RESPONSE_READY, question="q0", answer="a")
+        assert _wait_for(lambda: dispatcher.stats()["stuck"] == 1)
+        for n in range(1, 10):
+            bus.publish(RESPONSE_READY, question=f"q{n}", answer="a")
+        assert _wait_for(lambda: len(db.saved) == 9)
+        assert dispatcher.stats()["skipped"] == 0
+    finally:
+        release.set()
+    assert _wait_for(lambda: len(db.saved) == 10)
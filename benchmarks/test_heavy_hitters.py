@@ -0,0 +1,71 @@
+"""Question counting for the sample questions: distinct askers, curated texts only.
+
+The chat page reads the counts on every render of the samples, so they
+must come from memory, never from a MongoDB query on the script thread.
+"""
+import mongomock
+
+from services.heavy_hitters import HeavyHitters
+from views.chat import CURATED_SAMPLE_QUESTIONS, DEFAULT_SAMPLE_QUESTIONS, _sample_questions
+
+
+class _Connector:
+    def __init__(self, heavy_hitters):
+        self.heavy_hitters = heavy_hitters
+
+
+def _counts():
+    return HeavyHitters(lambda: None, capacity=50)
+
+
+def test_repeats_from_one_session_count_once():
+    counts = _counts()
+    for _ in range(10):
+        counts.record("Visit http://spam.example now", session_id="one")
+    top = counts.top(5, "day")
+    assert top[0]["count"] == 10
+    assert top[0]["sessions"] == 1
+
+
+def test_user_text_is_never_a_sample():
+    counts = _counts()
+    for session in range(20):
+        counts.record("Visit http://spam.example now", session_id=f"s{session}")
+    assert _sample_questions(_Connector(counts)) == DEFAULT_SAMPLE_QUESTIONS
+
+
+def test_popular_curated_questions_move_up():
+    counts = _counts()
+    extra = CURATED_SAMPLE_QUESTIONS[-1]
+    for session in range(5):
+        counts.record(extra.lower().rstrip("?"), session_id=f"s{session}")
+    # One persistent visitor does not move a question up
+    for _ in range(5):
+        counts.record("How can I contact CIC?", session_id="persistent")
+    samples = _sample_questions(_Connector(counts))
+    assert samples[0] == extra
+    assert "How can I contact CIC?" not in samples
+    assert len(samples) == len(DEFAULT_SAMPLE_QUESTIONS)
+
+
+def test_top_reads_other_replicas_from_memory():
+    db = mongomock.MongoClient().db
+    other = HeavyHitters(lambda: db.counts)
+    other._collection = db.counts
+    other.replica = "other-replica"
+    for session in range(3):
+        other.record("What is the Dual Program?", session_id=f"s{session}")
+    other._flush()
+
+    counts = HeavyHitters(lambda: db.counts)
+    counts._collection = db.counts
+    counts._load_shared()
+
+    class Down:
+        def find(self, *args, **kwargs):
+            raise AssertionError("top() queried MongoDB")
+
+    counts._collection = Down()
+    top = counts.top(5, "day")
+    assert top[0]["key"] == "what is the dual program"
+    assert top[0]["sessions"] == 3
@@ -0,0 +1,83 @@
+"""Per-message cost of keyword classification as the vocabularies grow.
+
+The shipped vocabularies are compared with ones a hundred times larger
+(made-up English and Arabic words added to every list). A compiled trie
+pattern should keep the per-message time nearly flat.
+"""
+import random
+import string
+
+import pytest
+
+from services.keywords import KeywordClassifier, get_classifier
+
+GROWTH = 100
+
+MESSAGES = [
+    "How do I apply to CIC and what are the tuition fees for engineering?",
+    "Thanks, that was really helpful! Goodbye",
+    "I get an error when the system update runs, the installation doesn't work",
+    "شكرا جزيلا كان مفيدا",
+    "الموقع مش شغال وفي خطأ",
+    "What programs does the School of Business Technology offer in Sheikh Zayed?",
+] * 50
+
+
+def _word(rng, letters, length):
+    return "".join(rng.choice(letters) for _ in range(length))
+
+
+def _grown(vocabulary, factor, rng):
+    """`vocabulary` with every word list made `factor` times longer"""
+    arabic = [chr(c) for c in range(0x0628, 0x063b)]
+
+    def more(words):
+        extra = []
+        for i in range(len(words) * (factor - 1) + factor):
+            letters = arabic if i % 3 == 0 else string.ascii_lowercase
+            extra.append(_word(rng, letters, rng.randint(5, 10)))
+        return list(words) + extra
+
+    return {
+        "handlers": {name: more(words) for name, words in vocabulary["handlers"].items()},
+        "technical_terms": {name: more(variants) for name, variants in vocabulary["technical_terms"].items()},
+        "sentiment": {name: more(words) for name, words in vocabulary["sentiment"].items()},
+    }
+
+
+def _classifier(growth):
+    base = get_classifier()
+    if growth == 1:
+        return base
+    return KeywordClassifier(_grown(base.vocabulary, growth, random.Random(3)))
+
+
+@pytest.mark.parametrize("growth", (1, GROWTH))
+def test_classify(benchmark, growth):
+    classifier = _classifier(growth)
+    benchmark.extra_info["keywords"] = len(classifier.matcher)
+    results = benchmark(lambda: [classifier.classify(message) for message in MESSAGES])
+    # Growing the vocabularies only adds made-up words, so nothing changes
+    assert [r.handler for r in results] == [r.handler for r in get_classifier().classify_many(MESSAGES)]
+
+
+@pytest.mark.parametrize("growth", (1, GROWTH))
+def test_classify_many(benchmark, growth):
+    classifier = _classifier(growth)
+    benchmark.extra_info["keywords"] = len(classifier.matcher)
+    results = benchmark(classifier.classify_many, MESSAGES)
+    assert [r.sentiment for r in results[:3]] == ["neutral", "positive", "neutral"]
+    assert results[2].keywords == ["error", "system", "update", "installation"]
+
+
+@pytest.mark.parametrize("message, handler, keywords", [
+    ("How can I apply?", "standard", []),
+    ("كيف اقدم في الكلية؟", "standard", []),
+    ("ازاي اقدم؟", "standard", []),
+    ("ما هي البرامج المتاحة", "standard", []),
+    ("ازاي أصلح المشكلة دي", "technical", []),
+    ("كيف أحل خطأ التثبيت", "technical", ["error", "installation"]),
+])
+def test_admissions_questions_are_not_technical(message, handler, keywords):
+    result = get_classifier().classify(message)
+    assert (result.handler, result.keywords) == (handler, keywords)
@@ -0,0 +1,111 @@
+"""Tail latency of Gemini calls through the resilience layer, with a simulated upstream.
+
+One call in 20 is slow (a straggler) and, in the retry case, one in 10
+fails with a retryable 503. Hedging should cut the p99 to roughly the
+p95 delay plus one fast call; retries should hide the transient errors.
+"""
+import random
+import threading
+import time
+
+from services.resilience import CircuitBreaker, CircuitOpenError, ResilientCaller
+from services.scheduler import FairScheduler
+
+FAST_S = 0.005
+SLOW_S = 0.25
+CALLS = 200
+
+
+class Unavailable(Exception):
+    code = 503
+
+
+class Upstream:
+    def __init__(self, slow_rate=0.05, error_rate=0.0, seed=7):
+        self.slow_rate = slow_rate
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __call__(self, timeout):
+        with self._lock:
+            roll = self._rng.random()
+        if roll < self.error_rate:
+            raise Unavailable("503 Service Unavailable")
+        time.sleep(min(timeout, SLOW_S if roll > 1 - self.slow_rate else FAST_S))
+        yield "answer"
+
+
+def _p99(caller, upstream):
+    latencies = []
+    for _ in range(CALLS):
+        started = time.perf_counter()
+        assert caller.call(upstream) == "answer"
+        latencies.append(time.perf_counter() - started)
+    return sorted(latencies)[int(0.99 * len(latencies))]
+
+
+def _caller(**kwargs):
+    return ResilientCaller("bench", CircuitBreaker("bench", failure_threshold=1000), deadline=5.0,
+                           backoff_base=0.001, backoff_cap=0.01, hedge_min_samples=20,
+                           rng=random.Random(1), **kwargs)
+
+
+def test_tail_without_hedging(benchmark):
+    results = []
+    benchmark.pedantic(lambda: results.append(_p99(_caller(), Upstream())), rounds=1, iterations=1)
+    benchmark.extra_info["p99_s"] = round(results[-1], 4)
+    assert results[-1] >= SLOW_S
+
+
+def test_tail_with_hedging(benchmark):
+    results = []
+    benchmark.pedantic(lambda: results.append(_p99(_caller(hedging=True, hedge_quantile=0.9), Upstream())),
+                       rounds=1, iterations=1)
+    benchmark.extra_info["p99_s"] = round(results[-1], 4)
+    assert results[-1] < SLOW_S
+
+
+def test_retries_hide_transient_errors(benchmark):
+    results = []
+    benchmark.pedantic(lambda: results.append(_p99(_caller(max_attempts=4), Upstream(error_rate=0.1))),
+                       rounds=1, iterations=1)
+    benchmark.extra_info["p99_s"] = round(results[-1], 4)
+
+
+def test_breaker_fails_fast():
+    breaker = CircuitBreaker("bench", failure_threshold=2, reset_timeout=60)
+    caller = ResilientCaller("bench", breaker, max_attempts=1)
+    for _ in range(2):
+        try:
+            caller.call(Upstream(error_rate=1.0))
+        except Unavailable:
+            pass
+    assert breaker.stats()["state"] == "open"
+    started = time.perf_counter()
+    try:
+        caller.call(Upstream())
+        raise AssertionError("the open breaker let a call through")
+    except CircuitOpenError:
+        pass
+    assert time.perf_counter() - started < 0.05
+
+
+def test_summaries_have_a_deadline_and_retries():
+    from patterns.singleton import GeminiConnector
+
+    class Model:
+        timeouts = []
+
+        def generate_content(self, contents, request_options=None, **kwargs):
+            self.timeouts.append(request_options["timeout"])
+            if len(self.timeouts) == 1:
+                raise Unavailable("503 Service Unavailable")
+            return type("Response", (), {"text": "summary"})()
+
+    connector = GeminiConnector.__new__(GeminiConnector)
+    connector.model = Model()
+    connector.resilience = _caller(max_attempts=2)
+    connector.scheduler = FairScheduler()
+    assert connector._summarize("Summarize this") == "summary"
+    assert len(Model.timeouts) == 2 and all(0 < t <= 5.0 for t in Model.timeouts)
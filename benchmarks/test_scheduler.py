@@ -0,0 +1,111 @@
+"""Throughput and fairness of the Gemini call scheduler under a quota.
+
+One session floods the queue while a few others ask a question each.
+Calls should start at the quota rate, without bursts above it, and the
+other sessions should not wait behind the whole flood.
+"""
+import threading
+import time
+
+from services.scheduler import FairScheduler, SchedulerOverloaded
+
+QUOTA_PER_S = 50.0
+CALL_S = 0.01
+
+
+def _flood(scheduler, flood=100, others=10):
+    starts = []
+    waits = {}
+    lock = threading.Lock()
+
+    def call(session_id):
+        queued_at = time.monotonic()
+        try:
+            with scheduler.slot(session_id):
+                with lock:
+                    starts.append(time.monotonic())
+                    waits.setdefault(session_id, []).append(time.monotonic() - queued_at)
+                time.sleep(CALL_S)
+        except SchedulerOverloaded:
+            pass
+
+    threads = [threading.Thread(target=call, args=("flood",)) for _ in range(flood)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    late = [threading.Thread(target=call, args=(f"user{i}",)) for i in range(others)]
+    for thread in late:
+        thread.start()
+    for thread in threads + late:
+        thread.join()
+    return sorted(starts), waits
+
+
+def test_flood_under_quota(benchmark):
+    scheduler = FairScheduler(max_concurrent=8, global_rate=QUOTA_PER_S, queue_deadline=30)
+    results = []
+    benchmark.pedantic(lambda: results.append(_flood(scheduler)), rounds=1, iterations=1)
+    starts, waits = results[-1]
+    elapsed = starts[-1] - starts[0]
+    rate = (len(starts) - QUOTA_PER_S) / elapsed  # past the initial burst of one second's quota
+    user_waits = [wait for session_id, session_waits in waits.items() if session_id != "flood"
+                  for wait in session_waits]
+    benchmark.extra_info["calls_per_s"] = round(rate, 1)
+    benchmark.extra_info["max_user_wait_s"] = round(max(user_waits), 3)
+    benchmark.extra_info["max_flood_wait_s"] = round(max(waits["flood"]), 3)
+    assert rate <= QUOTA_PER_S * 1.1
+    # Ten other sessions are served within about one round of the ring, not after the flood
+    assert max(user_waits) < max(waits["flood"]) / 2
+
+
+def test_sheds_past_the_deadline():
+    scheduler = FairScheduler(max_concurrent=1, queue_deadline=0.2, initial_service_time=0.1)
+    starts, _ = _flood(scheduler, flood=20, others=0)
+    stats = scheduler.stats()
+    assert stats["shed"] > 0
+    assert stats["granted"] == len(starts) < 20
+
+
+def test_background_waits_for_queued_sessions():
+    scheduler = FairScheduler(max_concurrent=1, session_rate=1.0, session_burst=1, queue_deadline=5)
+    order = []
+    holder = scheduler.acquire("user0")
+
+    def call(session_id, background=False):
+        with scheduler.slot(session_id, background=background):
+            order.append(session_id)
+
+    threads = [threading.Thread(target=call, args=("summarizer", True))]
+    threads += [threading.Thread(target=call, args=(f"user{i}",)) for i in (1, 2)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.02)
+    scheduler.release(holder)
+    for thread in threads:
+        thread.join()
+    # Queued first, served last, and not held back by any session's rate
+    assert order == ["user1", "user2", "summarizer"]
+    assert scheduler.stats()["background_queued"] == 0
+
+
+class Rerun(BaseException):
+    """Stands in for Streamlit's RerunException, raised from the queue callback"""
+
+
+def test_raising_callback_gives_back_its_place():
+    scheduler = FairScheduler(max_concurrent=1, queue_deadline=5)
+    holder = scheduler.acquire("user0")
+
+    def on_wait(position, eta):
+        raise Rerun()
+
+    try:
+        scheduler.acquire("user1", on_wait)
+        raise AssertionError("on_wait was not called")
+    except Rerun:
+        pass
+    assert scheduler.stats()["queued"] == 0
+    scheduler.release(holder)
+    assert scheduler.stats()["in_use"] == 0
+    with scheduler.slot("user2"):
+        assert scheduler.stats()["in_use"] == 1
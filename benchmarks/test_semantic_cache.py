@@ -0,0 +1,114 @@
+"""Which cached answers the semantic cache serves, and which it must not.
+
+Near misses differ in one content word (a school, a campus, a year) and
+score high on the hashed n-gram vectors; they must never share answers.
+"""
+import time
+from datetime import datetime, timedelta, timezone
+
+import mongomock
+import pytest
+
+from config import SEMANTIC_CACHE_THRESHOLD
+from services.semantic_cache import SemanticCache, same_subject
+from services.normalize import normalize_query
+
+NEAR_MISSES = [
+    ("What are the admission requirements for Engineering?", "What are the admission requirements for Business?"),
+    ("Where is the New Cairo campus?", "Where is the Sheikh Zayed campus?"),
+    ("What majors are in Mass Communication?", "What majors are in Computer Science?"),
+    ("What were the fees in 2024?", "What were the fees in 2025?"),
+    ("Is there a Dual Program in Engineering?", "Is there a Dual Program in Engineering and Business?"),
+    ("مصاريف الهندسه",
+     "مصاريف الاعلام"),
+]
+
+REWORDINGS = [
+    ("What are the admission requirements for Engineering?", "what are admission requirements for engineering"),
+    ("What are the admission requirements for Engineering?", "What are the admision requirements for Engineering"),
+    ("Where is the New Cairo campus located?", "Where is the New Cairo campus located please"),
+    ("What scholarships are available for Engineering students?",
+     "What scholarships are available to Engineering students?"),
+]
+
+
+def _cache(threshold=SEMANTIC_CACHE_THRESHOLD):
+    # Never started, so it only serves what is added locally
+    return SemanticCache(lambda: None, "test", threshold=threshold)
+
+
+@pytest.mark.parametrize("cached, asked", NEAR_MISSES)
+def test_near_misses_are_not_served(cached, asked):
+    cache = _cache()
+    cache.add(cached, "cached answer")
+    assert cache.lookup(asked) is None
+    assert not same_subject(normalize_query(cached), normalize_query(asked))
+
+
+@pytest.mark.parametrize("cached, asked", NEAR_MISSES)
+def test_near_misses_are_not_served_at_any_threshold(cached, asked):
+    cache = _cache(threshold=0.0)
+    cache.add(cached, "cached answer")
+    assert cache.lookup(asked) is None
+
+
+@pytest.mark.parametrize("cached, asked", REWORDINGS)
+def test_rewordings_are_served(cached, asked):
+    cache = _cache()
+    cache.add(cached, "cached answer")
+    assert cache.lookup(asked) == "cached answer"
+
+
+def test_best_candidate_with_the_same_subject_wins():
+    cache = _cache(threshold=0.5)
+    cache.add("What are the admission requirements for Business?", "business")
+    cache.add("What are the admission requirements for Engineering?", "engineering")
+    assert cache.lookup("what are the admission requirements for engineering") == "engineering"
+
+
+def test_default_threshold_is_safe():
+    assert SEMANTIC_CACHE_THRESHOLD >= 0.9
+
+
+def test_full_cache_evicts_the_least_recently_used():
+    cache = SemanticCache(lambda: None, "test", max_entries=2)
+    cache.add("Where is the New Cairo campus?", "new cairo")
+    cache.add("Where is the Sheikh Zayed campus?", "sheikh zayed")
+    assert cache.lookup("Where is the New Cairo campus?") == "new cairo"
+    cache.add("What majors are in Mass Communication?", "mass communication")
+    assert len(cache) == 2
+    assert cache.stats()["evictions"] == 1
+    assert cache.lookup("Where is the Sheikh Zayed campus?") is None
+    assert cache.lookup("Where is the New Cairo campus?") == "new cairo"
+    assert cache.lookup("What majors are in Mass Communication?") == "mass communication"
+
+
+def test_expired_answers_are_not_served_and_are_replaced():
+    cache = SemanticCache(lambda: None, "test", ttl=0.05)
+    cache.add("What are the tuition fees?", "old fees")
+    assert cache.lookup("What are the tuition fees?") == "old fees"
+    time.sleep(0.1)
+    assert cache.lookup("What are the tuition fees?") is None
+    cache.add("What are the tuition fees?", "new fees")
+    assert len(cache) == 1
+    assert cache.lookup("What are the tuition fees?") == "new fees"
+
+
+def test_shared_entries_expire_in_mongodb():
+    collection = mongomock.MongoClient().db.semantic_cache
+    cache = SemanticCache(lambda: collection, "test", ttl=3600)
+    cache._ensure_indexes(collection)
+    ttl_indexes = [index for index in collection.index_information().values() if "expireAfterSeconds" in index]
+    assert ttl_indexes == [dict(ttl_indexes[0], key=[("created_at", 1)], expireAfterSeconds=3600)]
+
+    cache._collection = collection
+    cache.add("Where is the New Cairo campus?", "new cairo")
+    cache._flush_pending()
+    stale = dict(collection.find_one(), _id="stale", normalized="stale question",
+                 created_at=datetime.now(timezone.utc) - timedelta(hours=2))
+    collection.insert_one(stale)
+    other = SemanticCache(lambda: collection, "test", ttl=3600)
+    other._collection = collection
+    other._refresh()
+    assert len(other) == 1
+    assert other.lookup("Where is the New Cairo campus?") == "new cairo"
@@ -0,0 +1,52 @@
+"""Size accounting of pooled conversations.
+
+The byte cap of the session pool should track what a conversation holds
+now, so a long conversation that has been folded into a summary is not
+evicted for traffic it no longer keeps.
+"""
+import time
+
+from services.context_window import ConversationWindow
+from services.session_pool import ChatSessionPool
+
+
+def _pool(**kwargs):
+    return ChatSessionPool(lambda: ConversationWindow(lambda prompt: "short summary", token_budget=200,
+                                                      keep_turns=2), **kwargs)
+
+
+def _talk(entry, turns):
+    """Add `turns` long exchanges, letting each fold finish; return the characters sent"""
+    sent = 0
+    for n in range(turns):
+        question, answer = f"question {n}", "answer " * 40
+        entry.conversation.add_turn(question, answer)
+        entry.record_turn(question, answer)
+        sent += len(question) + len(answer)
+        deadline = time.monotonic() + 5
+        while entry.conversation._summarizing:
+            assert time.monotonic() < deadline, "the summary was never written"
+            time.sleep(0.01)
+    return sent
+
+
+def test_size_shrinks_when_history_is_folded():
+    pool = _pool()
+    entry = pool.get("user")
+    sent = _talk(entry, 10)
+    window = entry.conversation
+    assert window.summary == "short summary"
+    assert entry.size == len(window.summary) + sum(len(q) + len(a) for q, a in window.turns)
+    assert entry.size < sent / 2
+    assert pool.stats()["bytes"] == entry.size
+
+
+def test_byte_cap_keeps_compacted_sessions():
+    pool = _pool(max_bytes=1000)
+    compacted = pool.get("compacted")
+    assert _talk(compacted, 10) > pool.max_bytes
+    fresh = pool.get("fresh")
+    _talk(fresh, 1)
+    pool.touch(fresh)
+    assert pool.peek("compacted") is compacted
+    assert pool.stats()["evictions"] == 0
@@ -0,0 +1,47 @@
+"""Cold start of a new replica: a fresh interpreter rendering the Home page.
+
+Each round starts a new Python process, so imports are never cached in
+`sys.modules`. The Gemini and MongoDB SDKs must not be needed to show Home.
+"""
+import json
+import os
+import subprocess
+import sys
+
+from benchmarks.import_report import HEAVY_PACKAGES, ROOT, summarize
+
+_COLD_START = """
+import json, sys, time
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file("app.py", default_timeout=60)
+at.run()
+print(json.dumps({
+    "seconds": time.perf_counter() - started,
+    "exception": [str(e.value) for e in at.exception],
+    "heavy_loaded": [name for name in %r if name in sys.modules],
+}))
+"""
+
+
+def _cold_start():
+    result = subprocess.run([sys.executable, "-c", _COLD_START % (HEAVY_PACKAGES,)], cwd=ROOT,
+                            env=dict(os.environ), capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr[-2000:]
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_cold_start_home(benchmark):
+    runs = []
+    benchmark.pedantic(lambda: runs.append(_cold_start()), rounds=3, iterations=1)
+    benchmark.extra_info["first_render_s"] = [round(run["seconds"], 3) for run in runs]
+    assert not runs[-1]["exception"]
+    assert runs[-1]["heavy_loaded"] == []
+
+
+def test_import_app(benchmark):
+    reports = []
+    benchmark.pedantic(lambda: reports.append(summarize("app")), rounds=3, iterations=1)
+    benchmark.extra_info["import_ms"] = [report["total_ms"] for report in reports]
+    benchmark.extra_info["modules"] = reports[-1]["modules"]
+    assert reports[-1]["heavy_loaded"] == []
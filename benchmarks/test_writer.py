@@ -0,0 +1,147 @@
+"""Overflow policies of the batched MongoDB writer, and spool replay.
+
+Without start() the writer has no worker, so its queue fills up
+deterministically and each overflow policy can be checked on its own.
+"""
+import threading
+import time
+
+import mongomock
+import pytest
+
+from database.spool import Spool, SpoolReplayer
+from database.writer import BatchWriter
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient().db
+
+
+@pytest.fixture
+def spool(tmp_path):
+    return Spool(str(tmp_path / "spool.sqlite3"))
+
+
+def _queued(writer):
+    return [doc["n"] for _, doc in writer._queue]
+
+
+def test_drop_newest(db):
+    writer = BatchWriter(db.get_collection, max_queue=1, overflow="drop_newest")
+    assert writer.submit("turns", {"n": 1})
+    assert not writer.submit("turns", {"n": 2})
+    assert _queued(writer) == [1]
+    assert writer.stats()["dropped"] == 1
+
+
+def test_drop_oldest(db):
+    writer = BatchWriter(db.get_collection, max_queue=1, overflow="drop_oldest")
+    assert writer.submit("turns", {"n": 1})
+    assert writer.submit("turns", {"n": 2})
+    assert _queued(writer) == [2]
+    assert writer.stats()["dropped"] == 1
+
+
+def test_block_times_out(db):
+    writer = BatchWriter(db.get_collection, max_queue=1, overflow="block", block_timeout=0.05)
+    assert writer.submit("turns", {"n": 1})
+    started = time.monotonic()
+    assert not writer.submit("turns", {"n": 2})
+    assert time.monotonic() - started >= 0.05
+    assert _queued(writer) == [1]
+
+
+def test_block_waits_for_room(db):
+    writer = BatchWriter(db.get_collection, max_queue=1, overflow="block", block_timeout=1.0)
+    assert writer.submit("turns", {"n": 1})
+
+    def make_room():
+        time.sleep(0.05)
+        with writer._cond:
+            writer._queue.popleft()
+            writer._cond.notify_all()
+
+    threading.Thread(target=make_room).start()
+    assert writer.submit("turns", {"n": 2})
+    assert _queued(writer) == [2]
+    assert writer.stats()["dropped"] == 0
+
+
+def test_spool_when_full(db, spool):
+    writer = BatchWriter(db.get_collection, max_queue=1, overflow="spool", spool=spool)
+    assert writer.submit("turns", {"n": 1})
+    assert writer.submit("turns", {"n": 2})
+    assert _queued(writer) == [1]
+    assert [doc["n"] for _, _, doc in spool.peek()] == [2]
+
+
+def test_spool_policy_needs_a_spool(db):
+    with pytest.raises(ValueError):
+        BatchWriter(db.get_collection, overflow="spool")
+
+
+@pytest.mark.parametrize("overflow", ["spool", "block", "drop_newest", "drop_oldest"])
+def test_writes_everything_while_keeping_up(db, spool, overflow):
+    writer = BatchWriter(db.get_collection, batch_size=10, flush_interval=0.01, max_queue=1000,
+                         overflow=overflow, spool=spool).start()
+    for n in range(200):
+        assert writer.submit("turns", {"n": n})
+    assert writer.close()
+    assert db.turns.count_documents({}) == 200
+    assert spool.stats()["spooled"] == 0
+
+
+def test_spools_while_unavailable_then_replays(db, spool):
+    available = [False]
+    writer = BatchWriter(db.get_collection, batch_size=10, flush_interval=0.01, overflow="spool",
+                         spool=spool, is_available=lambda: available[0]).start()
+    for n in range(25):
+        writer.submit("turns", {"n": n})
+    assert writer.flush()
+    assert db.turns.count_documents({}) == 0
+    assert spool.stats()["spooled"] == 25
+
+    available[0] = True
+    replayer = SpoolReplayer(spool, writer.write_group, lambda: available[0], batch_size=10)
+    while replayer.replay_batch():
+        pass
+    assert sorted(doc["n"] for doc in db.turns.find()) == list(range(25))
+    assert spool.stats()["spooled"] == 0
+    assert replayer.replayed == 25
+
+
+def test_replay_skips_documents_already_written(db, spool):
+    writer = BatchWriter(db.get_collection, spool=spool)
+    doc = {"n": 1}
+    spool.append_many([("turns", doc)])
+    db.turns.insert_one(dict(doc))
+    replayer = SpoolReplayer(spool, writer.write_group, lambda: True)
+    assert replayer.replay_batch() == 1
+    assert db.turns.count_documents({}) == 1
+    assert spool.stats()["spooled"] == 0
+
+
+def test_rejected_batches_are_spooled(spool):
+    class Down:
+        def with_options(self, **kwargs):
+            return self
+
+        def insert_many(self, docs, ordered=True):
+            raise ConnectionError("MongoDB is down")
+
+    writer = BatchWriter(lambda name: Down(), batch_size=5, flush_interval=0.01, overflow="spool", spool=spool).start()
+    for n in range(5):
+        writer.submit("turns", {"n": n})
+    assert writer.flush()
+    assert sorted(doc["n"] for _, _, doc in spool.peek()) == list(range(5))
+    assert writer.stats()["failed"] == 5
+
+
+def test_close_spools_what_is_left(db, spool):
+    writer = BatchWriter(db.get_collection, overflow="spool", spool=spool)
+    writer.submit("turns", {"n": 1})
+    # Without a worker nothing is written, so close() keeps the queued document on disk
+    writer.close(timeout=0.01)
+    assert not writer.submit("turns", {"n": 2})
+    assert [doc["n"] for _, _, doc in spool.peek()] == [1]
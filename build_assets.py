@@ -0,0 +1,143 @@
+"""Build the static assets served by Streamlit from static/.
+
+Images are resized to the widths they are displayed at and saved as AVIF,
+WebP and a PNG/JPEG fallback; stylesheets are minified. Every file gets a
+content hash in its name, so browsers and proxies can cache it forever,
+and static/manifest.json maps asset names to the built files.
+
+Run after changing assets/ or the source images (needs Pillow):
+    python build_assets.py
+"""
+import hashlib
+import io
+import json
+import os
+import re
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(ROOT, "static")
+MANIFEST_PATH = os.path.join(STATIC_DIR, "manifest.json")
+
+# name -> (source image, display widths in pixels, 2x included)
+IMAGES = {
+    "logo": ("CIC - 20 Years Logo-Final after el 90 amendments-02.png", (240, 480)),
+    "cairo": ("cairo.png", (480, 960, 1440)),
+    "zayed": ("Zayed.png", (320, 640, 960)),
+}
+
+STYLESHEETS = {
+    "app": os.path.join("assets", "app.css"),
+}
+
+WEBP_QUALITY = 80
+AVIF_QUALITY = 55
+JPEG_QUALITY = 82
+
+
+def _hashed_name(name, data, suffix):
+    return f"{name}.{hashlib.sha256(data).hexdigest()[:10]}{suffix}"
+
+
+def _write(filename, data):
+    with open(os.path.join(STATIC_DIR, filename), "wb") as f:
+        f.write(data)
+    return filename
+
+
+def _encode(image, fmt):
+    buffer = io.BytesIO()
+    if fmt == "webp":
+        image.save(buffer, "WEBP", quality=WEBP_QUALITY, method=6)
+    elif fmt == "avif":
+        image.save(buffer, "AVIF", quality=AVIF_QUALITY)
+    elif fmt == "png":
+        image.save(buffer, "PNG", optimize=True)
+    else:
+        image.convert("RGB").save(buffer, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def build_image(name, source, widths):
+    """Resize one image to each display width and encode every format"""
+    from PIL import Image, features
+
+    with Image.open(os.path.join(ROOT, source)) as original:
+        original.load()
+    has_alpha = original.mode in ("RGBA", "LA") or "transparency" in original.info
+    image = original.convert("RGBA" if has_alpha else "RGB")
+    # The fallback keeps transparency for the logo; photos are smaller as JPEG
+    formats = (["avif"] if features.check("avif") else []) + ["webp", "png" if has_alpha else "jpeg"]
+
+    variants = {fmt: {} for fmt in formats}
+    # Never upscale; a source narrower than a width is only built at its own size
+    for width in sorted({min(width, image.width) for width in widths}):
+        height = round(image.height * width / image.width)
+        resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+        for fmt in formats:
+            data = _encode(resized, fmt)
+            suffix = f".{width}w." + ("jpg" if fmt == "jpeg" else fmt)
+            variants[fmt][str(width)] = _write(_hashed_name(name, data, suffix), data)
+    return {"width": image.width, "height": image.height, "fallback": formats[-1], "variants": variants}
+
+
+def minify_css(css):
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};:,>])\s*", r"\1", css)
+    return css.replace(";}", "}").strip()
+
+
+def build_stylesheet(name, source):
+    with open(os.path.join(ROOT, source), encoding="utf-8") as f:
+        data = minify_css(f.read()).encode("utf-8")
+    return _write(_hashed_name(name, data, ".css"), data)
+
+
+def main():
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        print("Pillow is required to build the assets: pip install Pillow")
+        raise SystemExit(1)
+
+    os.makedirs(STATIC_DIR, exist_ok=True)
+    previous = set()
+    if os.path.exists(MANIFEST_PATH):
+        with open(MANIFEST_PATH, encoding="utf-8") as f:
+            old = json.load(f)
+        previous |= set(old.get("css", {}).values())
+        for image in old.get("images", {}).values():
+            for files in image["variants"].values():
+                previous |= set(files.values())
+
+    manifest = {"css": {}, "images": {}}
+    for name, source in STYLESHEETS.items():
+        manifest["css"][name] = build_stylesheet(name, source)
+        print(f"{source} -> {manifest['css'][name]}")
+    for name, (source, widths) in IMAGES.items():
+        if not os.path.exists(os.path.join(ROOT, source)):
+            print(f"Skipping {name}: {source} not found")
+            continue
+        manifest["images"][name] = build_image(name, source, widths)
+        sizes = {fmt: sum(os.path.getsize(os.path.join(STATIC_DIR, f)) for f in files.values())
+                 for fmt, files in manifest["images"][name]["variants"].items()}
+        print(f"{source} ({os.path.getsize(os.path.join(ROOT, source))} bytes) -> " +
+              ", ".join(f"{fmt} {size} bytes" for fmt, size in sizes.items()))
+
+    current = set(manifest["css"].values())
+    for image in manifest["images"].values():
+        for files in image["variants"].values():
+            current |= set(files.values())
+    # Remove the files of the previous build that are no longer referenced
+    for filename in previous - current:
+        path = os.path.join(STATIC_DIR, filename)
+        if os.path.exists(path):
+            os.remove(path)
+
+    with open(MANIFEST_PATH, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    print(f"Wrote {MANIFEST_PATH}")
+
+
+if __name__ == "__main__":
+    main()
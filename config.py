@@ -7,13 +7,96 @@ load_dotenv()
 # API Configuration
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 GEMINI_MODEL = "gemini-2.0-flash"
+# Alternative API host and transport ("rest" or "grpc"), e.g. a local stand-in for load tests
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT", "")
+GEMINI_TRANSPORT = os.getenv("GEMINI_TRANSPORT", "")
+
+# Deadlines, retries, hedging and circuit breaking of Gemini calls
+GEMINI_DEADLINE = float(os.getenv("GEMINI_DEADLINE", "30"))  # seconds per turn, retries included
+GEMINI_MAX_ATTEMPTS = int(os.getenv("GEMINI_MAX_ATTEMPTS", "3"))  # attempts per turn, hedges included
+GEMINI_BACKOFF_BASE = float(os.getenv("GEMINI_BACKOFF_BASE", "0.5"))  # seconds, doubled per retry, with full jitter
+GEMINI_BACKOFF_CAP = float(os.getenv("GEMINI_BACKOFF_CAP", "8"))  # seconds
+GEMINI_HEDGING_ENABLED = os.getenv("GEMINI_HEDGING_ENABLED", "false").lower() == "true"
+GEMINI_HEDGE_QUANTILE = float(os.getenv("GEMINI_HEDGE_QUANTILE", "0.95"))  # first-chunk latency before hedging
+GEMINI_BREAKER_FAILURES = int(os.getenv("GEMINI_BREAKER_FAILURES", "5"))  # consecutive failures that open the breaker
+GEMINI_BREAKER_RESET = float(os.getenv("GEMINI_BREAKER_RESET", "30"))  # seconds before probing again
+FAQ_MIN_SCORE = float(os.getenv("FAQ_MIN_SCORE", "3.0"))  # match score of a canned answer served as a fallback
+
+# Fair scheduling of Gemini calls across sessions, under the upstream quota
+GEMINI_MAX_CONCURRENT = int(os.getenv("GEMINI_MAX_CONCURRENT", "8"))  # calls running at once per replica
+GEMINI_QUOTA_RPM = float(os.getenv("GEMINI_QUOTA_RPM", "0"))  # calls started per minute per replica, 0 for no limit
+GEMINI_SESSION_RPM = float(os.getenv("GEMINI_SESSION_RPM", "10"))  # calls per minute per session, 0 for no limit
+GEMINI_SESSION_BURST = int(os.getenv("GEMINI_SESSION_BURST", "3"))  # calls a session may make back to back
+GEMINI_QUEUE_DEADLINE = float(os.getenv("GEMINI_QUEUE_DEADLINE", "20"))  # seconds a question may wait before it is shed
+GEMINI_QUEUE_MAX = int(os.getenv("GEMINI_QUEUE_MAX", "500"))  # questions waiting per replica
+
+# Gemini chat session pool (one chat per Streamlit session)
+GEMINI_SESSION_POOL_SIZE = int(os.getenv("GEMINI_SESSION_POOL_SIZE", "500"))
+GEMINI_SESSION_IDLE_TTL = float(os.getenv("GEMINI_SESSION_IDLE_TTL", "1800"))  # seconds
+GEMINI_SESSION_POOL_MAX_BYTES = int(os.getenv("GEMINI_SESSION_POOL_MAX_BYTES", "50000000"))  # characters of history
+
+# Conversation history sent with each Gemini request (the system prompt is always sent)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))  # tokens of history
+CONTEXT_KEEP_TURNS = int(os.getenv("CONTEXT_KEEP_TURNS", "4"))  # recent exchanges kept verbatim
+
+# Number of CIC knowledge sections sent with each question
+KNOWLEDGE_TOP_K = int(os.getenv("KNOWLEDGE_TOP_K", "4"))
+
+# Cache of answers to first-turn (context-free) questions
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1000"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))  # seconds
+
+# Semantic (similar question) answer cache shared by all replicas through MongoDB
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+SEMANTIC_CACHE_COLLECTION = os.getenv("SEMANTIC_CACHE_COLLECTION", "semantic_cache")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.9"))  # cosine similarity, content words must match too
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "20000"))
+SEMANTIC_CACHE_REFRESH_INTERVAL = float(os.getenv("SEMANTIC_CACHE_REFRESH_INTERVAL", "30"))  # seconds
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "86400"))  # seconds an answer is served, MongoDB then expires it
+
+# Most asked questions, tracked per hour and shared between replicas
+HEAVY_HITTERS_COLLECTION = os.getenv("HEAVY_HITTERS_COLLECTION", "question_counts")
+HEAVY_HITTERS_CAPACITY = int(os.getenv("HEAVY_HITTERS_CAPACITY", "500"))  # questions tracked per hour
+HEAVY_HITTERS_FLUSH_INTERVAL = float(os.getenv("HEAVY_HITTERS_FLUSH_INTERVAL", "60"))  # seconds
+SAMPLE_QUESTIONS_MIN_SESSIONS = int(os.getenv("SAMPLE_QUESTIONS_MIN_SESSIONS", "3"))  # distinct askers before a curated question moves up
+
+# Chat event bus (persistence and other observers run off the request path)
+EVENT_BUS_WORKERS = int(os.getenv("EVENT_BUS_WORKERS", "4"))
+EVENT_BUS_QUEUE_SIZE = int(os.getenv("EVENT_BUS_QUEUE_SIZE", "1000"))
+EVENT_BUS_BLOCK_TIMEOUT = float(os.getenv("EVENT_BUS_BLOCK_TIMEOUT", "0.05"))  # seconds a publisher waits on a full queue
+EVENT_OBSERVER_TIMEOUT = float(os.getenv("EVENT_OBSERVER_TIMEOUT", "5"))  # seconds per observer call
+
+# Prometheus metrics on a side HTTP port (0 disables the endpoint). The endpoint has no
+# authentication, so it only listens on loopback unless METRICS_ADDR opts in to more,
+# e.g. 0.0.0.0 behind a firewall that only lets the Prometheus server through
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))
+METRICS_ADDR = os.getenv("METRICS_ADDR", "127.0.0.1")
 
 # MongoDB Configuration
 MONGODB_CONNECTION_STRING = os.getenv("MONGODB_CONNECTION_STRING", "mongodb://localhost:27017")
 MONGODB_DB_NAME = os.getenv("MONGODB_DB_NAME", "customer_service")
-MONGODB_COLLECTION = os.getenv("MONGODB_COLLECTION", "conversations")
+MONGODB_COLLECTION = os.getenv("MONGODB_COLLECTION", "conversations")  # legacy one-document-per-message collection
+MONGODB_BUCKETS_COLLECTION = os.getenv("MONGODB_BUCKETS_COLLECTION", "conversation_buckets")
+MONGODB_CONTACT_COLLECTION = os.getenv("MONGODB_CONTACT_COLLECTION", "contact_forms")
+MONGODB_ROLLUPS_COLLECTION = os.getenv("MONGODB_ROLLUPS_COLLECTION", "conversation_rollups")
+MONGODB_BUCKET_SIZE = int(os.getenv("MONGODB_BUCKET_SIZE", "200"))  # max turns per session bucket
+MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", "50"))
+MONGODB_MIN_POOL_SIZE = int(os.getenv("MONGODB_MIN_POOL_SIZE", "2"))
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGODB_READ_BATCH_SIZE = int(os.getenv("MONGODB_READ_BATCH_SIZE", "500"))  # documents per paginated query
+
+# Background batched writes to MongoDB
+MONGODB_WRITE_BATCH_SIZE = int(os.getenv("MONGODB_WRITE_BATCH_SIZE", "100"))
+MONGODB_WRITE_FLUSH_INTERVAL = float(os.getenv("MONGODB_WRITE_FLUSH_INTERVAL", "1.0"))  # seconds
+MONGODB_WRITE_QUEUE_SIZE = int(os.getenv("MONGODB_WRITE_QUEUE_SIZE", "10000"))
+MONGODB_WRITE_OVERFLOW = os.getenv("MONGODB_WRITE_OVERFLOW", "spool")  # spool, block, drop_newest or drop_oldest
+MONGODB_WRITE_CONCERN = os.getenv("MONGODB_WRITE_CONCERN", "1")  # 0, 1 or majority
+# Local spool that keeps writes while MongoDB is down, replayed once it is back
+MONGODB_SPOOL_PATH = os.getenv("MONGODB_SPOOL_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "spool", "mongo_spool.sqlite3"))
 
 # App Configuration
+ADMIN_PAGES_ENABLED = os.getenv("ADMIN_PAGES_ENABLED", "false").lower() == "true"  # traffic dashboard in the sidebar
+CHAT_HISTORY_WINDOW = int(os.getenv("CHAT_HISTORY_WINDOW", "50"))  # messages shown before "load earlier"
 COMPANY_NAME = "Canadian International College (CIC)"
 SUPPORT_EMAIL = "info@cic-cairo.com"  # General Info Email
 SUPPORT_PHONE = "(+202) 19242"  # Hotline
@@ -0,0 +1,77 @@
+"""Move messages from the legacy `conversations` collection into the bucketed schema.
+
+Usage:
+    python -m database.migrate [--dry-run] [--batch-size 1000]
+
+Contact form records are copied to the contact form collection and every
+other message becomes a turn of its session bucket (session "legacy" when
+the record has none). Documents keep their `_id`, so running the tool
+again skips whatever was already migrated. The legacy collection is left
+untouched; drop it once the migrated data has been checked.
+"""
+import argparse
+
+from pymongo import MongoClient
+
+from config import (MONGODB_CONNECTION_STRING, MONGODB_DB_NAME, MONGODB_COLLECTION,
+                    MONGODB_BUCKETS_COLLECTION, MONGODB_CONTACT_COLLECTION)
+from database.schema import ensure_indexes, push_turns, to_datetime
+from database.writer import insert_documents
+
+LEGACY_SESSION_ID = "legacy"
+
+
+def convert(doc):
+    """Return (collection name, new document) for one legacy record"""
+    doc = dict(doc)
+    kind = doc.pop("type", "chat")
+    doc["timestamp"] = to_datetime(doc.get("timestamp"))
+    if kind == "contact_form":
+        return MONGODB_CONTACT_COLLECTION, doc
+    doc["type"] = kind
+    doc.setdefault("session_id", LEGACY_SESSION_ID)
+    if "user_query" not in doc and doc.get("role") == "user":
+        doc["user_query"] = doc.pop("content", None)
+    if "bot_response" not in doc and doc.get("role") == "assistant":
+        doc["bot_response"] = doc.pop("content", None)
+    return MONGODB_BUCKETS_COLLECTION, doc
+
+
+def migrate(db, batch_size=1000, dry_run=False):
+    """Migrate every legacy record in `_id` order, returning per-collection counts"""
+    legacy = db[MONGODB_COLLECTION]
+    handlers = {MONGODB_BUCKETS_COLLECTION: push_turns, MONGODB_CONTACT_COLLECTION: insert_documents}
+    counts = {MONGODB_BUCKETS_COLLECTION: 0, MONGODB_CONTACT_COLLECTION: 0, "failed": 0}
+    last_id = None
+    while True:
+        query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        batch = list(legacy.find(query).sort("_id", 1).limit(batch_size))
+        if not batch:
+            return counts
+        last_id = batch[-1]["_id"]
+        grouped = {}
+        for doc in batch:
+            name, converted = convert(doc)
+            grouped.setdefault(name, []).append(converted)
+        for name, docs in grouped.items():
+            missed = [] if dry_run else handlers[name](db[name], docs)
+            counts[name] += len(docs) - len(missed)
+            counts["failed"] += len(missed)
+        print(f"Migrated up to {last_id}: {counts}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dry-run", action="store_true", help="convert records without writing them")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    db = MongoClient(MONGODB_CONNECTION_STRING)[MONGODB_DB_NAME]
+    if not args.dry_run:
+        ensure_indexes(db, MONGODB_BUCKETS_COLLECTION, MONGODB_CONTACT_COLLECTION, MONGODB_COLLECTION)
+    counts = migrate(db, args.batch_size, args.dry_run)
+    print(f"Done: {counts}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,56 +1,338 @@
+import atexit
+import threading
+import time
+from datetime import datetime, timezone
+from itertools import islice
+from bson.objectid import ObjectId
 from pymongo import MongoClient
-from config import MONGODB_CONNECTION_STRING, MONGODB_DB_NAME, MONGODB_COLLECTION
+from config import (MONGODB_CONNECTION_STRING, MONGODB_DB_NAME, MONGODB_COLLECTION,
+                    MONGODB_BUCKETS_COLLECTION, MONGODB_CONTACT_COLLECTION, MONGODB_ROLLUPS_COLLECTION,
+                    MONGODB_MAX_POOL_SIZE, MONGODB_MIN_POOL_SIZE, MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+                    MONGODB_WRITE_BATCH_SIZE, MONGODB_WRITE_FLUSH_INTERVAL,
+                    MONGODB_WRITE_QUEUE_SIZE, MONGODB_WRITE_OVERFLOW, MONGODB_WRITE_CONCERN,
+                    MONGODB_SPOOL_PATH, MONGODB_READ_BATCH_SIZE)
+from database.pagination import (decode_cursor, encode_cursor, iter_documents, turn_filters,
+                                 turn_projection)
+from database.rollups import apply_rollups, ensure_rollup_indexes, rollup_event
+from database.schema import ensure_indexes, push_turns, to_datetime
+from database.spool import Spool, SpoolReplayer
+from database.writer import BatchWriter
+from services.metrics import REGISTRY, timed
+from services.session_pool import current_session_id
 import streamlit as st
 
+_writer = None
+_replayer = None
+_writer_lock = threading.Lock()
+
+class MongoReadiness:
+    """Non-blocking view of whether MongoDB is reachable.
+    
+    A daemon thread pings the server in the background, so page code can
+    check `state` without ever waiting on the network. `on_ready` runs on
+    that thread the first time the server answers.
+    """
+    
+    def __init__(self, client, interval=15.0, on_ready=None):
+        self.client = client
+        self.interval = interval
+        self._on_ready = on_ready
+        self.state = "connecting"
+        self.error = None
+        self.last_check = None
+        threading.Thread(target=self._run, name="mongo-readiness", daemon=True).start()
+    
+    @property
+    def ready(self):
+        return self.state == "ready"
+    
+    def _run(self):
+        while True:
+            try:
+                self.client.admin.command("ping")
+                if self.state != "ready":
+                    print("MongoDB connection successful")
+                self.state = "ready"
+                self.error = None
+                if self._on_ready is not None:
+                    on_ready, self._on_ready = self._on_ready, None
+                    on_ready()
+            except Exception as e:
+                if self.state != "unavailable":
+                    print(f"MongoDB connection error: {str(e)}")
+                self.state = "unavailable"
+                self.error = str(e)
+            self.last_check = time.time()
+            time.sleep(self.interval)
+
+@st.cache_resource(show_spinner=False)
+def get_client():
+    """Return the process-wide pooled MongoClient.
+    
+    The client connects lazily on first use and its pool is shared by every
+    session, page and background writer of this process.
+    """
+    print(f"Connecting to MongoDB at: {MONGODB_CONNECTION_STRING}")
+    client = MongoClient(
+        MONGODB_CONNECTION_STRING,
+        maxPoolSize=MONGODB_MAX_POOL_SIZE,
+        minPoolSize=MONGODB_MIN_POOL_SIZE,
+        serverSelectionTimeoutMS=MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+        connect=False
+    )
+    client.readiness = MongoReadiness(client, on_ready=lambda: _ensure_indexes(client))
+    return client
+
+def _ensure_indexes(client):
+    try:
+        ensure_indexes(client[MONGODB_DB_NAME], MONGODB_BUCKETS_COLLECTION,
+                       MONGODB_CONTACT_COLLECTION, MONGODB_COLLECTION)
+        ensure_rollup_indexes(client[MONGODB_DB_NAME][MONGODB_ROLLUPS_COLLECTION])
+    except Exception as e:
+        print(f"Error creating MongoDB indexes: {str(e)}")
+
+def get_collection(name):
+    """Open a collection of the application database by name"""
+    return get_client()[MONGODB_DB_NAME][name]
+
+def _mongo_available():
+    return get_client().readiness.state != "unavailable"
+
+def get_writer():
+    """Return the process-wide background writer, starting it on first use"""
+    global _writer, _replayer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                # Writes MongoDB cannot take right now wait in a local spool
+                spool = Spool(MONGODB_SPOOL_PATH)
+                writer = BatchWriter(
+                    get_collection,
+                    batch_size=MONGODB_WRITE_BATCH_SIZE,
+                    flush_interval=MONGODB_WRITE_FLUSH_INTERVAL,
+                    max_queue=MONGODB_WRITE_QUEUE_SIZE,
+                    overflow=MONGODB_WRITE_OVERFLOW,
+                    write_concern=MONGODB_WRITE_CONCERN,
+                    spool=spool,
+                    is_available=_mongo_available,
+                    handlers={MONGODB_BUCKETS_COLLECTION: push_turns, MONGODB_ROLLUPS_COLLECTION: apply_rollups}
+                )
+                # Replayed writes go through the same handlers as fresh ones
+                _replayer = SpoolReplayer(spool, writer.write_group, _mongo_available).start()
+                _writer = writer.start()
+                # Write out whatever is still queued when the server stops
+                atexit.register(_writer.close)
+                REGISTRY.gauge("mongo_write_queue_depth", "Documents waiting for the background writer",
+                               lambda: writer.stats()["queue_depth"])
+                REGISTRY.gauge("mongo_spool_documents", "Documents parked in the local spool",
+                               lambda: spool.stats()["spooled"])
+    return _writer
+
+def get_spool_stats():
+    """Return spool size, replay lag and replay counters (empty before the first write)"""
+    return _replayer.stats() if _replayer is not None else {}
+
 class MongoDBConnector:
     def __init__(self):
-        try:
-            print(f"Connecting to MongoDB at: {MONGODB_CONNECTION_STRING}")
-            self.client = MongoClient(MONGODB_CONNECTION_STRING, serverSelectionTimeoutMS=5000)
-            # Verify connection
-            self.client.server_info()
-            print("MongoDB connection successful")
-            
-            self.db = self.client[MONGODB_DB_NAME]
-            self.collection = self.db[MONGODB_COLLECTION]
-        except Exception as e:
-            print(f"MongoDB connection error: {str(e)}")
-            st.error(f"Failed to connect to MongoDB: {str(e)}")
+        # Cheap to construct: uses the shared client and never waits on the server
+        self.client = get_client()
+        self.db = self.client[MONGODB_DB_NAME]
+        self.collection = self.db[MONGODB_COLLECTION]
     
-    def save_conversation(self, message_data):
-        """Save a conversation message to MongoDB"""
-        try:
-            print(f"Saving to MongoDB: {str(message_data)[:50]}...")
-            # Ensure message_data is a dict
-            if not isinstance(message_data, dict):
-                message_data = {'content': str(message_data)}
-            
-            # Add timestamp if not present
-            if 'timestamp' not in message_data:
-                from datetime import datetime
-                message_data['timestamp'] = datetime.now()
-            
-            result = self.collection.insert_one(message_data)
-            print(f"Successfully saved to MongoDB with ID: {result.inserted_id}")
-            return result.inserted_id
-        except Exception as e:
-            print(f"Error saving to MongoDB: {str(e)}")
-            st.warning(f"Failed to save conversation to database: {str(e)}")
+    @property
+    def ready(self):
+        """Whether the last background ping reached MongoDB"""
+        return self.client.readiness.ready
+    
+    @timed("mongo_save_seconds", "Time to queue a document for MongoDB", op="save_turn")
+    def save_turn(self, user_query, bot_response, session_id=None, type="chat", timestamp=None, **fields):
+        """Queue one question/answer turn for appending to its session bucket"""
+        turn = dict(fields)
+        turn.update({
+            # The turn id is assigned here so callers get it back without waiting for the write
+            '_id': turn.get('_id') or ObjectId(),
+            'session_id': session_id or current_session_id(),
+            'type': type,
+            'user_query': user_query,
+            'bot_response': bot_response,
+            'timestamp': to_datetime(timestamp),
+        })
+        writer = get_writer()
+        if not writer.submit(MONGODB_BUCKETS_COLLECTION, turn):
+            print("MongoDB write queue is full, conversation turn dropped")
             return None
+        # Traffic counters are updated on the same write path, batched per period
+        writer.submit(MONGODB_ROLLUPS_COLLECTION, rollup_event(turn))
+        return turn['_id']
+    
+    @timed("mongo_save_seconds", "Time to queue a document for MongoDB", op="save_contact_form")
+    def save_contact_form(self, name, email, subject, message):
+        """Queue a contact form submission for its own collection"""
+        doc = {
+            '_id': ObjectId(),
+            'name': name,
+            'email': email,
+            'subject': subject,
+            'message': message,
+            'timestamp': datetime.now(timezone.utc),
+        }
+        if not get_writer().submit(MONGODB_CONTACT_COLLECTION, doc):
+            print("MongoDB write queue is full, contact form dropped")
+            return None
+        return doc['_id']
+    
+    @timed("mongo_save_seconds", "Time to queue a document for MongoDB", op="save_conversation")
+    def save_conversation(self, message_data):
+        """Save a loosely shaped message, routing it to the contact form or bucket collection"""
+        # Ensure message_data is a dict
+        if not isinstance(message_data, dict):
+            message_data = {'content': str(message_data)}
+        
+        fields = dict(message_data)
+        kind = fields.pop('type', 'chat')
+        if kind == 'contact_form':
+            return self.save_contact_form(fields.get('name'), fields.get('email'),
+                                          fields.get('subject'), fields.get('message'))
+        user_query = fields.pop('user_query', None)
+        if user_query is None and fields.get('role') == 'user':
+            user_query = fields.pop('content', None)
+        bot_response = fields.pop('bot_response', None)
+        if bot_response is None and fields.get('role') == 'assistant':
+            bot_response = fields.pop('content', None)
+        return self.save_turn(user_query, bot_response, session_id=fields.pop('session_id', None),
+                              type=kind, timestamp=fields.pop('timestamp', None), **fields)
     
     def get_conversations(self, limit=100):
-        """Retrieve conversations from MongoDB"""
+        """Retrieve the most recent turns across all sessions, newest first"""
         try:
-            return list(self.collection.find().sort('timestamp', -1).limit(limit))
+            # Every bucket's newest turn is at its last_timestamp, so the `limit` most
+            # recently written buckets hold the `limit` newest turns
+            buckets = self.db[MONGODB_BUCKETS_COLLECTION].find().sort('last_timestamp', -1).limit(limit)
+            turns = []
+            for bucket in buckets:
+                for turn in bucket['turns']:
+                    turn = dict(turn)
+                    turn['_id'] = turn.pop('turn_id')
+                    turn['session_id'] = bucket['session_id']
+                    turns.append(turn)
+            turns.sort(key=lambda turn: turn['timestamp'], reverse=True)
+            return turns[:limit]
         except Exception as e:
             print(f"Error retrieving conversations: {str(e)}")
             return []
     
+    def _iter_turn_positions(self, query, projection, batch_size, descending, cursor=None):
+        """Yield (bucket, index, turn) in bucket key order, resuming after `cursor`"""
+        buckets = self.db[MONGODB_BUCKETS_COLLECTION]
+        after = None
+        if cursor is not None:
+            after, position = decode_cursor(cursor)
+            bucket = buckets.find_one({'_id': after[1]}, projection)
+            if bucket is not None:
+                # The rest of the bucket the previous page stopped in
+                indexes = range(position - 1, -1, -1) if descending else range(position + 1, len(bucket['turns']))
+                for index in indexes:
+                    yield bucket, index, bucket['turns'][index]
+        for bucket in iter_documents(buckets, query, projection, batch_size, after, descending):
+            indexes = range(len(bucket['turns']) - 1, -1, -1) if descending else range(len(bucket['turns']))
+            for index in indexes:
+                yield bucket, index, bucket['turns'][index]
+    
+    def _turn_positions(self, start, end, type, session_id, fields, batch_size, descending, cursor=None):
+        """Filter bucket turns down to the ones matching the turn-level filters"""
+        projection = turn_projection(None if fields is None else set(fields) | {'type'})
+        start = to_datetime(start) if start is not None else None
+        end = to_datetime(end) if end is not None else None
+        query = turn_filters(start, end, type, session_id)
+        for bucket, index, turn in self._iter_turn_positions(query, projection, batch_size, descending, cursor):
+            timestamp = to_datetime(turn['timestamp'])
+            if ((start is not None and timestamp < start) or (end is not None and timestamp >= end)
+                    or (type is not None and turn.get('type') != type)):
+                continue
+            turn = dict(turn)
+            turn['_id'] = turn.pop('turn_id')
+            turn['session_id'] = bucket['session_id']
+            if fields is not None and 'type' not in fields:
+                turn.pop('type', None)
+            yield bucket, index, turn
+    
+    def iter_turns(self, start=None, end=None, type=None, session_id=None, fields=None,
+                   batch_size=MONGODB_READ_BATCH_SIZE, descending=False):
+        """Stream chat turns hour by hour, fetching `batch_size` buckets per query.
+        
+        `start`/`end` bound the turn timestamps, `type` and `session_id` narrow
+        the turns, and `fields` limits the turn fields read from MongoDB (the
+        turn id, session id and timestamp are always included). Turns come in
+        (bucket hour, bucket id) order, and in order within each bucket.
+        """
+        for _, _, turn in self._turn_positions(start, end, type, session_id, fields, batch_size, descending):
+            yield turn
+    
+    def iter_all(self, fields=None, batch_size=MONGODB_READ_BATCH_SIZE):
+        """Stream every stored turn with constant memory (for exports and reports)"""
+        return self.iter_turns(fields=fields, batch_size=batch_size)
+    
+    def get_turn_page(self, limit=50, cursor=None, start=None, end=None, type=None, session_id=None,
+                      fields=None, descending=True):
+        """Return one page of turns and the cursor for the next page (None on the last page)"""
+        # A page never spans more than `limit` buckets
+        positions = self._turn_positions(start, end, type, session_id, fields, min(limit + 1, MONGODB_READ_BATCH_SIZE),
+                                         descending, cursor)
+        page = list(islice(positions, limit + 1))
+        turns = [turn for _, _, turn in page[:limit]]
+        if len(page) <= limit:
+            return turns, None
+        bucket, index, _ = page[limit - 1]
+        return turns, encode_cursor(bucket, index)
+    
+    def iter_contact_forms(self, start=None, end=None, fields=None, batch_size=MONGODB_READ_BATCH_SIZE,
+                           descending=True):
+        """Stream contact form submissions, newest first by default"""
+        query = {}
+        if start is not None or end is not None:
+            query['timestamp'] = {}
+            if start is not None:
+                query['timestamp']['$gte'] = to_datetime(start)
+            if end is not None:
+                query['timestamp']['$lt'] = to_datetime(end)
+        projection = None if fields is None else dict.fromkeys(['timestamp', *fields], 1)
+        return iter_documents(self.db[MONGODB_CONTACT_COLLECTION], query, projection, batch_size,
+                              descending=descending)
+    
+    def get_rollups(self, granularity="hour", start=None, end=None):
+        """Return the traffic counters of one granularity between `start` and `end`, oldest first"""
+        query = {'granularity': granularity}
+        if start is not None or end is not None:
+            query['period'] = {}
+            if start is not None:
+                query['period']['$gte'] = to_datetime(start)
+            if end is not None:
+                query['period']['$lt'] = to_datetime(end)
+        try:
+            return list(self.db[MONGODB_ROLLUPS_COLLECTION].find(query).sort('period', 1))
+        except Exception as e:
+            print(f"Error retrieving rollups: {str(e)}")
+            return []
+    
+    def get_session(self, session_id):
+        """Return the turns of one session in the order they happened"""
+        return list(self.iter_turns(session_id=session_id))
+    
     def get_conversation_by_id(self, conversation_id):
-        """Get a specific conversation by ID"""
-        from bson.objectid import ObjectId
-        return self.collection.find_one({'_id': ObjectId(conversation_id)})
+        """Get a specific conversation turn by ID"""
+        turn_id = ObjectId(conversation_id)
+        bucket = self.db[MONGODB_BUCKETS_COLLECTION].find_one(
+            {'turns.turn_id': turn_id},
+            {'session_id': 1, 'turns': {'$elemMatch': {'turn_id': turn_id}}}
+        )
+        if bucket is None:
+            # Not migrated yet
+            return self.collection.find_one({'_id': turn_id})
+        turn = dict(bucket['turns'][0])
+        turn['_id'] = turn.pop('turn_id')
+        turn['session_id'] = bucket['session_id']
+        return turn
     
     def close_connection(self):
-        """Close the MongoDB connection"""
-        self.client.close()
\ No newline at end of file
+        """Release this connector (the shared client stays open for the rest of the process)"""
+        self.client = None
\ No newline at end of file
@@ -0,0 +1,70 @@
+from datetime import datetime
+
+from bson.objectid import ObjectId
+
+from database.schema import bucket_start, to_datetime
+
+
+def keyset_filter(after, descending=False):
+    """Match documents strictly after the (timestamp, _id) key `after`"""
+    if after is None:
+        return {}
+    timestamp, doc_id = after
+    op = "$lt" if descending else "$gt"
+    return {"$or": [{"timestamp": {op: timestamp}}, {"timestamp": timestamp, "_id": {op: doc_id}}]}
+
+
+def iter_documents(collection, query=None, projection=None, batch_size=500, after=None, descending=False):
+    """Stream documents in (timestamp, _id) order, one indexed query per batch.
+
+    Each batch resumes from the key of the last document seen instead of
+    skipping, so every batch costs the same however deep the scan is, and
+    no server cursor is held open while the caller works.
+    """
+    direction = -1 if descending else 1
+    query = query or {}
+    while True:
+        keyset = keyset_filter(after, descending)
+        batch = list(collection.find({"$and": [query, keyset]} if keyset else query, projection)
+                     .sort([("timestamp", direction), ("_id", direction)])
+                     .limit(batch_size))
+        yield from batch
+        if len(batch) < batch_size:
+            return
+        after = (batch[-1]["timestamp"], batch[-1]["_id"])
+
+
+def turn_filters(start=None, end=None, type=None, session_id=None):
+    """Build the bucket query for turns between `start` and `end` (UTC datetimes or epochs)"""
+    query = {}
+    if session_id is not None:
+        query["session_id"] = session_id
+    if start is not None or end is not None:
+        query["timestamp"] = {}
+        if start is not None:
+            query["timestamp"]["$gte"] = bucket_start(to_datetime(start))
+        if end is not None:
+            query["timestamp"]["$lt"] = to_datetime(end)
+    if type is not None:
+        query["turns.type"] = type
+    return query
+
+
+def turn_projection(fields):
+    """Project buckets down to the listed turn fields (None keeps every field)"""
+    if fields is None:
+        return None
+    projection = {"session_id": 1, "timestamp": 1, "turns.turn_id": 1, "turns.timestamp": 1}
+    projection.update({f"turns.{field}": 1 for field in fields})
+    return projection
+
+
+def encode_cursor(bucket, index):
+    """Opaque page cursor pointing after turn `index` of `bucket`"""
+    return f"{bucket['timestamp'].isoformat()}|{bucket['_id']}|{index}"
+
+
+def decode_cursor(cursor):
+    """Return (bucket key, turn index) for a cursor made by `encode_cursor`"""
+    timestamp, bucket_id, index = cursor.split("|")
+    return (datetime.fromisoformat(timestamp), ObjectId(bucket_id)), int(index)
@@ -0,0 +1,192 @@
+"""Pre-aggregated traffic and latency counters for conversations.
+
+Every saved turn adds one to a counter document per minute, hour and day:
+
+    {
+        "_id": "hour:2026-01-01T10:00:00+00:00",
+        "granularity": "hour",
+        "period": <start of the hour, UTC>,
+        "queries": 12, "errors": 1,
+        "latency": {"le_500": 3, "le_1000": 7, ...}, "latency_sum_ms": ..., "latency_count": ...,
+        "languages": {"en": 9, "ar": 3},
+        "handlers": {"standard": 10, "technical": 2},
+    }
+
+so reports read a few hundred small documents instead of scanning the
+turns. Counters are `$inc` upserts, applied at least once: a batch that
+fails half way and is replayed from the spool can count some turns twice.
+
+Usage (rebuild the counters of complete past days from the stored turns):
+    python -m database.rollups [--start 2026-01-01] [--end 2026-02-01]
+"""
+import argparse
+from datetime import datetime, timezone
+
+from pymongo import ASCENDING, MongoClient, UpdateOne
+
+from config import (MONGODB_CONNECTION_STRING, MONGODB_DB_NAME, MONGODB_BUCKETS_COLLECTION,
+                    MONGODB_ROLLUPS_COLLECTION)
+from database.pagination import iter_documents, turn_filters
+from database.schema import to_datetime
+
+GRANULARITIES = ("minute", "hour", "day")
+
+# Upper bounds (ms) of the latency histogram buckets; slower answers go to "le_inf"
+LATENCY_BUCKETS_MS = (250, 500, 1000, 2000, 3000, 5000, 10000, 20000)
+
+
+def period_start(timestamp, granularity):
+    """Return the start of the minute, hour or day a timestamp falls into"""
+    timestamp = to_datetime(timestamp)
+    if granularity == "minute":
+        return timestamp.replace(second=0, microsecond=0)
+    if granularity == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def latency_bucket(latency_ms):
+    """Name of the histogram bucket a latency falls into"""
+    for bound in LATENCY_BUCKETS_MS:
+        if latency_ms <= bound:
+            return f"le_{bound}"
+    return "le_inf"
+
+
+def rollup_event(turn):
+    """Reduce a stored turn to the fields the counters are built from"""
+    return {
+        "_id": turn["_id"],
+        "timestamp": to_datetime(turn.get("timestamp")),
+        "error": turn.get("type") == "error",
+        "latency_ms": turn.get("latency_ms"),
+        "language": turn.get("language"),
+        "handler": turn.get("handler"),
+    }
+
+
+def _increments(event):
+    inc = {"queries": 1}
+    if event.get("error"):
+        inc["errors"] = 1
+    latency_ms = event.get("latency_ms")
+    if latency_ms is not None:
+        inc[f"latency.{latency_bucket(latency_ms)}"] = 1
+        inc["latency_sum_ms"] = latency_ms
+        inc["latency_count"] = 1
+    if event.get("language"):
+        inc[f"languages.{event['language']}"] = 1
+    if event.get("handler"):
+        inc[f"handlers.{event['handler']}"] = 1
+    return inc
+
+
+def aggregate(events, counters=None):
+    """Fold events into {(granularity, period): increments}"""
+    counters = {} if counters is None else counters
+    for event in events:
+        inc = _increments(event)
+        for granularity in GRANULARITIES:
+            totals = counters.setdefault((granularity, period_start(event["timestamp"], granularity)), {})
+            for field, amount in inc.items():
+                totals[field] = totals.get(field, 0) + amount
+    return counters
+
+
+def _filter(granularity, period):
+    return {"_id": f"{granularity}:{period.isoformat()}"}
+
+
+def apply_rollups(collection, events):
+    """Writer handler: add a batch of events to the counters, one upsert per period"""
+    ops = [
+        UpdateOne(_filter(granularity, period),
+                  {"$inc": inc, "$setOnInsert": {"granularity": granularity, "period": period}},
+                  upsert=True)
+        for (granularity, period), inc in aggregate(events).items()
+    ]
+    if not ops:
+        return []
+    try:
+        collection.bulk_write(ops, ordered=False)
+    except Exception as e:
+        # Counters that did get applied are counted again on replay
+        print(f"Error updating conversation rollups: {str(e)}")
+        return events
+    return []
+
+
+def ensure_rollup_indexes(collection):
+    collection.create_index([("granularity", ASCENDING), ("period", ASCENDING)])
+
+
+def percentile(rollup, q):
+    """Upper bound (ms) of the histogram bucket holding the q-th latency percentile"""
+    histogram = rollup.get("latency") or {}
+    total = sum(histogram.values())
+    if not total:
+        return None
+    seen = 0
+    for bound in LATENCY_BUCKETS_MS + (float("inf"),):
+        seen += histogram.get(latency_bucket(bound), 0)
+        if seen >= q * total:
+            return bound
+    return float("inf")
+
+
+def backfill(buckets, rollups, start=None, end=None, batch_size=500):
+    """Rebuild the counters of the complete days in [start, end) from stored turns.
+
+    Counters are written with `$set`, so the job can be re-run safely. Days
+    at or after `end` (by default today) are left to the live write path.
+    """
+    end = period_start(end or datetime.now(timezone.utc), "day")
+    start = period_start(start, "day") if start is not None else None
+    counters = {}
+    current_day = None
+    written = 0
+    for bucket in iter_documents(buckets, turn_filters(start, end), None, batch_size):
+        day = period_start(bucket["timestamp"], "day")
+        if current_day is not None and day != current_day:
+            # Buckets come in time order, so the previous day is complete
+            written += _write_counters(rollups, counters)
+            counters = {}
+        current_day = day
+        aggregate((rollup_event({**turn, "_id": turn["turn_id"]}) for turn in bucket["turns"]
+                   if to_datetime(turn["timestamp"]) < end), counters)
+    written += _write_counters(rollups, counters)
+    return written
+
+
+def _write_counters(rollups, counters):
+    ops = []
+    for (granularity, period), totals in counters.items():
+        # Nested counters are replaced as a whole, so stale keys do not survive a rebuild
+        doc = {"granularity": granularity, "period": period}
+        for field, amount in totals.items():
+            name, _, key = field.partition(".")
+            if key:
+                doc.setdefault(name, {})[key] = amount
+            else:
+                doc[name] = amount
+        ops.append(UpdateOne(_filter(granularity, period), {"$set": doc}, upsert=True))
+    if ops:
+        rollups.bulk_write(ops, ordered=False)
+        print(f"Wrote {len(ops)} rollups up to {max(period for _, period in counters)}")
+    return len(ops)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild conversation rollups from stored turns")
+    parser.add_argument("--start", type=datetime.fromisoformat, help="first day to rebuild (UTC)")
+    parser.add_argument("--end", type=datetime.fromisoformat, help="day to stop before (default: today)")
+    args = parser.parse_args()
+
+    db = MongoClient(MONGODB_CONNECTION_STRING)[MONGODB_DB_NAME]
+    ensure_rollup_indexes(db[MONGODB_ROLLUPS_COLLECTION])
+    written = backfill(db[MONGODB_BUCKETS_COLLECTION], db[MONGODB_ROLLUPS_COLLECTION], args.start, args.end)
+    print(f"Done: {written} rollups written")
+
+
+if __name__ == "__main__":
+    main()
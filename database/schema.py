@@ -0,0 +1,87 @@
+"""Storage layout of conversations in MongoDB.
+
+Chat turns are grouped into bucket documents, one per session per hour,
+each holding at most `BUCKET_SIZE` turns:
+
+    {
+        "session_id": "...",
+        "timestamp": <start of the hour, UTC>,
+        "last_timestamp": <time of the newest turn>,
+        "count": <number of turns>,
+        "turns": [{"turn_id", "timestamp", "type", "user_query", "bot_response", ...}],
+    }
+
+Turns are appended with `$push`, so a session's conversation is read with
+a handful of documents instead of one document per message. Contact form
+submissions live in their own collection.
+"""
+from datetime import datetime, timezone
+
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+
+from config import MONGODB_BUCKET_SIZE
+
+
+def to_datetime(value):
+    """Return a canonical UTC datetime for a float epoch or datetime timestamp"""
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, tz=timezone.utc)
+    return datetime.now(timezone.utc)
+
+
+def bucket_start(timestamp):
+    """Return the start of the hour bucket a timestamp falls into"""
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def push_turns(collection, docs):
+    """Append queued turn documents to their session buckets.
+
+    Each queued document carries `session_id` and its turn id as `_id`.
+    Turns already stored (e.g. when replaying the spool) are skipped, and
+    the documents that could not be written are returned.
+    """
+    ids = [doc["_id"] for doc in docs]
+    existing = set(collection.distinct("turns.turn_id", {"turns.turn_id": {"$in": ids}}))
+    pending = [doc for doc in docs if doc["_id"] not in existing]
+    ops = []
+    for doc in pending:
+        turn = {k: v for k, v in doc.items() if k not in ("_id", "session_id")}
+        turn["turn_id"] = doc["_id"]
+        turn["timestamp"] = to_datetime(turn.get("timestamp"))
+        ops.append(UpdateOne(
+            {"session_id": doc["session_id"], "timestamp": bucket_start(turn["timestamp"]),
+             "count": {"$lt": MONGODB_BUCKET_SIZE}},
+            {"$push": {"turns": turn}, "$inc": {"count": 1}, "$max": {"last_timestamp": turn["timestamp"]}},
+            upsert=True
+        ))
+    if not ops:
+        return []
+    try:
+        # Ordered, so turns of a session stay in the order they happened
+        collection.bulk_write(ops, ordered=True)
+    except Exception as e:
+        details = getattr(e, "details", None) or {}
+        errors = details.get("writeErrors") or []
+        first_failed = errors[0]["index"] if errors else 0
+        print(f"Error appending {len(ops) - first_failed} turns to MongoDB: {str(e)}")
+        return pending[first_failed:]
+    return []
+
+
+def ensure_indexes(db, buckets_name, contacts_name, legacy_name):
+    """Create the indexes every read and write path relies on"""
+    buckets = db[buckets_name]
+    buckets.create_index([("session_id", ASCENDING), ("timestamp", ASCENDING)])
+    buckets.create_index([("timestamp", DESCENDING), ("_id", DESCENDING)])
+    buckets.create_index([("last_timestamp", DESCENDING)])
+    buckets.create_index([("turns.turn_id", ASCENDING)])
+    buckets.create_index([("turns.type", ASCENDING), ("timestamp", DESCENDING)])
+    contacts = db[contacts_name]
+    contacts.create_index([("timestamp", DESCENDING), ("_id", DESCENDING)])
+    contacts.create_index([("email", ASCENDING)])
+    legacy = db[legacy_name]
+    legacy.create_index([("timestamp", DESCENDING)])
+    legacy.create_index([("type", ASCENDING)])
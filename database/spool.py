@@ -0,0 +1,125 @@
+import os
+import sqlite3
+import threading
+import time
+
+from bson import json_util
+from bson.objectid import ObjectId
+
+DUPLICATE_KEY = 11000
+
+
+class Spool:
+    """Local append-only SQLite spool for documents MongoDB could not take.
+
+    Documents keep their `_id`, so replaying one that did reach MongoDB
+    after all is a harmless duplicate-key error rather than a second copy.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        # WAL with NORMAL sync keeps appends in the tens of microseconds
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS spool ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " collection TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+        self.appended = 0
+
+    def append_many(self, items):
+        """Durably store (collection_name, doc) pairs"""
+        now = time.time()
+        rows = []
+        for name, doc in items:
+            doc.setdefault("_id", ObjectId())
+            rows.append((name, json_util.dumps(doc), now))
+        with self._lock:
+            self._conn.executemany("INSERT INTO spool (collection, payload, created_at) VALUES (?, ?, ?)", rows)
+            self.appended += len(rows)
+
+    def peek(self, limit=500):
+        """Return the oldest spooled entries as (seq, collection_name, doc)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, collection, payload FROM spool ORDER BY seq LIMIT ?", (limit,)
+            ).fetchall()
+        return [(seq, name, json_util.loads(payload)) for seq, name, payload in rows]
+
+    def remove(self, seqs):
+        """Forget entries that have been replayed"""
+        with self._lock:
+            self._conn.executemany("DELETE FROM spool WHERE seq = ?", [(seq,) for seq in seqs])
+
+    def stats(self):
+        """Return the spool size and the age of its oldest entry"""
+        with self._lock:
+            count, oldest = self._conn.execute("SELECT COUNT(*), MIN(created_at) FROM spool").fetchone()
+        return {
+            "spooled": count,
+            "appended": self.appended,
+            "replay_lag_s": time.time() - oldest if oldest else 0.0,
+            "bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+        }
+
+
+class SpoolReplayer:
+    """Background thread that drains the spool into MongoDB once it is back"""
+
+    def __init__(self, spool, write_group, is_available, batch_size=500, interval=5.0):
+        self.spool = spool
+        self._write_group = write_group
+        self._is_available = is_available
+        self.batch_size = batch_size
+        self.interval = interval
+        self.replayed = 0
+        self.errors = 0
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="mongo-spool-replay", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            try:
+                while self._is_available() and self.replay_batch():
+                    pass
+            except Exception as e:
+                self.errors += 1
+                print(f"Error replaying spooled writes: {str(e)}")
+            time.sleep(self.interval)
+
+    def replay_batch(self):
+        """Insert one batch of spooled documents, returning how many were replayed"""
+        entries = self.spool.peek(self.batch_size)
+        grouped = {}
+        for seq, name, doc in entries:
+            grouped.setdefault(name, []).append((seq, doc))
+        done = []
+        failed = 0
+        for name, items in grouped.items():
+            # The writer's handlers skip documents that already made it to MongoDB
+            missed = {id(doc) for doc in self._write_group(name, [doc for _, doc in items])}
+            done.extend(seq for seq, doc in items if id(doc) not in missed)
+            failed += len(missed)
+        self.spool.remove(done)
+        self.replayed += len(done)
+        if failed:
+            raise RuntimeError(f"{failed} spooled documents could not be replayed yet")
+        return len(done)
+
+    def stats(self):
+        """Return spool size, replay lag and replay counters"""
+        stats = self.spool.stats()
+        stats.update({"replayed": self.replayed, "replay_errors": self.errors})
+        return stats
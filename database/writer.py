@@ -0,0 +1,233 @@
+import threading
+import time
+from collections import deque
+
+from pymongo import WriteConcern
+
+from database.spool import DUPLICATE_KEY
+
+OVERFLOW_POLICIES = ("spool", "block", "drop_newest", "drop_oldest")
+
+
+def parse_write_concern(value):
+    """Turn a MONGODB_WRITE_CONCERN setting ("0", "1", "majority") into a WriteConcern"""
+    value = str(value).strip()
+    return WriteConcern(w=int(value) if value.isdigit() else value)
+
+
+def insert_documents(collection, docs):
+    """Insert documents unordered, returning the ones that were not written"""
+    try:
+        collection.insert_many(docs, ordered=False)
+        return []
+    except Exception as e:
+        details = getattr(e, "details", None) or {}
+        errors = details.get("writeErrors")
+        if errors is not None:
+            # Only the documents with write errors were not inserted (duplicates already are)
+            missed = [docs[err["index"]] for err in errors if err.get("code") != DUPLICATE_KEY]
+        else:
+            missed = docs
+        if missed:
+            print(f"Error writing {len(missed)} documents to MongoDB: {str(e)}")
+        return missed
+
+
+class BatchWriter:
+    """Background writer that batches inserts off the Streamlit script thread.
+
+    Documents are queued by `submit` and written by one worker thread with
+    `insert_many(ordered=False)` whenever `batch_size` documents are waiting
+    or `flush_interval` seconds have passed. The queue is bounded; when it
+    is full, `overflow` decides whether the new document goes to the local
+    `spool`, the caller blocks for up to `block_timeout` seconds, the new
+    document is dropped, or the oldest queued document is dropped to make
+    room. With a spool, batches MongoDB rejects (or that are written while
+    `is_available` reports it down) are spooled instead of lost.
+
+    Documents are inserted as they are unless `handlers` maps their
+    collection to a function `(collection, docs) -> unwritten docs` that
+    stores them differently.
+    """
+
+    def __init__(self, collection_factory, batch_size=100, flush_interval=1.0, max_queue=10000,
+                 overflow="drop_oldest", block_timeout=0.5, write_concern="1", spool=None,
+                 is_available=None, handlers=None):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        if overflow == "spool" and spool is None:
+            raise ValueError("The spool overflow policy needs a spool")
+        self._collection_factory = collection_factory
+        self._collections = {}
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.write_concern = parse_write_concern(write_concern)
+        self.spool = spool
+        self._is_available = is_available or (lambda: True)
+        self.handlers = handlers or {}
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._flush_requested = False
+        self._in_progress = 0
+        self._closed = False
+        self._thread = None
+        self._metrics = {
+            "enqueued": 0, "written": 0, "dropped": 0, "failed": 0, "spooled": 0, "flushes": 0,
+            "max_depth": 0, "last_flush_ms": 0.0, "max_flush_ms": 0.0, "total_flush_ms": 0.0,
+        }
+
+    def start(self):
+        """Start the worker thread"""
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="mongo-writer", daemon=True)
+                self._thread.start()
+        return self
+
+    def submit(self, collection_name, doc):
+        """Queue a document for insertion, returning False if it was dropped"""
+        with self._cond:
+            if self._closed:
+                return False
+            spool_now = False
+            if len(self._queue) >= self.max_queue and self.overflow == "spool":
+                self._metrics["spooled"] += 1
+                spool_now = True
+            elif len(self._queue) >= self.max_queue:
+                if self.overflow == "block":
+                    deadline = time.monotonic() + self.block_timeout
+                    while len(self._queue) >= self.max_queue and not self._closed:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                if len(self._queue) >= self.max_queue:
+                    self._metrics["dropped"] += 1
+                    if self.overflow != "drop_oldest":
+                        return False
+                    self._queue.popleft()
+            if not spool_now:
+                self._queue.append((collection_name, doc))
+                self._metrics["enqueued"] += 1
+                self._metrics["max_depth"] = max(self._metrics["max_depth"], len(self._queue))
+                if len(self._queue) >= self.batch_size:
+                    self._cond.notify_all()
+                return True
+        # MongoDB is not keeping up; park the document on local disk instead
+        self.spool.append_many([(collection_name, doc)])
+        return True
+
+    def flush(self, timeout=5.0):
+        """Ask the worker to write everything queued and wait until it has"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+            while (self._queue or self._in_progress) and self._thread is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout=5.0):
+        """Flush pending writes and stop the worker (called at shutdown)"""
+        flushed = self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            leftover = list(self._queue) if self.spool is not None else []
+            if leftover:
+                self._queue.clear()
+            self._cond.notify_all()
+        if leftover:
+            # MongoDB could not take these in time; keep them for the next start
+            self.spool.append_many(leftover)
+        return flushed
+
+    def _collection(self, name):
+        if name not in self._collections:
+            collection = self._collection_factory(name)
+            self._collections[name] = collection.with_options(write_concern=self.write_concern)
+        return self._collections[name]
+
+    def write_group(self, name, docs):
+        """Write documents of one collection now, returning the ones that failed"""
+        try:
+            collection = self._collection(name)
+            return self.handlers.get(name, insert_documents)(collection, docs)
+        except Exception as e:
+            print(f"Error writing {len(docs)} documents to MongoDB: {str(e)}")
+            return docs
+
+    def _take_batch(self):
+        with self._cond:
+            deadline = time.monotonic() + self.flush_interval
+            while (len(self._queue) < self.batch_size and not self._flush_requested
+                   and not self._closed):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+            if not self._queue:
+                self._flush_requested = False
+            self._in_progress = len(batch)
+            # Wake producers blocked on a full queue
+            self._cond.notify_all()
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch:
+                self._write(batch)
+            with self._cond:
+                self._in_progress = 0
+                self._cond.notify_all()
+                if self._closed and not self._queue:
+                    return
+
+    def _write(self, batch):
+        if self.spool is not None and not self._is_available():
+            # Don't wait out server selection while MongoDB is known to be down
+            self.spool.append_many(batch)
+            with self._cond:
+                self._metrics["spooled"] += len(batch)
+            return
+        grouped = {}
+        for name, doc in batch:
+            grouped.setdefault(name, []).append(doc)
+        started = time.perf_counter()
+        written = failed = 0
+        rejected = []
+        for name, docs in grouped.items():
+            missed = self.write_group(name, docs)
+            written += len(docs) - len(missed)
+            failed += len(missed)
+            rejected.extend((name, doc) for doc in missed)
+        spooled = 0
+        if rejected and self.spool is not None:
+            self.spool.append_many(rejected)
+            spooled = len(rejected)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._cond:
+            m = self._metrics
+            m["written"] += written
+            m["failed"] += failed
+            m["spooled"] += spooled
+            m["flushes"] += 1
+            m["last_flush_ms"] = elapsed_ms
+            m["max_flush_ms"] = max(m["max_flush_ms"], elapsed_ms)
+            m["total_flush_ms"] += elapsed_ms
+
+    def stats(self):
+        """Return queue depth, throughput and flush latency metrics"""
+        with self._cond:
+            m = dict(self._metrics)
+            m["queue_depth"] = len(self._queue)
+        total_flush_ms = m.pop("total_flush_ms")
+        m["avg_flush_ms"] = total_flush_ms / m["flushes"] if m["flushes"] else 0.0
+        return m
@@ -1,15 +1,18 @@
 import streamlit as st
-import google.generativeai as genai
-from pymongo import MongoClient
-from pymongo.errors import ServerSelectionTimeoutError
 import os
 from datetime import datetime
 from config import GEMINI_API_KEY, MONGODB_CONNECTION_STRING
+from services.metrics import REGISTRY
+
+# The Gemini and MongoDB SDKs are imported inside the checks, so importing
+# this module stays cheap until diagnostics actually run
 
 def check_gemini_api():
     """Test the Gemini API connection and return status"""
     try:
-        genai.configure(api_key=GEMINI_API_KEY)
+        import google.generativeai as genai
+        from patterns.singleton import configure_genai
+        configure_genai()
         model = genai.GenerativeModel('gemini-2.0-flash')
         response = model.generate_content("Reply with 'Connection successful' if you can read this message.")
         
@@ -23,9 +26,11 @@ def check_gemini_api():
 
 def check_mongodb():
     """Test the MongoDB connection and return status"""
+    from pymongo.errors import ServerSelectionTimeoutError
+    from database.mongodb import get_client
     try:
-        client = MongoClient(MONGODB_CONNECTION_STRING, serverSelectionTimeoutMS=5000)
-        server_info = client.server_info()
+        # Use the shared pool rather than opening another client
+        server_info = get_client().server_info()
         
         return True, f"MongoDB connection successful (version: {server_info.get('version')})"
     
@@ -34,6 +39,23 @@ def check_mongodb():
     except Exception as e:
         return False, f"MongoDB error: {str(e)}"
 
+def show_latency_metrics():
+    """Show p50/p95/p99 of every timed operation of this process"""
+    st.subheader("Latency (recent samples, ms)")
+    rows = []
+    for histogram in REGISTRY.histograms():
+        for labels, row in histogram.quantiles().items():
+            name = histogram.name + "".join(f" [{value}]" for _, value in labels)
+            rows.append({
+                "operation": name,
+                "count": row["count"],
+                **{q: round(row[q] * 1000, 1) for q in ("p50", "p95", "p99")},
+            })
+    if rows:
+        st.dataframe(rows, use_container_width=True, hide_index=True)
+    else:
+        st.info("No timings recorded yet in this process.")
+
 def run_diagnostics():
     """Run diagnostics on all connections and dependencies"""
     st.header("System Diagnostics")
@@ -56,6 +78,8 @@ def run_diagnostics():
         else:
             st.error(f"❌ {mongo_message}")
     
+    show_latency_metrics()
+    
     # Environment info
     st.subheader("Environment Information")
     st.code(f"""
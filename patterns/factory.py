@@ -1,6 +1,15 @@
 from abc import ABC, abstractmethod
 
+from services.keywords import get_classifier
+
 class ResponseHandler(ABC):
+    def __init__(self, classification=None):
+        # The factory's classification of the query, so it is not scanned twice
+        self.classification = classification
+    
+    def _classify(self, text):
+        return get_classifier().classify(text)
+    
     @abstractmethod
     def process_response(self, query, response):
         pass
@@ -23,10 +32,8 @@ class TechnicalResponseHandler(ResponseHandler):
         }
     
     def _extract_technical_keywords(self, response):
-        # Simple implementation - in a real system, this could use NLP
-        technical_terms = ['error', 'bug', 'code', 'system', 'update', 
-                          'installation', 'software', 'hardware', 'configuration']
-        return [term for term in technical_terms if term.lower() in response.lower()]
+        # Whole-word matches of the technical vocabulary in data/keywords.json
+        return self._classify(response).keywords
 
 class FeedbackResponseHandler(ResponseHandler):
     def process_response(self, query, response):
@@ -38,30 +45,32 @@ class FeedbackResponseHandler(ResponseHandler):
         }
     
     def _analyze_sentiment(self, query):
-        # Simple sentiment analysis - would use proper NLP in production
-        positive_words = ['good', 'great', 'excellent', 'awesome', 'thanks', 'helpful']
-        negative_words = ['bad', 'poor', 'terrible', 'unhelpful', 'disappointed']
-        
-        query_lower = query.lower()
-        positive_count = sum(1 for word in positive_words if word in query_lower)
-        negative_count = sum(1 for word in negative_words if word in query_lower)
-        
-        if positive_count > negative_count:
-            return 'positive'
-        elif negative_count > positive_count:
-            return 'negative'
-        else:
-            return 'neutral'
+        # Counts the positive and negative words of data/keywords.json found in the query
+        if self.classification is not None:
+            return self.classification.sentiment
+        return self._classify(query).sentiment
 
 class ResponseFactory:
+    HANDLERS = {
+        'standard': StandardResponseHandler,
+        'technical': TechnicalResponseHandler,
+        'feedback': FeedbackResponseHandler,
+    }
+    
+    @staticmethod
+    def classify(query):
+        """Handler type, technical keywords and sentiment of a query, from one scan"""
+        return get_classifier().classify(query)
+    
+    @staticmethod
+    def classify_many(queries):
+        """Classify a batch of queries in a single scan"""
+        return get_classifier().classify_many(queries)
+    
     @staticmethod
-    def create_handler(query):
+    def create_handler(query, classification=None):
         # Determine the type of handler based on the query
-        query_lower = query.lower()
-        
-        if any(term in query_lower for term in ['how to', 'error', 'problem', 'doesn\'t work']):
-            return TechnicalResponseHandler()
-        elif any(term in query_lower for term in ['thank', 'thanks', 'good', 'bad', 'review', 'rate']):
-            return FeedbackResponseHandler()
-        else:
-            return StandardResponseHandler()
\ No newline at end of file
+        if classification is None:
+            classification = ResponseFactory.classify(query)
+        handler_class = ResponseFactory.HANDLERS.get(classification.handler, StandardResponseHandler)
+        return handler_class(classification)
\ No newline at end of file
@@ -1,41 +1,283 @@
 from abc import ABC, abstractmethod
-from typing import List
+import queue
+import threading
+import time
+import uuid
 import streamlit as st
+from services.metrics import REGISTRY
+from config import (EVENT_BUS_WORKERS, EVENT_BUS_QUEUE_SIZE, EVENT_BUS_BLOCK_TIMEOUT,
+                    EVENT_OBSERVER_TIMEOUT)
+
+# Event types published for each chat turn
+MESSAGE_RECEIVED = "message_received"
+RESPONSE_READY = "response_ready"
+ERROR = "error"
+EVENT_TYPES = (MESSAGE_RECEIVED, RESPONSE_READY, ERROR)
+
+ERROR_REPLY = "Sorry, I encountered an error: {error}"
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+class ChatEvent:
+    """One typed event of a chat session"""
+
+    def __init__(self, type, session_id, payload):
+        if type not in EVENT_TYPES:
+            raise ValueError(f"Unknown event type: {type}")
+        self.type = type
+        self.session_id = session_id
+        self.payload = payload
+        self.timestamp = time.time()
 
 class ChatObserver(ABC):
     @abstractmethod
     def update(self, message):
         pass
 
+    def handle(self, event):
+        """React to a bus event (by default, pass its payload to `update`)"""
+        self.update(event.payload)
+
+class Subscription:
+    def __init__(self, observer, event_types, timeout, sync, durable=False):
+        self.observer = observer
+        self.event_types = frozenset(event_types or EVENT_TYPES)
+        self.timeout = timeout
+        self.sync = sync
+        self.durable = durable
+
+def deliver(subscription, event):
+    """Call one observer, reporting rather than raising its errors; return whether it succeeded"""
+    try:
+        subscription.observer.handle(event)
+        return True
+    except Exception as e:
+        print(f"Error in {type(subscription.observer).__name__} handling a {event.type} event: {str(e)}")
+        return False
+
+class EventDispatcher:
+    """Process-wide worker pool that delivers events to asynchronous observers.
+
+    Deliveries wait in one bounded queue. When it is full, publishing
+    blocks for at most `block_timeout` seconds and then drops the delivery,
+    so a slow observer can never stall the request path for long.
+    Deliveries of `durable` subscriptions, whose events must not be lost,
+    are made on the publishing thread instead of being dropped.
+
+    Workers call observers themselves. A watchdog notices calls that run
+    over their `timeout`: such a call is counted, a replacement worker is
+    started so the pool keeps its capacity (at most `max_stuck` extra
+    threads), and further deliveries to that kind of observer are skipped
+    until the stuck call returns, so a hung observer holds one thread
+    rather than the whole pool. Durable deliveries are still made.
+    """
+
+    def __init__(self, workers=4, max_queue=1000, block_timeout=0.05, max_stuck=None, watch_interval=0.1):
+        self.workers = workers
+        self.max_stuck = workers if max_stuck is None else max_stuck
+        self.block_timeout = block_timeout
+        self.watch_interval = watch_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._running = {}  # worker thread id -> [observer class, started, timeout, event type, timed out]
+        self._stuck = {}  # observer class -> calls over their timeout that are still running
+        self._threads = 0
+        self._spawned = 0
+        self._metrics = {"published": 0, "delivered": 0, "errors": 0, "timeouts": 0, "dropped": 0, "skipped": 0,
+                         "inline": 0}
+        with self._lock:
+            for _ in range(workers):
+                self._spawn_locked()
+        threading.Thread(target=self._watch, name="event-bus-watchdog", daemon=True).start()
+
+    def _spawn_locked(self):
+        self._threads += 1
+        self._spawned += 1
+        threading.Thread(target=self._run, name=f"event-bus-{self._spawned}", daemon=True).start()
+
+    def _count(self, name):
+        with self._lock:
+            self._metrics[name] += 1
+
+    def dispatch(self, subscription, event):
+        """Queue one delivery, returning False if it was dropped"""
+        self._count("published")
+        try:
+            self._queue.put((subscription, event), timeout=self.block_timeout)
+            return True
+        except queue.Full:
+            if subscription.durable:
+                self._count("inline")
+                deliver(subscription, event)
+                return True
+            self._count("dropped")
+            print(f"Event queue is full, {event.type} event for {type(subscription.observer).__name__} dropped")
+            return False
+
+    def _run(self):
+        me = threading.get_ident()
+        while True:
+            subscription, event = self._queue.get()
+            kind = type(subscription.observer)
+            with self._lock:
+                if self._stuck.get(kind) and not subscription.durable:
+                    self._metrics["skipped"] += 1
+                    continue
+                self._running[me] = [kind, time.monotonic(), subscription.timeout, event.type, False]
+            outcome = "delivered" if deliver(subscription, event) else "errors"
+            with self._lock:
+                timed_out = self._running.pop(me)[4]
+                if not timed_out:
+                    self._metrics[outcome] += 1
+                    continue
+                self._stuck[kind] -= 1
+                if not self._stuck[kind]:
+                    del self._stuck[kind]
+                if self._threads > self.workers:
+                    # A replacement took this worker's place meanwhile
+                    self._threads -= 1
+                    return
+
+    def _watch(self):
+        while True:
+            time.sleep(self.watch_interval)
+            now = time.monotonic()
+            with self._lock:
+                for call in self._running.values():
+                    kind, started, timeout, event_type, timed_out = call
+                    if timed_out or timeout is None or now - started <= timeout:
+                        continue
+                    call[4] = True
+                    self._metrics["timeouts"] += 1
+                    self._stuck[kind] = self._stuck.get(kind, 0) + 1
+                    print(f"{kind.__name__} took longer than {timeout}s on a {event_type} event")
+                    if self._threads < self.workers + self.max_stuck:
+                        self._spawn_locked()
+
+    def stats(self):
+        """Return queue depth, worker and delivery counters"""
+        with self._lock:
+            stats = dict(self._metrics)
+            stats["threads"] = self._threads
+            stats["stuck"] = sum(self._stuck.values())
+        stats["queue_depth"] = self._queue.qsize()
+        return stats
+
+def get_dispatcher():
+    """Return the process-wide event dispatcher, starting its workers on first use"""
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                _dispatcher = EventDispatcher(
+                    workers=EVENT_BUS_WORKERS,
+                    max_queue=EVENT_BUS_QUEUE_SIZE,
+                    block_timeout=EVENT_BUS_BLOCK_TIMEOUT
+                )
+                dispatcher = _dispatcher
+                REGISTRY.gauge("event_bus_queue_depth", "Events waiting for an observer",
+                               lambda: dispatcher.stats()["queue_depth"])
+    return _dispatcher
+
+class EventBus:
+    """Typed publish/subscribe bus of one chat session.
+
+    Observers subscribe to some or all event types. Asynchronous observers
+    (the default) run on the shared dispatcher's workers, and `durable`
+    ones among them are never dropped; `sync=True` observers run inline in
+    `publish`, for observers that must touch the Streamlit session of the
+    publishing script run. Errors in one observer never reach the
+    publisher or the other observers.
+    """
+
+    def __init__(self, session_id, dispatcher=None):
+        self.session_id = session_id
+        self._dispatcher = dispatcher
+        self._subscriptions = []
+
+    def subscribe(self, observer, *event_types, timeout=EVENT_OBSERVER_TIMEOUT, sync=False, durable=False):
+        """Subscribe `observer` to `event_types` (all types when none are given)"""
+        self.unsubscribe(observer)
+        self._subscriptions.append(Subscription(observer, event_types, timeout, sync, durable))
+
+    def unsubscribe(self, observer):
+        self._subscriptions = [s for s in self._subscriptions if s.observer is not observer]
+
+    def publish(self, event_type, **payload):
+        """Deliver an event to every subscribed observer"""
+        event = ChatEvent(event_type, self.session_id, payload)
+        for subscription in self._subscriptions:
+            if event_type not in subscription.event_types:
+                continue
+            if subscription.sync:
+                deliver(subscription, event)
+            else:
+                (self._dispatcher or get_dispatcher()).dispatch(subscription, event)
+        return event
+
 class ChatSubject:
-    _observers: List[ChatObserver] = []
-    
+    """Synchronous observer list, kept for code that still notifies directly"""
+
+    def __init__(self):
+        # Per instance, so subjects of different sessions do not share observers
+        self._observers = []
+
     def attach(self, observer):
         if observer not in self._observers:
             self._observers.append(observer)
-    
+
     def detach(self, observer):
         self._observers.remove(observer)
-    
+
     def notify(self, message):
         for observer in self._observers:
-            observer.update(message)
+            try:
+                observer.update(message)
+            except Exception as e:
+                print(f"Error in {type(observer).__name__}: {str(e)}")
 
 class StreamlitChatObserver(ChatObserver):
+    """Keeps the session's chat history in sync with the bus (subscribe with sync=True)"""
+
     def update(self, message):
         # This method will update the Streamlit UI with new messages
         if 'chat_history' not in st.session_state:
             st.session_state.chat_history = []
-        
+
+        # The page renders the history itself; no rerun here, so later observers still run
         st.session_state.chat_history.append(message)
-        
-        # Force a rerun to update the UI
-        st.rerun()
+
+    def handle(self, event):
+        payload = event.payload
+        if event.type == MESSAGE_RECEIVED:
+            self.update({"id": uuid.uuid4().hex, "role": "user", "content": payload["question"], "timestamp": event.timestamp})
+        elif event.type == RESPONSE_READY:
+            self.update({"id": uuid.uuid4().hex, "role": "assistant", "content": payload["answer"], "timestamp": event.timestamp})
+        elif event.type == ERROR:
+            self.update({"id": uuid.uuid4().hex, "role": "assistant",
+                         "content": ERROR_REPLY.format(error=payload["error"]), "timestamp": event.timestamp})
 
 class DatabaseChatObserver(ChatObserver):
+    """Queues finished and failed turns for the background MongoDB writer.
+
+    Subscribe with durable=True, so the dispatcher never drops a turn.
+    """
+
     def __init__(self, db_connector):
         self.db = db_connector
-    
+
     def update(self, message):
         # Save the message to the database
-        self.db.save_conversation(message)
\ No newline at end of file
+        self.db.save_conversation(message)
+
+    def handle(self, event):
+        payload = event.payload
+        fields = {k: payload[k] for k in ("latency_ms", "language", "handler") if k in payload}
+        if event.type == RESPONSE_READY:
+            self.db.save_turn(payload["question"], payload["answer"], session_id=event.session_id,
+                              timestamp=event.timestamp, **fields)
+        elif event.type == ERROR:
+            # Failed turns are kept too, so error rates can be reported
+            self.db.save_turn(payload["question"], ERROR_REPLY.format(error=payload["error"]),
+                              session_id=event.session_id, type="error", timestamp=event.timestamp, **fields)
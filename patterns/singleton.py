@@ -1,97 +1,87 @@
+import hashlib
+import threading
+import time
 import google.generativeai as genai
-from config import GEMINI_API_KEY, GEMINI_MODEL
+from config import (GEMINI_API_KEY, GEMINI_MODEL, GEMINI_API_ENDPOINT, GEMINI_TRANSPORT, GEMINI_SESSION_POOL_SIZE,
+                    GEMINI_SESSION_IDLE_TTL, GEMINI_SESSION_POOL_MAX_BYTES,
+                    RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL, SEMANTIC_CACHE_ENABLED,
+                    SEMANTIC_CACHE_COLLECTION, SEMANTIC_CACHE_THRESHOLD,
+                    SEMANTIC_CACHE_MAX_ENTRIES, SEMANTIC_CACHE_REFRESH_INTERVAL, SEMANTIC_CACHE_TTL,
+                    CONTEXT_TOKEN_BUDGET, CONTEXT_KEEP_TURNS, KNOWLEDGE_TOP_K,
+                    HEAVY_HITTERS_COLLECTION, HEAVY_HITTERS_CAPACITY, HEAVY_HITTERS_FLUSH_INTERVAL,
+                    GEMINI_DEADLINE, GEMINI_MAX_ATTEMPTS, GEMINI_BACKOFF_BASE, GEMINI_BACKOFF_CAP,
+                    GEMINI_HEDGING_ENABLED, GEMINI_HEDGE_QUANTILE, GEMINI_BREAKER_FAILURES,
+                    GEMINI_BREAKER_RESET, FAQ_MIN_SCORE, GEMINI_MAX_CONCURRENT, GEMINI_QUOTA_RPM,
+                    GEMINI_SESSION_RPM, GEMINI_SESSION_BURST, GEMINI_QUEUE_DEADLINE, GEMINI_QUEUE_MAX)
+from database.mongodb import get_collection
+from services.context_window import ContextStats, ConversationWindow
+from services.faq import get_faq_index
+from services.heavy_hitters import HeavyHitters
+from services.knowledge_index import get_knowledge_index
+from services.metrics import REGISTRY
+from services.normalize import normalize_query
+from services.resilience import CircuitBreaker, ResilientCaller
+from services.scheduler import FairScheduler
+from services.response_cache import ResponseCache
+from services.semantic_cache import SemanticCache
+from services.session_pool import ChatSessionPool, current_session_id
+from services.single_flight import SingleFlight
 import streamlit as st
 
+_response_seconds = REGISTRY.histogram("gemini_response_seconds", "Time to the full answer of a turn")
+_first_chunk_seconds = REGISTRY.histogram("gemini_first_chunk_seconds", "Time to the first streamed chunk of a turn")
+_gemini_errors = REGISTRY.counter("gemini_errors_total", "Turns that failed with a Gemini error")
+_fallbacks = REGISTRY.counter("gemini_fallback_answers_total", "Failed turns answered from a cache or the FAQ")
+
+FALLBACK_NOTICE = ("*The assistant is temporarily unavailable, so this is a saved answer "
+                   "that may not match your question exactly:*")
+
+def configure_genai():
+    """Configure the Gemini client, honouring an alternative endpoint and transport"""
+    options = {}
+    if GEMINI_TRANSPORT:
+        options["transport"] = GEMINI_TRANSPORT
+    if GEMINI_API_ENDPOINT:
+        options["client_options"] = {"api_endpoint": GEMINI_API_ENDPOINT}
+    genai.configure(api_key=GEMINI_API_KEY, **options)
+
+PROMPT_INTRO = """You are a helpful and friendly AI assistant for the Canadian International College (CIC) in Egypt.
+Your goal is to answer questions accurately based *only* on the information provided below about CIC. Do not invent information or answer questions outside this scope. If a question cannot be answered with the provided information, politely state that you don't have the specific details and suggest checking the official CIC website (www.cic-cairo.edu.eg) or contacting CIC directly (Hotline: 19242)."""
+
+ROLE_INSTRUCTIONS = """**Your Role:**
+1.  Be polite, professional, and helpful.
+2.  Use *only* the information above to answer questions about CIC.
+3.  If asked about specific majors not listed (e.g., within Engineering, Business Admin, Business Tech), state that the schools exist but specific major details aren't available in your current information and recommend checking the official website or contacting admissions.
+4.  If asked for details not included (e.g., specific course content, exact current tuition fees, detailed admission grade cutoffs), state you don't have that specific information and recommend checking the official CIC website (www.cic-cairo.edu.eg) or contacting the relevant CIC department (e.g., Admissions via Hotline 19242).
+5.  Do not provide information about other universities or topics unrelated to CIC based on the provided context.
+
+**is some one asked in English answer in English, if asked in Arabic answer in Arabic and do not answer in any other langage **"""
+
+PRIMING_REPLY = "Okay, I understand. I am an AI assistant for CIC and will answer questions based *only* on the detailed information provided about CIC's programs (including specific majors where available), campuses, admission process, study options, and contact details. If I don't have the specific information requested, I will direct users to the official CIC website or contact channels."
+
 class GeminiConnector:
     _instance = None
+    _lock = threading.Lock()
     
     def __new__(cls):
         if cls._instance is None:
-            cls._instance = super(GeminiConnector, cls).__new__(cls)
-            cls._instance._initialize_api()
+            with cls._lock:
+                # Re-check under the lock so concurrent first requests build one instance
+                if cls._instance is None:
+                    instance = super(GeminiConnector, cls).__new__(cls)
+                    instance._initialize_api()
+                    cls._instance = instance
         return cls._instance
     
     def _initialize_api(self):
         """Initialize connection to Gemini API"""
         try:
             # Configure the API
-            genai.configure(api_key=GEMINI_API_KEY)
+            configure_genai()
             
-            # Define the system prompt for CIC customer support with detailed info
-            self.system_prompt = """
-            You are a helpful and friendly AI assistant for the Canadian International College (CIC) in Egypt.
-            Your goal is to answer questions accurately based *only* on the information provided below about CIC. Do not invent information or answer questions outside this scope. If a question cannot be answered with the provided information, politely state that you don't have the specific details and suggest checking the official CIC website (www.cic-cairo.edu.eg) or contacting CIC directly (Hotline: 19242).
-
-            **CIC Information (as of April 26, 2025):**
-
-            *   **About CIC:** CIC is the first provider of Canadian higher education in Egypt (since 2004). It offers programs granting both Egyptian degrees (accredited by the Ministry of Higher Education, Supreme Council of Universities, and NAQAAE) and Canadian degrees (accredited by Cape Breton University - CBU) through a Dual Program option. CIC focuses on practical and theoretical learning, equipping graduates for local and international job markets.
-            *   **Campuses:**
-                *   **New Cairo Campus:** Established in 2004. Location: Land # 6, Center Services, South of Police Academy, Fifth Settlement. Hotline: 19242. Email: info@cic-cairo.com.
-                *   **Sheikh Zayed Campus:** Established in 2012. Location: District 12, Continental Gardens, Behind El Yasmeen Resort, ElSheikh Zayed City, 6th of October. Phone: (+202) 3854-3366/7/8. Email: info.shz@cic-cairo.com.
-                *   Both campuses are smoke-free and feature state-of-the-art facilities, labs, and libraries.
-
-            *   **Academic Programs (Schools & Majors):**
-                *   **School of Engineering:** (Available at New Cairo & Sheikh Zayed)
-                    *   Offers Egyptian and Dual Program (CBU accredited) degrees.
-                    *   Focuses on balanced theory and practical learning with labs, workshops, and field trips (e.g., Orascom Telecom, Emaar).
-                    *   Graduates can apply to the Egyptian Engineers Syndicate.
-                    *   *Specific engineering majors are not listed in the provided context. State this if asked.*
-                *   **School of Mass Communication:** (Available at New Cairo & Sheikh Zayed - New Cairo link provided)
-                    *   Majors:
-                        *   Journalism and Online Publishing
-                        *   Broadcasting
-                        *   Public Relations & Advertising
-                    *   Offers Egyptian and Dual Program (CBU accredited) degrees.
-                    *   Provides practical training in well-equipped studios, workshops with industry professionals, and potential external training (e.g., DW Akademie, France 24).
-                    *   Graduates can enroll in the Egyptian Journalists Syndicate or Egyptian Media Syndicate.
-                *   **School of Business Administration:** (Available at New Cairo & Sheikh Zayed)
-                    *   Offers a flexible mix of academic studies, skills development, and practical training for a wide range of business careers.
-                    *   Includes field trips to international companies (e.g., Microsoft, Orange, Coca-Cola).
-                    *   Offers Egyptian and Dual Program (CBU accredited) degrees.
-                    *   Graduates can enroll in the Syndicate of Commercial professions.
-                    *   *Specific majors within Business Administration are not listed in the provided context. State this if asked.*
-                *   **School of Business Technology:** (Available at New Cairo & Sheikh Zayed)
-                    *   Combines fundamentals of Business Administration with Business Technology to bridge the gap between IT and Business.
-                    *   Offers Egyptian and Dual Program (CBU accredited) degrees.
-                    *   Graduates can enroll in the Syndicate of Commercial professions.
-                    *   *Specific majors within Business Technology are not listed in the provided context. State this if asked.*
-                *   **School of Computer Science:** (Established 2019, Available at New Cairo - link provided)
-                    *   Majors:
-                        *   Data Science
-                        *   Game Development
-                        *   Mobile & Cloud Computing
-                    *   Focuses on applied computer science, aligning curriculum with industry standards.
-                    *   Offers an Egyptian accredited bachelor's degree.
-                    *   Provides training courses, internships (partnerships with e.g., Ministry of Communications, Red Hat), and access to competitions (e.g., Huawei).
-
-            *   **Dual Program:** Available in Engineering, Mass Communication, Business Administration, and Business Technology. Requires meeting CBU requirements. Grants both Egyptian and Canadian (CBU) accredited degrees.
-
-            *   **Study in Canada:** Students have the opportunity to study in Canada, particularly at Cape Breton University (CBU) on Cape Breton Island, through transfer or exchange programs.
-
-            *   **Admissions:**
-                *   No early admissions. Applications occur via the governmental Tansik website (tansik.egypt.gov.eg) after high school results are available.
-                *   CIC should be listed as the first preference on Tansik.
-                *   After receiving the acceptance letter ('Tarsheeh Card') from Tansik, students must submit required documents to CIC admissions within 14 days.
-                *   An English placement test is required upon document submission.
-                *   Tuition fees must be paid after acceptance.
-                *   Minimum grade requirements are determined annually by the Ministry of Higher Education.
-                *   Admissions for the 2024/2025 academic year were set to open July 21st, 2024.
-
-            *   **Campus Life:** Vibrant campus life with social activities, events (Alumni Galas, Welcome Parties, Convocation), student clubs/teams (e.g., Football team), and workshops (e.g., Balance Gym).
-
-            *   **Resources & Support:** Library, News & Events updates, Alumni network, Student Development Office (SDO) for training/internships, Career Services, FAQs, Blog, Scholarships/Financial Aid available based on criteria.
-
-            *   **Contact:** Hotline 19242. Campus-specific emails and phone numbers (see above). Business hours generally Sunday-Thursday, 9 AM - 4 PM (subject to change).
-
-            **Your Role:**
-            1.  Be polite, professional, and helpful.
-            2.  Use *only* the information above to answer questions about CIC.
-            3.  If asked about specific majors not listed (e.g., within Engineering, Business Admin, Business Tech), state that the schools exist but specific major details aren't available in your current information and recommend checking the official website or contacting admissions.
-            4.  If asked for details not included (e.g., specific course content, exact current tuition fees, detailed admission grade cutoffs), state you don't have that specific information and recommend checking the official CIC website (www.cic-cairo.edu.eg) or contacting the relevant CIC department (e.g., Admissions via Hotline 19242).
-            5.  Do not provide information about other universities or topics unrelated to CIC based on the provided context.
-            
-            **is some one asked in English answer in English, if asked in Arabic answer in Arabic and do not answer in any other langage **
-            """
+            # Build the system prompt from the sectioned CIC knowledge base
+            self._knowledge = None
+            self._refresh_knowledge()
             
             # Initialize the model with the system prompt
             generation_config = {
@@ -105,40 +95,286 @@ class GeminiConnector:
                 generation_config=generation_config
             )
             
-            # Start the chat with our system prompt
-            self.chat_session = self.model.start_chat(
-                history=[{"role": "user", "parts": [self.system_prompt]},
-                         {"role": "model", "parts": ["Okay, I understand. I am an AI assistant for CIC and will answer questions based *only* on the detailed information provided about CIC's programs (including specific majors where available), campuses, admission process, study options, and contact details. If I don't have the specific information requested, I will direct users to the official CIC website or contact channels."]}]
+            # One token-budgeted conversation per Streamlit session
+            self.context_stats = ContextStats()
+            self.sessions = ChatSessionPool(
+                self._new_conversation,
+                max_sessions=GEMINI_SESSION_POOL_SIZE,
+                idle_ttl=GEMINI_SESSION_IDLE_TTL,
+                max_bytes=GEMINI_SESSION_POOL_MAX_BYTES
+            )
+            
+            # Deadline, retries, hedging and circuit breaking around every model call
+            self.resilience = ResilientCaller(
+                "gemini",
+                CircuitBreaker("gemini", failure_threshold=GEMINI_BREAKER_FAILURES,
+                               reset_timeout=GEMINI_BREAKER_RESET),
+                deadline=GEMINI_DEADLINE,
+                max_attempts=GEMINI_MAX_ATTEMPTS,
+                backoff_base=GEMINI_BACKOFF_BASE,
+                backoff_cap=GEMINI_BACKOFF_CAP,
+                hedging=GEMINI_HEDGING_ENABLED,
+                hedge_quantile=GEMINI_HEDGE_QUANTILE
+            )
+            
+            # Calls wait their turn here: a global cap, the quota and a rate per session
+            self.scheduler = FairScheduler(
+                max_concurrent=GEMINI_MAX_CONCURRENT,
+                global_rate=GEMINI_QUOTA_RPM / 60,
+                session_rate=GEMINI_SESSION_RPM / 60,
+                session_burst=GEMINI_SESSION_BURST,
+                queue_deadline=GEMINI_QUEUE_DEADLINE,
+                max_queued=GEMINI_QUEUE_MAX
+            )
+            
+            # Identical first questions in flight at the same time share one call
+            self.in_flight = SingleFlight()
+            
+            # Answers to first questions, invalidated when the system prompt changes
+            self.response_cache = ResponseCache(
+                max_entries=RESPONSE_CACHE_SIZE,
+                ttl=RESPONSE_CACHE_TTL,
+                namespace=self._prompt_hash()
             )
             
+            # Paraphrased first questions, shared with the other replicas through MongoDB
+            self.semantic_cache = None
+            if SEMANTIC_CACHE_ENABLED:
+                self.semantic_cache = SemanticCache(
+                    lambda: get_collection(SEMANTIC_CACHE_COLLECTION),
+                    namespace=self._prompt_hash(),
+                    threshold=SEMANTIC_CACHE_THRESHOLD,
+                    max_entries=SEMANTIC_CACHE_MAX_ENTRIES,
+                    refresh_interval=SEMANTIC_CACHE_REFRESH_INTERVAL,
+                    ttl=SEMANTIC_CACHE_TTL
+                )
+                self.semantic_cache.start()
+            
+            # Most asked questions, for caching decisions and sample questions
+            self.heavy_hitters = HeavyHitters(
+                lambda: get_collection(HEAVY_HITTERS_COLLECTION),
+                capacity=HEAVY_HITTERS_CAPACITY,
+                flush_interval=HEAVY_HITTERS_FLUSH_INTERVAL
+            ).start()
+            
+            self._register_gauges()
+            
             print("Gemini API initialized successfully with detailed CIC-specific prompt")
         except Exception as e:
             print(f"Error initializing Gemini API: {str(e)}")
             st.error(f"Failed to initialize Gemini API: {str(e)}")
     
-    def get_response(self, query):
-        """Get response from Gemini API"""
+    def _register_gauges(self):
+        """Expose pool and cache occupancy as gauges read at export time"""
+        REGISTRY.gauge("chat_sessions_active", "Chat sessions held in the pool",
+                       lambda: self.sessions.stats()["sessions"])
+        REGISTRY.gauge("chat_session_pool_bytes", "Characters of history held in the pool",
+                       lambda: self.sessions.stats()["bytes"])
+        REGISTRY.gauge("response_cache_hit_ratio", "Exact answer cache hit ratio",
+                       lambda: self.response_cache.stats()["hit_ratio"])
+        REGISTRY.gauge("gemini_calls_in_flight", "Distinct first questions being answered",
+                       lambda: self.in_flight.stats()["in_flight"])
+        REGISTRY.gauge("scheduler_queued", "Gemini calls waiting for a slot",
+                       lambda: self.scheduler.stats()["queued"])
+        REGISTRY.gauge("scheduler_slots_in_use", "Gemini calls holding a slot",
+                       lambda: self.scheduler.stats()["in_use"])
+        if self.semantic_cache is not None:
+            REGISTRY.gauge("semantic_cache_hit_ratio", "Semantic answer cache hit ratio",
+                           lambda: self.semantic_cache.stats()["hit_ratio"])
+    
+    def _prompt_hash(self):
+        """Hash of the system prompt, recomputed only when the prompt text changes"""
+        if getattr(self, "_hashed_prompt", None) is not self.system_prompt:
+            self._hashed_prompt = self.system_prompt
+            self._prompt_digest = hashlib.sha256(self.system_prompt.encode("utf-8")).hexdigest()
+        return self._prompt_digest
+    
+    def _refresh_knowledge(self):
+        """Pick up a rebuilt knowledge index and the full system prompt it implies"""
+        index = get_knowledge_index()
+        if index is not self._knowledge:
+            self._knowledge = index
+            self.system_prompt = self._build_prompt(index.full_text())
+        return index
+    
+    def _build_prompt(self, knowledge):
+        """Wrap CIC knowledge sections with the assistant's role instructions"""
+        return f"{PROMPT_INTRO}\n\n**CIC Information (as of April 26, 2025):**\n\n{knowledge}\n\n{ROLE_INSTRUCTIONS}"
+    
+    def _priming_history(self, query, context=""):
+        """Return the opening exchange that primes Gemini with the CIC knowledge relevant to `query`"""
+        knowledge = self._refresh_knowledge().select(f"{context} {query}", top_k=KNOWLEDGE_TOP_K)
+        return [{"role": "user", "parts": [self._build_prompt(knowledge)]},
+                {"role": "model", "parts": [PRIMING_REPLY]}]
+    
+    def _new_conversation(self):
+        """Start an empty conversation kept under the context token budget"""
+        return ConversationWindow(
+            self._summarize,
+            token_budget=CONTEXT_TOKEN_BUDGET,
+            keep_turns=CONTEXT_KEEP_TURNS,
+            stats=self.context_stats
+        )
+    
+    def _summarize(self, prompt):
+        """Summarize older turns of a conversation (runs off the request path, in a background slot)"""
+        def start(timeout):
+            yield self.model.generate_content(prompt, request_options={"timeout": timeout}).text
+        with self.scheduler.slot("summarizer", background=True):
+            return self.resilience.call(start, kind="summary")
+    
+    def get_response(self, query, session_id=None, on_queue=None):
+        """Get response from Gemini API within the caller's chat session"""
         try:
-            # Send the user query to Gemini
-            response = self.chat_session.send_message(query)
-            
-            # Sanitize the response to prevent Streamlit from interpreting markdown as UI components
-            response_text = response.text
-            
-            # Return the sanitized response text
-            return response_text
+            with _response_seconds.time(mode="full"):
+                return "".join(self._generate(query, session_id, stream=False, on_queue=on_queue))
         except Exception as e:
+            _gemini_errors.inc()
             print(f"Error getting response from Gemini: {str(e)}")
+            fallback = self._fallback(query, session_id)
+            if fallback is not None:
+                return fallback
             raise Exception(f"Gemini API connection error: {str(e)}")
     
-    def reset_chat(self):
-        """Reset the chat history"""
+    def get_response_stream(self, query, session_id=None, on_queue=None):
+        """Yield the Gemini response text chunk by chunk as it is generated.
+        
+        While the question waits for a free slot, `on_queue(position, eta_seconds)`
+        is called about once a second.
+        """
+        started = time.perf_counter()
+        first = True
         try:
-            # Reinitialize the chat with our system prompt
-            self.chat_session = self.model.start_chat(
-                history=[{"role": "user", "parts": [self.system_prompt]},
-                         {"role": "model", "parts": ["Okay, I understand. I am an AI assistant for CIC and will answer questions based *only* on the detailed information provided about CIC's programs (including specific majors where available), campuses, admission process, study options, and contact details. If I don't have the specific information requested, I will direct users to the official CIC website or contact channels."]}]
-            )
+            for chunk in self._generate(query, session_id, stream=True, on_queue=on_queue):
+                if first:
+                    _first_chunk_seconds.observe(time.perf_counter() - started)
+                    first = False
+                yield chunk
+            _response_seconds.observe(time.perf_counter() - started, mode="stream")
+        except Exception as e:
+            _gemini_errors.inc()
+            print(f"Error streaming response from Gemini: {str(e)}")
+            # A fallback can only replace an answer that has not started to show
+            fallback = self._fallback(query, session_id) if first else None
+            if fallback is None:
+                raise Exception(f"Gemini API connection error: {str(e)}")
+            yield fallback
+    
+    def _fallback(self, query, session_id=None):
+        """Answer a failed turn from the answer caches or the FAQ, or return None"""
+        if session_id is None:
+            session_id = current_session_id()
+        entry = self.sessions.peek(session_id)
+        # The caches hold answers to context-free first questions, which a follow-up is not
+        follow_up = entry is not None and (len(entry.conversation) > 0 or bool(entry.conversation.summary))
+        try:
+            source = "cache"
+            answer = None
+            if not follow_up:
+                answer = self.response_cache.get(normalize_query(query))
+                if answer is None and self.semantic_cache is not None:
+                    answer = self.semantic_cache.lookup(query)
+            if answer is None:
+                source = "faq"
+                faq = get_faq_index(min_score=FAQ_MIN_SCORE)
+                answer = faq.answer(query) if faq is not None else None
+        except Exception as e:
+            print(f"Error looking up a fallback answer: {str(e)}")
+            return None
+        if answer is None:
+            return None
+        _fallbacks.inc(source=source)
+        return f"{FALLBACK_NOTICE}\n\n{answer}"
+    
+    def _call_model(self, contents, stream, session_id, on_queue=None):
+        """Call Gemini in the session's turn, through the resilience layer, yielding the answer's text chunks"""
+        def start(timeout):
+            response = self.model.generate_content(contents, stream=stream, request_options={"timeout": timeout})
+            if not stream:
+                yield response.text
+                return
+            for chunk in response:
+                yield chunk.text
+        with self.scheduler.slot(session_id, on_queue):
+            yield from self.resilience.stream(start, kind="stream" if stream else "full")
+    
+    def _generate(self, query, session_id, stream, on_queue=None):
+        """Produce the answer to one turn of a session as text chunks"""
+        if session_id is None:
+            session_id = current_session_id()
+        self.heavy_hitters.record(query, session_id)
+        self._refresh_knowledge()
+        entry = self.sessions.get(session_id)
+        # Turns of one session are serialized, different sessions run in parallel
+        with entry.lock:
+            if len(entry.conversation) == 0 and not entry.conversation.summary:
+                source = self._first_turn(query, stream, session_id, on_queue)
+            else:
+                source = self._send(entry.conversation, query, stream, session_id, on_queue)
+            chunks = []
+            for text in source:
+                chunks.append(text)
+                yield text
+            response_text = "".join(chunks)
+            entry.conversation.add_turn(query, response_text)
+            entry.record_turn(query, response_text)
+        self.sessions.touch(entry)
+    
+    def _send(self, conversation, query, stream, session_id, on_queue=None):
+        """Send a follow-up question with the conversation's budgeted history"""
+        # Retrieve with the previous question too, so follow-ups like "and the fees?" keep their topic
+        previous = conversation.turns[-1][0] if conversation.turns else ""
+        contents = conversation.contents(self._priming_history(query, previous), query)
+        yield from self._call_model(contents, stream, session_id, on_queue)
+    
+    def _first_turn(self, query, stream, session_id, on_queue=None):
+        """Answer a context-free first question.
+        
+        Without history the answer only depends on the question, so it is
+        served from the exact or semantic answer caches when possible, and
+        identical questions that arrive while one is already in flight wait
+        for that call instead of sending their own.
+        """
+        key = normalize_query(query)
+        prompt_hash = self._prompt_hash()
+        self.response_cache.set_namespace(prompt_hash)
+        cached = self.response_cache.get(key)
+        if cached is None and self.semantic_cache is not None:
+            self.semantic_cache.set_namespace(prompt_hash)
+            cached = self.semantic_cache.lookup(query)
+            if cached is not None:
+                self.response_cache.put(key, cached)
+        if cached is not None:
+            yield cached
+            return
+        call, leader = self.in_flight.begin(key)
+        if not leader:
+            yield self.in_flight.wait(call)
+            return
+        chunks = []
+        try:
+            contents = self._priming_history(query) + [{"role": "user", "parts": [query]}]
+            for text in self._call_model(contents, stream, session_id, on_queue):
+                chunks.append(text)
+                yield text
+        except BaseException as e:
+            # Also release waiters when the leader's consumer stops reading early
+            error = e if isinstance(e, Exception) else RuntimeError("The original request was cancelled")
+            self.in_flight.finish(key, call, error=error)
+            raise
+        response_text = "".join(chunks)
+        self.response_cache.put(key, response_text)
+        if self.semantic_cache is not None:
+            self.semantic_cache.add(query, response_text)
+        self.in_flight.finish(key, call, result=response_text)
+    
+    def reset_chat(self, session_id=None):
+        """Reset the chat history of one session"""
+        if session_id is None:
+            session_id = current_session_id()
+        try:
+            # The next turn of this session starts a fresh conversation with our system prompt
+            self.sessions.discard(session_id)
             print("Chat session reset successfully with detailed CIC system prompt")
         except Exception as e:
             print(f"Error resetting chat: {str(e)}")
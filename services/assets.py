@@ -0,0 +1,70 @@
+import json
+import mimetypes
+import os
+
+import streamlit as st
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MANIFEST_PATH = os.path.join(ROOT, "static", "manifest.json")
+STYLESHEET_SOURCE = os.path.join(ROOT, "assets", "app.css")
+
+# Where Streamlit serves static/ when server.enableStaticServing is on
+STATIC_URL = "app/static"
+
+# Browsers pick the first format they support
+FORMAT_TYPES = {"avif": "image/avif", "webp": "image/webp", "png": "image/png", "jpeg": "image/jpeg"}
+
+# Streamlit's static route takes the Content-Type from mimetypes, which
+# does not know every image format on older Pythons
+for _suffix, _type in ((".avif", "image/avif"), (".webp", "image/webp")):
+    mimetypes.add_type(_type, _suffix)
+
+
+@st.cache_resource(show_spinner=False)
+def load_manifest():
+    """Return the manifest written by build_assets.py, or an empty one if the assets are not built"""
+    try:
+        with open(MANIFEST_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Static assets not available, serving inline fallbacks: {str(e)}")
+        return {"css": {}, "images": {}}
+
+
+@st.cache_resource(show_spinner=False)
+def stylesheet_html():
+    """Return the markup that applies the app stylesheet.
+
+    With built assets this is a one-line @import of the hashed stylesheet,
+    which the browser downloads once and then takes from its cache; the
+    inline stylesheet is only sent when the assets have not been built.
+    """
+    filename = load_manifest()["css"].get("app")
+    if filename:
+        return f'<style>@import url("{STATIC_URL}/{filename}");</style>'
+    with open(STYLESHEET_SOURCE, encoding="utf-8") as f:
+        return f"<style>\n{f.read()}</style>"
+
+
+def _srcset(files):
+    return ", ".join(f"{STATIC_URL}/{filename} {width}w"
+                     for width, filename in sorted(files.items(), key=lambda item: int(item[0])))
+
+
+def picture_html(name, alt, sizes="100vw", caption=None, lazy=True):
+    """Return a <picture> of a built image with AVIF/WebP sources, or None if it was not built"""
+    image = load_manifest()["images"].get(name)
+    if image is None:
+        return None
+    variants = image["variants"]
+    sources = "".join(f'<source type="{FORMAT_TYPES[fmt]}" srcset="{_srcset(variants[fmt])}" sizes="{sizes}">'
+                      for fmt in FORMAT_TYPES if fmt in variants and fmt != image["fallback"])
+    fallback = variants[image["fallback"]]
+    largest = max(fallback, key=int)
+    height = round(image["height"] * int(largest) / image["width"])
+    loading = ' loading="lazy"' if lazy else ""
+    html = (f'<picture>{sources}<img src="{STATIC_URL}/{fallback[largest]}" srcset="{_srcset(fallback)}" '
+            f'sizes="{sizes}" width="{largest}" height="{height}" alt="{alt}"{loading} decoding="async"></picture>')
+    if caption:
+        html += f"<figcaption>{caption}</figcaption>"
+    return f'<figure class="cic-picture">{html}</figure>'
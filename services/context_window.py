@@ -0,0 +1,145 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Summaries are produced off the request path by a small shared pool
+_summarizer_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="context-summary")
+
+SUMMARY_PROMPT = """Summarize the earlier part of a conversation between a user and the CIC assistant.
+Keep every fact the user shared about themselves and every CIC detail they asked about, in a few short sentences.
+Write the summary in the language the user wrote in.
+
+{previous}{turns}"""
+
+SUMMARY_REPLY = "Thanks, I will keep our earlier conversation in mind."
+
+
+def estimate_tokens(text):
+    """Cheap local token estimate (about four characters per token)"""
+    return max(1, len(text or "") // 4)
+
+
+class ContextStats:
+    """Process-wide counters for the tokens sent to and saved on Gemini"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.tokens_sent = 0
+        self.tokens_saved = 0
+        self.summaries = 0
+        self.summary_failures = 0
+
+    def record(self, sent, saved):
+        with self._lock:
+            self.requests += 1
+            self.tokens_sent += sent
+            self.tokens_saved += saved
+
+    def record_summary(self, ok):
+        with self._lock:
+            if ok:
+                self.summaries += 1
+            else:
+                self.summary_failures += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "tokens_sent": self.tokens_sent,
+                "tokens_saved": self.tokens_saved,
+                "summaries": self.summaries,
+                "summary_failures": self.summary_failures,
+            }
+
+
+class ConversationWindow:
+    """History of one conversation kept under a token budget.
+
+    `token_budget` caps the history (summary plus verbatim exchanges) sent
+    with each request; the priming turn with the system prompt and the last
+    `keep_turns` exchanges are always sent. Once the history passes
+    `FOLD_RATIO` of the budget, older exchanges are folded into a running
+    summary by `summarize` on a background thread. Until that summary is
+    ready the oldest exchanges are left out of the request, so a turn never
+    sends more history than the budget allows.
+    """
+
+    FOLD_RATIO = 0.75
+
+    def __init__(self, summarize, token_budget=4000, keep_turns=6, stats=None):
+        self._summarize = summarize
+        self.token_budget = token_budget
+        self.keep_turns = keep_turns
+        self.stats = stats or ContextStats()
+        self._lock = threading.Lock()
+        self.turns = []
+        self.summary = ""
+        self.folded_tokens = 0
+        self.chars = 0  # characters held, summary plus the exchanges not folded into it
+        self._summarizing = False
+
+    def __len__(self):
+        return len(self.turns)
+
+    def contents(self, priming, query):
+        """Build the request contents for the next question"""
+        with self._lock:
+            turns = list(self.turns)
+            summary = self.summary
+            folded_tokens = self.folded_tokens
+        budget = self.token_budget
+        header = []
+        if summary:
+            header = [{"role": "user", "parts": [f"Summary of our earlier conversation: {summary}"]},
+                      {"role": "model", "parts": [SUMMARY_REPLY]}]
+            budget -= estimate_tokens(summary)
+        costs = [estimate_tokens(q) + estimate_tokens(a) for q, a in turns]
+        # Leave out the oldest exchanges the budget cannot hold
+        dropped = 0
+        while len(turns) - dropped > self.keep_turns and sum(costs[dropped:]) > budget:
+            dropped += 1
+        sent = turns[dropped:]
+        history = list(priming) + header
+        for q, a in sent:
+            history.append({"role": "user", "parts": [q]})
+            history.append({"role": "model", "parts": [a]})
+        history.append({"role": "user", "parts": [query]})
+
+        sent_tokens = sum(estimate_tokens(part) for item in history for part in item["parts"])
+        saved = folded_tokens + sum(costs[:dropped]) - (estimate_tokens(summary) if summary else 0)
+        self.stats.record(sent_tokens, max(saved, 0))
+        return history
+
+    def add_turn(self, query, answer):
+        """Record a finished exchange and fold old ones when over budget"""
+        with self._lock:
+            self.turns.append((query, answer))
+            self.chars += len(query) + len(answer or "")
+            history_tokens = sum(estimate_tokens(q) + estimate_tokens(a) for q, a in self.turns)
+            if (self._summarizing or len(self.turns) <= self.keep_turns
+                    or history_tokens + estimate_tokens(self.summary) <= self.token_budget * self.FOLD_RATIO):
+                return
+            self._summarizing = True
+            folding = self.turns[:-self.keep_turns]
+            previous = self.summary
+        _summarizer_pool.submit(self._fold, previous, folding)
+
+    def _fold(self, previous, folding):
+        try:
+            lines = "\n".join(f"User: {q}\nAssistant: {a}" for q, a in folding)
+            earlier = f"Summary so far: {previous}\n\n" if previous else ""
+            summary = self._summarize(SUMMARY_PROMPT.format(previous=earlier, turns=lines)).strip()
+            with self._lock:
+                # Only append happens concurrently, so the folded turns are still at the front
+                del self.turns[:len(folding)]
+                self.chars += len(summary) - len(self.summary) - sum(len(q) + len(a or "") for q, a in folding)
+                self.summary = summary
+                self.folded_tokens += sum(estimate_tokens(q) + estimate_tokens(a) for q, a in folding)
+            self.stats.record_summary(True)
+        except Exception as e:
+            print(f"Error summarizing conversation: {str(e)}")
+            self.stats.record_summary(False)
+        finally:
+            with self._lock:
+                self._summarizing = False
@@ -0,0 +1,53 @@
+import json
+import os
+import threading
+
+from services.knowledge_index import DATA_DIR, SYNONYMS_PATH, KnowledgeIndex
+
+FAQ_PATH = os.path.join(DATA_DIR, "faq.json")
+
+
+class FaqIndex:
+    """Canned answers to common questions, served while Gemini is unavailable.
+
+    Questions are indexed with the same BM25 scoring (and Arabic synonym
+    table) as the knowledge document; a question only gets an answer when
+    its best match scores at least `min_score`.
+    """
+
+    def __init__(self, entries, synonyms=None, min_score=3.0):
+        self.min_score = min_score
+        self.answers = {entry["question"]: entry["answer"] for entry in entries}
+        text = "\n".join(f"## {question}\n{question}" for question in self.answers)
+        self._index = KnowledgeIndex(text, synonyms)
+
+    def answer(self, query):
+        """Return the canned answer that best matches `query`, or None"""
+        for question, score in self._index.scored_search(query, top_k=1):
+            if score >= self.min_score:
+                return self.answers[question]
+        return None
+
+
+_lock = threading.Lock()
+_faq = {}
+
+
+def get_faq_index(path=FAQ_PATH, synonyms_path=SYNONYMS_PATH, min_score=3.0):
+    """Return the process-wide FAQ index, or None if there is no FAQ file"""
+    if path not in _faq:
+        with _lock:
+            if path not in _faq:
+                index = None
+                try:
+                    with open(path, encoding="utf-8") as f:
+                        entries = json.load(f)
+                    synonyms = {}
+                    if os.path.exists(synonyms_path):
+                        with open(synonyms_path, encoding="utf-8") as f:
+                            synonyms = json.load(f)
+                    index = FaqIndex(entries, synonyms, min_score)
+                except (OSError, ValueError) as e:
+                    print(f"FAQ answers not available: {str(e)}")
+                _faq[path] = index
+    return _faq[path]
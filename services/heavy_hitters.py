@@ -0,0 +1,228 @@
+import os
+import socket
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+
+from services.normalize import normalize_query
+
+# Long questions are kept for display only up to this many characters
+MAX_TEXT_LENGTH = 200
+
+PERIODS = {"hour": 3600, "day": 86400}
+
+# Distinct sessions remembered per question; enough to tell one visitor repeating
+# a question from a question many visitors ask
+MAX_SESSIONS = 32
+
+
+def session_tag(session_id):
+    """Short stable tag of a session id, so raw ids are not shared through MongoDB"""
+    return format(zlib.crc32(str(session_id).encode("utf-8")), "08x")
+
+
+class SpaceSaving:
+    """Space-Saving sketch of the most frequent keys, using `capacity` counters.
+
+    A new key that arrives when every counter is taken replaces the key
+    with the smallest count and inherits that count as its error, so every
+    key seen more than total/capacity times is guaranteed to be tracked.
+    """
+
+    def __init__(self, capacity=500):
+        self.capacity = capacity
+        self.counters = {}  # key -> [count, error, text, session tags]
+
+    def add(self, key, text, weight=1, session=None):
+        counter = self.counters.get(key)
+        if counter is None:
+            if len(self.counters) < self.capacity:
+                counter = self.counters[key] = [0, 0, text, set()]
+            else:
+                evicted = min(self.counters, key=lambda k: self.counters[k][0])
+                floor = self.counters.pop(evicted)[0]
+                counter = self.counters[key] = [floor, floor, text, set()]
+        counter[0] += weight
+        if session is not None and len(counter[3]) < MAX_SESSIONS:
+            counter[3].add(session)
+
+    def items(self):
+        """Tracked keys as dicts, most frequent first"""
+        return [{"key": key, "text": text, "count": count, "error": error, "session_tags": sorted(sessions)}
+                for key, (count, error, text, sessions) in sorted(self.counters.items(), key=lambda kv: -kv[1][0])]
+
+    def __len__(self):
+        return len(self.counters)
+
+
+def merge_items(groups):
+    """Merge item lists of several sketches (windows or replicas) into one ranking.
+
+    `sessions` is the number of distinct sessions seen asking, up to MAX_SESSIONS
+    per sketch.
+    """
+    merged = {}
+    tags = {}
+    for items in groups:
+        for item in items:
+            total = merged.setdefault(item["key"], {"key": item["key"], "text": item["text"], "count": 0,
+                                                     "error": 0, "sessions": 0, "best": 0})
+            total["count"] += item["count"]
+            total["error"] += item["error"]
+            tags.setdefault(item["key"], set()).update(item.get("session_tags", ()))
+            if item["count"] > total["best"]:
+                # Show the wording of the sketch that saw the question most
+                total["best"] = item["count"]
+                total["text"] = item["text"]
+    for total in merged.values():
+        del total["best"]
+        total["sessions"] = len(tags[total["key"]])
+    return sorted(merged.values(), key=lambda item: -item["count"])
+
+
+class HeavyHitters:
+    """Most frequent normalized questions per hourly window, shared through MongoDB.
+
+    Each replica keeps one `SpaceSaving` sketch per hour for the last
+    `retention` hours, so memory stays bounded however many distinct
+    questions arrive. A background thread periodically stores each
+    replica's sketches in MongoDB (one document per replica and hour) and
+    loads the other replicas' ones; `top` merges them with the local
+    sketches without touching MongoDB itself.
+    """
+
+    def __init__(self, collection_factory, capacity=500, window=3600, retention=25, flush_interval=60):
+        self._collection_factory = collection_factory
+        self._collection = None
+        self.capacity = capacity
+        self.window = window
+        self.retention = retention
+        self.flush_interval = flush_interval
+        self.replica = f"{socket.gethostname()}:{os.getpid()}"
+        self._lock = threading.Lock()
+        self._windows = {}  # window start (epoch seconds) -> SpaceSaving
+        self._dirty = set()
+        self._shared = []  # (window start, items) of the other replicas, loaded in the background
+        self._top_cache = {}
+        self.recorded = 0
+        self.flushes = 0
+        self.flush_errors = 0
+        self._thread = None
+
+    def start(self):
+        """Start the background thread that shares the sketches through MongoDB"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="heavy-hitters", daemon=True)
+                self._thread.start()
+        return self
+
+    def _window_start(self, now=None):
+        now = time.time() if now is None else now
+        return int(now // self.window) * self.window
+
+    def record(self, query, session_id=None):
+        """Count one asked question, and the session that asked it"""
+        key = normalize_query(query)
+        if not key:
+            return
+        start = self._window_start()
+        with self._lock:
+            sketch = self._windows.get(start)
+            if sketch is None:
+                sketch = self._windows[start] = SpaceSaving(self.capacity)
+                # Forget windows that fell out of the retention period
+                for old in [w for w in self._windows if w <= start - self.retention * self.window]:
+                    del self._windows[old]
+                    self._dirty.discard(old)
+            sketch.add(key, query.strip()[:MAX_TEXT_LENGTH],
+                       session=session_tag(session_id) if session_id is not None else None)
+            self._dirty.add(start)
+            self.recorded += 1
+
+    def top(self, n=10, period="hour"):
+        """Return the `n` most asked questions of the last hour or day across replicas.
+
+        "hour" covers the current and the previous hourly window, "day" the
+        last 24 windows plus the current one. Other replicas' counts are as
+        of the last background sync, so this never waits on MongoDB.
+        Results are cached for `flush_interval` seconds, as the shared
+        sketches change no faster.
+
+        This is a reporting API: the texts are whatever users typed.
+        """
+        cached = self._top_cache.get((n, period))
+        if cached is not None and time.monotonic() - cached[0] < self.flush_interval:
+            return cached[1]
+        current = self._window_start()
+        since = current - PERIODS[period]
+        with self._lock:
+            groups = [sketch.items() for start, sketch in self._windows.items() if start >= since]
+            groups += [items for start, items in self._shared if start >= since]
+        top = merge_items(groups)[:n]
+        self._top_cache[(n, period)] = (time.monotonic(), top)
+        return top
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                if self._collection is None:
+                    collection = self._collection_factory()
+                    # Shared sketches expire once they fall out of every period
+                    collection.create_index("window", expireAfterSeconds=2 * PERIODS["day"])
+                    self._collection = collection
+                self._flush()
+                self._load_shared()
+            except Exception as e:
+                self.flush_errors += 1
+                print(f"Error syncing question counts: {str(e)}")
+
+    def _flush(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            snapshots = {start: self._windows[start].items() for start in dirty if start in self._windows}
+        try:
+            for start, items in snapshots.items():
+                self._collection.replace_one({"_id": f"{self.replica}:{start}"}, {
+                    "replica": self.replica,
+                    "window": datetime.fromtimestamp(start, tz=timezone.utc),
+                    "items": items,
+                    "updated_at": datetime.now(timezone.utc),
+                }, upsert=True)
+                dirty.discard(start)
+        finally:
+            with self._lock:
+                self._dirty |= {start for start in dirty if start in self._windows}
+        self.flushes += 1
+
+    def _load_shared(self):
+        """Fetch the other replicas' sketches of the last day"""
+        since = self._window_start() - PERIODS["day"]
+        cursor = self._collection.find({
+            "window": {"$gte": datetime.fromtimestamp(since, tz=timezone.utc)},
+            "replica": {"$ne": self.replica},
+        }, {"window": 1, "items": 1})
+        shared = []
+        for doc in cursor:
+            window = doc["window"]
+            if window.tzinfo is None:
+                window = window.replace(tzinfo=timezone.utc)
+            shared.append((window.timestamp(), doc["items"]))
+        with self._lock:
+            self._shared = shared
+
+    def stats(self):
+        """Return sketch sizes and sync counters"""
+        with self._lock:
+            tracked = sum(len(sketch) for sketch in self._windows.values())
+            windows = len(self._windows)
+        return {
+            "windows": windows,
+            "tracked": tracked,
+            "recorded": self.recorded,
+            "flushes": self.flushes,
+            "flush_errors": self.flush_errors,
+            "connected": self._collection is not None,
+        }
@@ -0,0 +1,197 @@
+import bisect
+import json
+import os
+import re
+import threading
+
+from services.normalize import normalize_query
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+KEYWORDS_PATH = os.path.join(DATA_DIR, "keywords.json")
+
+# Conjunction, preposition and article prefixes written attached to an Arabic word:
+# wa-, fa-, bi-, the article al- and its forms with wa-, bi-, fa-, ka- and li-
+ARABIC_PREFIXES = ("\u0648\u0627\u0644", "\u0628\u0627\u0644", "\u0641\u0627\u0644", "\u0643\u0627\u0644",
+                   "\u0644\u0644", "\u0627\u0644", "\u0648", "\u0641", "\u0628")
+
+# Endings that inflect an Arabic word without changing its sense here: the
+# accusative alef, the feminine teh marbuta (normalized to heh) and plurals
+ARABIC_SUFFIXES = ("\u0627", "\u0647", "\u0627\u062a", "\u064a\u0646", "\u0648\u0646")
+
+_ARABIC = re.compile("[\u0600-\u06ff]")
+
+
+def _trie_pattern(terms):
+    """A regex alternation of `terms` factored into a prefix trie.
+
+    Shared prefixes are matched once, so the pattern costs about the same
+    per character of text however many terms it holds, where a flat
+    alternation tries every term in turn. Longer terms are preferred.
+    """
+    trie = {}
+    for term in terms:
+        node = trie
+        for ch in term:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node):
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        if "" in node:
+            # A term ends here, longer ones are tried first
+            return "(?:" + "|".join(branches) + ")?"
+        return branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+
+    return build(trie)
+
+
+class KeywordMatcher:
+    """Finds whole-word occurrences of many keywords in one regex pass.
+
+    Keywords and text are compared in their `normalize_query` form, so
+    case, punctuation and Arabic spelling variants do not matter. A
+    keyword only matches as whole words ("good" is not found in
+    "goodbye"); Arabic keywords may also carry an attached prefix such
+    as wa- or al- and an inflection ending. Each keyword maps to the
+    values it was added with.
+    """
+
+    def __init__(self, terms):
+        self._values = {}
+        for term, value in terms:
+            key = normalize_query(term)
+            if key:
+                self._values.setdefault(key, []).append(value)
+        arabic = [key for key in self._values if _ARABIC.search(key)]
+        other = [key for key in self._values if not _ARABIC.search(key)]
+        alternatives = []
+        if arabic:
+            prefixes = "|".join(map(re.escape, ARABIC_PREFIXES))
+            suffixes = "|".join(map(re.escape, ARABIC_SUFFIXES))
+            alternatives.append(f"(?:{prefixes})?(?P<arabic>{_trie_pattern(arabic)})(?:{suffixes})?")
+        if other:
+            alternatives.append(f"(?P<other>{_trie_pattern(other)})")
+        self._pattern = re.compile(rf"(?<!\w)(?:{'|'.join(alternatives)})(?!\w)") if alternatives else None
+
+    def __len__(self):
+        return len(self._values)
+
+    def _matches(self, text):
+        for match in self._pattern.finditer(text):
+            yield match.start(), match.group(match.lastgroup)
+
+    def find(self, text):
+        """Return (keyword, values) for every keyword occurrence in `text`, in order"""
+        if self._pattern is None:
+            return []
+        return [(key, self._values[key]) for _, key in self._matches(normalize_query(text))]
+
+    def find_many(self, texts):
+        """Like find() for each of `texts`, scanning them all in a single pass"""
+        texts = [normalize_query(text) for text in texts]
+        results = [[] for _ in texts]
+        if self._pattern is None:
+            return results
+        # Normalized text has no newlines, so no match can span two texts
+        starts = []
+        offset = 0
+        for text in texts:
+            starts.append(offset)
+            offset += len(text) + 1
+        for start, key in self._matches("\n".join(texts)):
+            results[bisect.bisect_right(starts, start) - 1].append((key, self._values[key]))
+        return results
+
+
+class Classification:
+    """Handler type, technical keywords and sentiment of one message"""
+
+    __slots__ = ("handler", "keywords", "sentiment")
+
+    def __init__(self, handler, keywords, sentiment):
+        self.handler = handler
+        self.keywords = keywords
+        self.sentiment = sentiment
+
+    def __repr__(self):
+        return f"Classification(handler={self.handler!r}, keywords={self.keywords!r}, sentiment={self.sentiment!r})"
+
+
+class KeywordClassifier:
+    """Classifies messages with the vocabularies of data/keywords.json.
+
+    Handler keywords pick the handler type (the first listed type that
+    matches wins, "standard" otherwise), technical terms are reported by
+    their canonical English name, and sentiment compares the distinct
+    positive and negative words found. All three come from one scan.
+    """
+
+    def __init__(self, vocabulary):
+        self.vocabulary = vocabulary
+        self._handler_order = list(vocabulary.get("handlers", {}))
+        terms = []
+        for handler, words in vocabulary.get("handlers", {}).items():
+            terms += [(word, ("handler", handler)) for word in words]
+        for canonical, variants in vocabulary.get("technical_terms", {}).items():
+            terms += [(word, ("keyword", canonical)) for word in [canonical] + variants]
+        for sentiment, words in vocabulary.get("sentiment", {}).items():
+            terms += [(word, ("sentiment", sentiment)) for word in words]
+        self.matcher = KeywordMatcher(terms)
+
+    def _classification(self, matches):
+        handlers = set()
+        keywords = []
+        sentiment_words = {"positive": set(), "negative": set()}
+        for key, values in matches:
+            for kind, value in values:
+                if kind == "handler":
+                    handlers.add(value)
+                elif kind == "keyword":
+                    if value not in keywords:
+                        keywords.append(value)
+                else:
+                    sentiment_words.setdefault(value, set()).add(key)
+        handler = next((name for name in self._handler_order if name in handlers), "standard")
+        positive, negative = len(sentiment_words["positive"]), len(sentiment_words["negative"])
+        if positive > negative:
+            sentiment = "positive"
+        elif negative > positive:
+            sentiment = "negative"
+        else:
+            sentiment = "neutral"
+        return Classification(handler, keywords, sentiment)
+
+    def classify(self, text):
+        """Return the Classification of one message"""
+        return self._classification(self.matcher.find(text))
+
+    def classify_many(self, texts):
+        """Return the Classification of each of `texts`, in order"""
+        return [self._classification(matches) for matches in self.matcher.find_many(texts)]
+
+
+_cache_lock = threading.Lock()
+_cache = {"stamp": None, "classifier": None}
+
+
+def get_classifier(path=KEYWORDS_PATH):
+    """Return the process-wide classifier, recompiling it when the keywords file changes"""
+    stamp = os.stat(path).st_mtime_ns if os.path.exists(path) else None
+    if _cache["classifier"] is not None and _cache["stamp"] == stamp:
+        return _cache["classifier"]
+    with _cache_lock:
+        if _cache["classifier"] is None or _cache["stamp"] != stamp:
+            vocabulary = {}
+            try:
+                with open(path, encoding="utf-8") as f:
+                    vocabulary = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Keyword vocabularies not available: {str(e)}")
+            classifier = _cache["classifier"]
+            if classifier is None or classifier.vocabulary != vocabulary:
+                classifier = KeywordClassifier(vocabulary)
+            _cache["classifier"] = classifier
+            _cache["stamp"] = stamp
+        return _cache["classifier"]
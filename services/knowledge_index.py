@@ -0,0 +1,144 @@
+import json
+import math
+import os
+import threading
+from collections import Counter
+
+from services.normalize import normalize_query
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+KNOWLEDGE_PATH = os.path.join(DATA_DIR, "cic_knowledge.md")
+SYNONYMS_PATH = os.path.join(DATA_DIR, "knowledge_synonyms.json")
+
+# Sections sent when a question matches nothing (greetings, small talk)
+FALLBACK_SECTIONS = ("About CIC", "Contact")
+
+_STOPWORDS = frozenset("""
+a an and are as at be by can do does for from how i in is it me my of on or
+please tell that the there this to what when which who will with you your
+""".split())
+
+# Arabic prefixes: the article al- and its forms with attached wa-, bi-, fa-, ka- and li-
+_ARABIC_PREFIXES = ("\u0648\u0627\u0644", "\u0628\u0627\u0644", "\u0641\u0627\u0644", "\u0643\u0627\u0644", "\u0644\u0644", "\u0627\u0644")
+
+
+def _stem(token):
+    if token.endswith("ies") and len(token) > 4:
+        return token[:-3] + "y"
+    if token.endswith("s") and not token.endswith("ss") and len(token) > 3:
+        return token[:-1]
+    return token
+
+
+class KnowledgeIndex:
+    """BM25 index over the sections of the CIC knowledge document.
+
+    Sections are the `## ` headed blocks of the markdown file. Query terms,
+    Arabic ones in particular, are mapped onto the English vocabulary of
+    the document through a small synonym table before scoring.
+    """
+
+    def __init__(self, text, synonyms=None, k1=1.5, b=0.75):
+        self.text = text
+        self.synonyms = synonyms or {}
+        self.k1 = k1
+        self.b = b
+        self.preamble, self.sections = self._split(text)
+        self._postings = {}
+        self._lengths = []
+        for i, (title, body) in enumerate(self.sections):
+            counts = Counter(self._tokens(f"{title} {title} {body}"))
+            self._lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self._postings.setdefault(term, []).append((i, tf))
+        self._avg_length = sum(self._lengths) / max(len(self._lengths), 1)
+        n = len(self.sections)
+        self._idf = {term: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5))
+                     for term, p in self._postings.items()}
+
+    @staticmethod
+    def _split(text):
+        preamble, sections = [], []
+        for line in text.splitlines():
+            if line.startswith("## "):
+                sections.append((line[3:].strip(), []))
+            elif sections:
+                sections[-1][1].append(line)
+            elif not line.startswith(("# ", "<!--")):
+                preamble.append(line)
+        return "\n".join(preamble).strip(), [(title, "\n".join(body).strip()) for title, body in sections]
+
+    def _tokens(self, text, expand=False):
+        for token in normalize_query(text).split():
+            if token in _STOPWORDS:
+                continue
+            expansion = None
+            if expand:
+                # Map query terms (Arabic ones possibly carrying a prefix) onto the document vocabulary
+                candidates = [token] + [token[len(p):] for p in _ARABIC_PREFIXES if token.startswith(p)]
+                expansion = next((self.synonyms[c] for c in candidates if c in self.synonyms), None)
+            if expansion:
+                for term in expansion:
+                    yield _stem(term)
+            if token.isascii():
+                yield _stem(token)
+            elif not expansion:
+                yield token
+
+    def search(self, query, top_k=4):
+        """Return the titles of the `top_k` best matching sections, best first"""
+        return [title for title, _ in self.scored_search(query, top_k)]
+
+    def scored_search(self, query, top_k=4):
+        """Return (title, BM25 score) of the `top_k` best matching sections, best first"""
+        scores = {}
+        for term in set(self._tokens(query, expand=True)):
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for i, tf in self._postings[term]:
+                norm = tf + self.k1 * (1 - self.b + self.b * self._lengths[i] / self._avg_length)
+                scores[i] = scores.get(i, 0.0) + idf * tf * (self.k1 + 1) / norm
+        ranked = sorted(scores, key=scores.get, reverse=True)[:top_k]
+        return [(self.sections[i][0], scores[i]) for i in ranked]
+
+    def render(self, titles):
+        """Render the named sections (in document order) as prompt text"""
+        wanted = set(titles)
+        return "\n\n".join(f"**{title}:**\n{body}" for title, body in self.sections if title in wanted)
+
+    def select(self, query, top_k=4):
+        """Return the prompt text of the sections relevant to `query`"""
+        titles = self.search(query, top_k) or [t for t in FALLBACK_SECTIONS if t in dict(self.sections)]
+        return self.render(titles)
+
+    def full_text(self):
+        """Render every section, as sent before retrieval existed"""
+        return self.render(title for title, _ in self.sections)
+
+
+_cache_lock = threading.Lock()
+_cache = {"stamp": None, "index": None}
+
+
+def get_knowledge_index(path=KNOWLEDGE_PATH, synonyms_path=SYNONYMS_PATH):
+    """Return the process-wide index, rebuilding it when the knowledge files change"""
+    stamp = tuple((p, os.stat(p).st_mtime_ns) for p in (path, synonyms_path) if os.path.exists(p))
+    if _cache["stamp"] == stamp:
+        return _cache["index"]
+    with _cache_lock:
+        if _cache["stamp"] != stamp:
+            with open(path, encoding="utf-8") as f:
+                text = f.read()
+            synonyms = {}
+            if os.path.exists(synonyms_path):
+                with open(synonyms_path, encoding="utf-8") as f:
+                    synonyms = json.load(f)
+            index = _cache["index"]
+            # An mtime change alone (e.g. a checkout) does not warrant a rebuild
+            if index is None or index.text != text or index.synonyms != synonyms:
+                index = KnowledgeIndex(text, synonyms)
+                print(f"Built knowledge index with {len(index.sections)} sections")
+            _cache["index"] = index
+            _cache["stamp"] = stamp
+        return _cache["index"]
@@ -0,0 +1,65 @@
+import re
+import unicodedata
+
+_WHITESPACE = re.compile(r"\s+")
+
+# Arabic harakat, tanween, shadda, sukun, superscript alef and tatweel
+_ARABIC_MARKS = re.compile("[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]")
+
+# Letter variants that users type interchangeably
+_ARABIC_LETTERS = str.maketrans({
+    "\u0623": "\u0627",  # alef with hamza above -> alef
+    "\u0625": "\u0627",  # alef with hamza below -> alef
+    "\u0622": "\u0627",  # alef with madda -> alef
+    "\u0671": "\u0627",  # alef wasla -> alef
+    "\u0649": "\u064a",  # alef maksura -> yeh
+    "\u0629": "\u0647",  # teh marbuta -> heh
+    "\u0624": "\u0648",  # waw with hamza -> waw
+    "\u0626": "\u064a",  # yeh with hamza -> yeh
+})
+
+
+class _FoldTable(dict):
+    """str.translate table doing every per-character fold at once, filled in as characters are seen"""
+
+    def __missing__(self, code):
+        ch = chr(code)
+        if _ARABIC_MARKS.match(ch):
+            folded = None
+        elif code in _ARABIC_LETTERS:
+            folded = _ARABIC_LETTERS[code]
+        elif ch.isdigit():
+            folded = str(unicodedata.digit(ch))
+        elif unicodedata.category(ch)[0] in "PS":
+            folded = " "
+        else:
+            folded = code
+        self[code] = folded
+        return folded
+
+
+_FOLD = _FoldTable()
+
+
+def normalize_query(text):
+    """Reduce a user query to a canonical form used as a cache/coalescing key.
+
+    Folds case, Unicode compatibility forms (including Arabic-Indic digits),
+    punctuation and whitespace, and removes Arabic diacritics and letter
+    variants so trivially different spellings map to the same key.
+    """
+    text = unicodedata.normalize("NFKC", text or "").casefold().translate(_FOLD)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+_ARABIC_LETTER = re.compile("[\u0621-\u064a\u0671-\u06d3\u06fa-\u06ff]")
+_LATIN_LETTER = re.compile("[a-zA-Z]")
+
+
+def detect_language(text):
+    """Guess whether a query is Arabic ("ar") or English ("en") from its letters"""
+    arabic = len(_ARABIC_LETTER.findall(text or ""))
+    latin = len(_LATIN_LETTER.findall(text or ""))
+    if not arabic and not latin:
+        return "other"
+    return "ar" if arabic >= latin else "en"
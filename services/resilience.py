@@ -0,0 +1,283 @@
+import queue
+import random
+import threading
+import time
+from collections import deque
+
+from services.metrics import REGISTRY
+
+# HTTP statuses (and the SDK's exception names for them) worth another attempt
+RETRYABLE_STATUS = frozenset((408, 429, 500, 502, 503, 504))
+RETRYABLE_NAMES = frozenset((
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "InternalServerError",
+    "DeadlineExceeded", "GatewayTimeout", "BadGateway", "Aborted",
+))
+
+_attempts = REGISTRY.counter("upstream_attempts_total", "Upstream calls started, by reason")
+_outcomes = REGISTRY.counter("upstream_calls_total", "Resilient calls by outcome")
+_transitions = REGISTRY.counter("circuit_breaker_transitions_total", "Circuit breaker state changes")
+_breaker_state = REGISTRY.gauge("circuit_breaker_state", "Circuit breaker state (0 closed, 1 half-open, 2 open)")
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class DeadlineExceeded(TimeoutError):
+    """The call did not finish within its deadline"""
+
+
+class CircuitOpenError(RuntimeError):
+    """The circuit breaker is open, so the call was not attempted"""
+
+
+def is_retryable(error):
+    """Whether `error` is a transient upstream failure (rate limit, overload, timeout, network)"""
+    if isinstance(error, CircuitOpenError):
+        return False
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    code = getattr(error, "code", None)
+    if isinstance(code, int) and code in RETRYABLE_STATUS:
+        return True
+    return type(error).__name__ in RETRYABLE_NAMES
+
+
+def backoff_delay(attempt, base, cap, rng=random):
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2**attempt)]"""
+    return rng.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """Stops calling an upstream that keeps failing, and probes it again later.
+
+    After `failure_threshold` consecutive failures the breaker opens and
+    every call fails fast for `reset_timeout` seconds. It then lets up to
+    `half_open_calls` probe calls through: one success closes it, one
+    failure opens it again.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0, half_open_calls=1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_calls = half_open_calls
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+        _breaker_state.set(_STATE_VALUES[CLOSED], breaker=name)
+
+    def _transition(self, state):
+        # Called with the lock held
+        if state == self.state:
+            return
+        print(f"Circuit breaker {self.name}: {self.state} -> {state}")
+        self.state = state
+        _transitions.inc(breaker=self.name, to=state)
+        _breaker_state.set(_STATE_VALUES[state], breaker=self.name)
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+        self._probes = 0
+
+    def allow(self):
+        """Return whether a call may go ahead now"""
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._probes >= self.half_open_calls:
+                    return False
+                self._probes += 1
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._transition(CLOSED)
+
+    def release(self):
+        """Give back a half-open probe whose call ended without an outcome"""
+        with self._lock:
+            if self.state == HALF_OPEN and self._probes:
+                self._probes -= 1
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self._transition(OPEN)
+
+    def stats(self):
+        with self._lock:
+            return {"state": self.state, "failures": self.failures,
+                    "retry_in": max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+                    if self.state == OPEN else 0.0}
+
+
+class ResilientCaller:
+    """Runs upstream calls with a deadline, retries, optional hedging and a circuit breaker.
+
+    A call is a function of the remaining time returning an iterator of
+    text chunks (a whole answer is one chunk). Every attempt runs on its own thread, so a
+    stalled upstream never holds the caller past the deadline. Transient
+    failures are retried with jittered exponential backoff until the first
+    chunk has been yielded; after that, a failure is passed on, as the
+    caller has already shown part of the answer. With hedging enabled, a
+    second attempt starts when the first has not produced its first chunk
+    within the `hedge_quantile` of recent first-chunk latencies, and the
+    attempt that answers first wins.
+    """
+
+    def __init__(self, name, breaker=None, deadline=30.0, max_attempts=3, backoff_base=0.5,
+                 backoff_cap=8.0, hedging=False, hedge_quantile=0.95, hedge_min_samples=20,
+                 rng=None):
+        self.name = name
+        self.breaker = breaker or CircuitBreaker(name)
+        self.deadline = deadline
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.hedging = hedging
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self._rng = rng or random.Random()
+        self._latencies = {}  # kind -> recent first-chunk latencies in seconds
+        self._lock = threading.Lock()
+
+    def _observe(self, kind, seconds):
+        with self._lock:
+            self._latencies.setdefault(kind, deque(maxlen=512)).append(seconds)
+
+    def hedge_delay(self, kind):
+        """Seconds to wait before hedging a call of `kind`, or None while too few samples exist"""
+        with self._lock:
+            samples = sorted(self._latencies.get(kind, ()))
+        if len(samples) < self.hedge_min_samples:
+            return None
+        return samples[min(int(self.hedge_quantile * len(samples)), len(samples) - 1)]
+
+    @staticmethod
+    def _run_attempt(attempt, start, timeout, results, abandoned):
+        try:
+            for chunk in start(timeout):
+                if abandoned.is_set():
+                    return
+                results.put(("chunk", attempt, chunk))
+            results.put(("done", attempt, None))
+        except Exception as e:
+            results.put(("error", attempt, e))
+
+    def call(self, start, kind="full"):
+        """Run `start` and return the whole answer"""
+        return "".join(self.stream(start, kind))
+
+    def stream(self, start, kind="stream"):
+        """Yield the chunks of `start(timeout)`, an iterator of text chunks.
+
+        `timeout` is what is left of the deadline when the attempt starts,
+        for the client library's own request timeout.
+        """
+        if not self.breaker.allow():
+            _outcomes.inc(caller=self.name, outcome="rejected")
+            raise CircuitOpenError(f"{self.name} is unavailable, retrying in "
+                                   f"{self.breaker.stats()['retry_in']:.0f}s")
+        started = time.monotonic()
+        deadline_at = started + self.deadline
+        results = queue.Queue()
+        stops = []  # per attempt, tells its thread to stop reading
+        reasons = []  # per attempt: first, retry or hedge
+        active = set()
+        winner = None
+        retry_at = None
+        hedge_delay = self.hedge_delay(kind) if self.hedging else None
+        hedge_at = started + hedge_delay if hedge_delay is not None else None
+        settled = False
+
+        def launch(reason):
+            attempt = len(stops)
+            stops.append(threading.Event())
+            reasons.append(reason)
+            active.add(attempt)
+            _attempts.inc(caller=self.name, reason=reason)
+            timeout = max(0.0, deadline_at - time.monotonic())
+            threading.Thread(target=self._run_attempt, args=(attempt, start, timeout, results, stops[attempt]),
+                             name=f"{self.name}-attempt", daemon=True).start()
+
+        def fail(error, outcome):
+            nonlocal settled
+            settled = True
+            if is_retryable(error):
+                self.breaker.record_failure()
+            else:
+                # The upstream answered, only this request was wrong
+                self.breaker.record_success()
+            _outcomes.inc(caller=self.name, outcome=outcome)
+            raise error
+
+        launch("first")
+        try:
+            while True:
+                now = time.monotonic()
+                if now >= deadline_at:
+                    fail(DeadlineExceeded(f"{self.name} did not answer within {self.deadline:g}s"), "deadline")
+                wake_at = min(t for t in (deadline_at, retry_at, hedge_at) if t is not None)
+                try:
+                    event, attempt, value = results.get(timeout=max(0.0, wake_at - now))
+                except queue.Empty:
+                    now = time.monotonic()
+                    if retry_at is not None and now >= retry_at:
+                        retry_at = None
+                        launch("retry")
+                    if hedge_at is not None and now >= hedge_at:
+                        hedge_at = None
+                        if active and len(stops) < self.max_attempts:
+                            launch("hedge")
+                    continue
+                if winner is not None and attempt != winner:
+                    continue
+                if event == "error":
+                    active.discard(attempt)
+                    if winner is not None:
+                        # Part of the answer is already out, another attempt would repeat it
+                        fail(value, "failed_mid_stream")
+                    if active or retry_at is not None:
+                        # A hedged attempt is still running or a retry is already due
+                        continue
+                    delay = backoff_delay(len(stops) - 1, self.backoff_base, self.backoff_cap, self._rng)
+                    if (is_retryable(value) and len(stops) < self.max_attempts
+                            and time.monotonic() + delay < deadline_at):
+                        print(f"{self.name} attempt {len(stops)} failed ({str(value)}), retrying in {delay:.2f}s")
+                        retry_at = time.monotonic() + delay
+                        continue
+                    fail(value, "failed")
+                if winner is None:
+                    # The first attempt to answer wins, the others are abandoned
+                    winner = attempt
+                    hedge_at = None
+                    self._observe(kind, time.monotonic() - started)
+                    for other, stop in enumerate(stops):
+                        if other != winner:
+                            stop.set()
+                if event == "chunk":
+                    yield value
+                    continue
+                settled = True
+                self.breaker.record_success()
+                _outcomes.inc(caller=self.name, outcome="success", won_by=reasons[winner])
+                return
+        finally:
+            # Also reached when the consumer stops reading early
+            for stop in stops:
+                stop.set()
+            if not settled:
+                self.breaker.release()
+
+    def stats(self):
+        """Return the breaker state and the current hedging delays"""
+        with self._lock:
+            kinds = list(self._latencies)
+        return {"breaker": self.breaker.stats(),
+                "hedge_delay": {kind: self.hedge_delay(kind) for kind in kinds}}
@@ -0,0 +1,107 @@
+import re
+
+# One pass over the text instead of a chain of str.replace calls; braces are
+# escaped too, as Streamlit would otherwise read them in the surrounding markup
+_ESCAPES = str.maketrans({
+    "&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#39;",
+    "{": "&#123;", "}": "&#125;",
+})
+
+_FENCE = re.compile(r"^\s*```")
+_HEADING = re.compile(r"^(#{1,4})\s+(.*)$")
+_BULLET = re.compile(r"^\s*[-*+•]\s+(.*)$")
+_NUMBERED = re.compile(r"^\s*\d+[.)]\s+(.*)$")
+_CODE = re.compile(r"`([^`]+)`")
+_LINK = re.compile(r"\[([^\]]+)\]\(((?:https?://|mailto:)[^\s)]+)\)")
+_BOLD = re.compile(r"\*\*(.+?)\*\*|__(.+?)__")
+_ITALIC = re.compile(r"(?<![\w*])\*(?!\s)(.+?)(?<!\s)\*(?![\w*])|(?<!\w)_(?!\s)(.+?)(?<!\s)_(?!\w)")
+
+
+def escape_html(text):
+    """Escape text for use inside the chat bubble HTML"""
+    return text.translate(_ESCAPES)
+
+
+def _inline(text):
+    """Render inline markdown (code, links, bold, italic) of one escaped line"""
+    codes = []
+
+    def stash(match):
+        codes.append(f"<code>{match.group(1)}</code>")
+        return f"\x00{len(codes) - 1}\x00"
+
+    # Code spans are taken out first so their content is left as written
+    text = _CODE.sub(stash, text)
+    text = _LINK.sub(r'<a href="\2" target="_blank" rel="noopener noreferrer">\1</a>', text)
+    text = _BOLD.sub(lambda m: f"<strong>{m.group(1) or m.group(2)}</strong>", text)
+    text = _ITALIC.sub(lambda m: f"<em>{m.group(1) or m.group(2)}</em>", text)
+    return re.sub("\x00(\\d+)\x00", lambda m: codes[int(m.group(1))], text)
+
+
+def render_markdown(text):
+    """Render the markdown subset Gemini answers use into safe HTML.
+
+    The text is escaped before any markup is added, so the answer can never
+    inject HTML of its own; only headings, lists, code, links (http, https
+    and mailto), bold and italic are recognized. The result has no blank
+    lines, which would end Streamlit's HTML block around the chat bubble.
+    """
+    blocks = []
+    paragraph = []
+    items = None  # (tag, [item html]) of the list being built
+    code = None  # lines of the fenced code block being built
+
+    def close_paragraph():
+        if paragraph:
+            blocks.append("<p>" + "<br>".join(paragraph) + "</p>")
+            paragraph.clear()
+
+    def close_list():
+        nonlocal items
+        if items:
+            tag, entries = items
+            blocks.append(f"<{tag}>" + "".join(f"<li>{entry}</li>" for entry in entries) + f"</{tag}>")
+        items = None
+
+    for line in escape_html(text.strip()).split("\n"):
+        if code is not None:
+            if _FENCE.match(line):
+                blocks.append("<pre><code>" + "&#10;".join(code) + "</code></pre>")
+                code = None
+            else:
+                code.append(line)
+            continue
+        if _FENCE.match(line):
+            close_paragraph()
+            close_list()
+            code = []
+            continue
+        if not line.strip():
+            close_paragraph()
+            close_list()
+            continue
+        heading = _HEADING.match(line)
+        bullet = _BULLET.match(line)
+        numbered = _NUMBERED.match(line)
+        if heading:
+            close_paragraph()
+            close_list()
+            # Headings stay small inside a chat bubble
+            level = len(heading.group(1)) + 3
+            blocks.append(f"<h{min(level, 6)}>{_inline(heading.group(2))}</h{min(level, 6)}>")
+        elif bullet or numbered:
+            close_paragraph()
+            tag = "ul" if bullet else "ol"
+            if items is None or items[0] != tag:
+                close_list()
+                items = (tag, [])
+            items[1].append(_inline((bullet or numbered).group(1)))
+        else:
+            close_list()
+            paragraph.append(_inline(line.strip()))
+    if code is not None:
+        # An unterminated fence (e.g. while streaming) still shows as code
+        blocks.append("<pre><code>" + "&#10;".join(code) + "</code></pre>")
+    close_paragraph()
+    close_list()
+    return "".join(blocks)
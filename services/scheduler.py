@@ -0,0 +1,293 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+from services.metrics import REGISTRY
+
+_wait_seconds = REGISTRY.histogram("scheduler_wait_seconds", "Time a request waited for an upstream slot")
+_shed = REGISTRY.counter("scheduler_shed_total", "Requests turned away by the scheduler, by reason")
+
+# Seconds between queue position updates sent to a waiting caller
+REPORT_INTERVAL = 1.0
+
+
+class SchedulerOverloaded(RuntimeError):
+    """The request was shed because it could not be served within the queue deadline"""
+
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `burst`. A rate of 0 means unlimited."""
+
+    def __init__(self, rate, burst, now=None):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.updated = time.monotonic() if now is None else now
+
+    def refill(self, now):
+        if self.rate:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def ready(self, now):
+        self.refill(now)
+        return not self.rate or self.tokens >= 1
+
+    def take(self):
+        if self.rate:
+            self.tokens -= 1
+
+    def full(self, now):
+        self.refill(now)
+        return not self.rate or self.tokens >= self.burst
+
+    def seconds_until(self, count, now):
+        """Seconds until `count` tokens will have been available, from what is held now"""
+        if not self.rate:
+            return 0.0
+        self.refill(now)
+        return max(0.0, (count - self.tokens) / self.rate)
+
+
+class Ticket:
+    """One request waiting for, or holding, an upstream slot"""
+
+    __slots__ = ("session_id", "enqueued_at", "granted_at", "background")
+
+    def __init__(self, session_id, enqueued_at, background=False):
+        self.session_id = session_id
+        self.enqueued_at = enqueued_at
+        self.granted_at = None
+        self.background = background
+
+
+class FairScheduler:
+    """Admits upstream calls fairly across sessions, under a global cap.
+
+    At most `max_concurrent` calls run at once, and with `global_rate` set
+    at most that many start per second (the upstream quota). Each session
+    also has its own token bucket of `session_rate` calls per second with
+    bursts of `session_burst`. Waiting requests are queued per session and
+    served round-robin: each session gets one call per turn, so a session
+    sending many questions only lengthens its own queue. A session that
+    is out of tokens is skipped until its bucket refills.
+
+    A request whose estimated wait is longer than `queue_deadline`
+    seconds, or that has waited that long, is shed with
+    SchedulerOverloaded instead of piling onto an upstream that cannot
+    serve it in time.
+
+    Background requests (work nobody is waiting on, such as conversation
+    summaries) count against the global cap and quota but not against
+    any session's bucket. They only get a slot that no queued session
+    request can use.
+    """
+
+    def __init__(self, max_concurrent=8, global_rate=0.0, session_rate=0.0, session_burst=3,
+                 queue_deadline=20.0, max_queued=500, initial_service_time=2.0):
+        self.max_concurrent = max_concurrent
+        self.session_rate = session_rate
+        self.session_burst = session_burst
+        self.queue_deadline = queue_deadline
+        self.max_queued = max_queued
+        self._global = TokenBucket(global_rate, max(1.0, global_rate))
+        self._buckets = {}
+        self._queues = OrderedDict()  # session id -> deque of tickets, in round-robin order
+        self._background = deque()
+        self._queued = 0
+        self._in_use = 0
+        self._service_time = initial_service_time  # moving average of how long a slot is held
+        self._cond = threading.Condition()
+        self.granted = 0
+        self.shed = 0
+
+    def _bucket(self, session_id, now):
+        bucket = self._buckets.get(session_id)
+        if bucket is None:
+            bucket = self._buckets[session_id] = TokenBucket(self.session_rate, self.session_burst, now)
+        return bucket
+
+    def _prune(self, now):
+        # A full bucket is the same as a new one, so idle sessions need not be kept
+        if len(self._buckets) > max(64, 2 * len(self._queues)):
+            for session_id in [s for s, bucket in self._buckets.items()
+                               if s not in self._queues and bucket.full(now)]:
+                del self._buckets[session_id]
+
+    def _dispatch(self, now):
+        """Grant free slots to queued tickets, round-robin over sessions, then to background ones (lock held)"""
+        granted = False
+        while (self._in_use < self.max_concurrent and (self._queues or self._background)
+               and self._global.ready(now)):
+            ticket = self._next_ticket(now)
+            if ticket is None:
+                break
+            self._global.take()
+            self._in_use += 1
+            self.granted += 1
+            ticket.granted_at = now
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def _next_ticket(self, now):
+        """Take the ticket to serve next, or None if every queued session is out of tokens (lock held)"""
+        for session_id in self._queues:
+            bucket = self._bucket(session_id, now)
+            if bucket.ready(now):
+                bucket.take()
+                # The served session moves to the back of the ring
+                queue = self._queues.pop(session_id)
+                ticket = queue.popleft()
+                if queue:
+                    self._queues[session_id] = queue
+                self._queued -= 1
+                return ticket
+        if self._background:
+            return self._background.popleft()
+        return None
+
+    def _next_wake(self, now):
+        """Seconds until a token that could let a queued ticket through is refilled (lock held)"""
+        waits = [self._global.seconds_until(1, now)]
+        waits += [self._bucket(session_id, now).seconds_until(1, now) for session_id in self._queues]
+        return max(0.01, min(waits))
+
+    def _position(self, ticket):
+        """Number of queued tickets the round-robin order serves before `ticket` (lock held)"""
+        index = self._queues[ticket.session_id].index(ticket)
+        ahead = index
+        before = True
+        for session_id, queue in self._queues.items():
+            if session_id == ticket.session_id:
+                before = False
+            else:
+                ahead += min(len(queue), index + 1 if before else index)
+        return ahead
+
+    def _eta(self, ticket, position, now):
+        """Estimated seconds until `ticket` gets a slot (lock held)"""
+        throughput = self.max_concurrent / max(self._service_time, 1e-3)
+        if self._global.rate:
+            throughput = min(throughput, self._global.rate)
+        free = self.max_concurrent - self._in_use
+        by_slots = max(0, position + 1 - free) / throughput
+        index = self._queues[ticket.session_id].index(ticket)
+        by_session = self._bucket(ticket.session_id, now).seconds_until(index + 1, now)
+        return max(by_slots, by_session, self._global.seconds_until(position + 1, now))
+
+    def _remove(self, ticket):
+        if ticket.background:
+            self._background.remove(ticket)
+            return
+        queue = self._queues[ticket.session_id]
+        queue.remove(ticket)
+        if not queue:
+            del self._queues[ticket.session_id]
+        self._queued -= 1
+
+    def _reject(self, reason, message):
+        self.shed += 1
+        _shed.inc(reason=reason)
+        raise SchedulerOverloaded(message)
+
+    def acquire(self, session_id, on_wait=None, background=False):
+        """Wait for an upstream slot and return its ticket, for release().
+
+        `on_wait(position, eta_seconds)` is called about once a second
+        while the request is queued, on the calling thread. A
+        `background` request is served after the queued session requests
+        and is not given queue positions.
+        """
+        with self._cond:
+            now = time.monotonic()
+            if background:
+                ticket = Ticket(session_id, now, background=True)
+                self._background.append(ticket)
+            else:
+                if self._queued >= self.max_queued:
+                    self._reject("queue_full", "Too many questions are waiting, please try again in a minute")
+                ticket = Ticket(session_id, now)
+                self._queues.setdefault(session_id, deque()).append(ticket)
+                self._queued += 1
+                self._prune(now)
+            self._dispatch(now)
+            if ticket.granted_at is None and not background:
+                eta = self._eta(ticket, self._position(ticket), now)
+                if eta > self.queue_deadline:
+                    self._remove(ticket)
+                    self._reject("estimated_wait", f"Too many questions are waiting (about {eta:.0f}s), "
+                                                   f"please try again in a minute")
+        reported_at = None
+        try:
+            while True:
+                report = None
+                with self._cond:
+                    now = time.monotonic()
+                    self._dispatch(now)
+                    if ticket.granted_at is not None:
+                        break
+                    if now - ticket.enqueued_at >= self.queue_deadline:
+                        self._remove(ticket)
+                        _wait_seconds.observe(now - ticket.enqueued_at, outcome="shed")
+                        self._reject("deadline", "Waited too long for a free slot, please try again in a minute")
+                    if (on_wait is not None and not background
+                            and (reported_at is None or now - reported_at >= REPORT_INTERVAL)):
+                        position = self._position(ticket)
+                        report = (position, self._eta(ticket, position, now))
+                        reported_at = now
+                    else:
+                        self._cond.wait(min(self._next_wake(now), REPORT_INTERVAL,
+                                            ticket.enqueued_at + self.queue_deadline - now))
+                if report is not None:
+                    # Outside the lock, the callback may be slow to draw
+                    on_wait(*report)
+        except BaseException:
+            # Also Streamlit's rerun and stop exceptions, raised from on_wait when the user moves on
+            self._abandon(ticket)
+            raise
+        _wait_seconds.observe(ticket.granted_at - ticket.enqueued_at, outcome="granted")
+        return ticket
+
+    def _abandon(self, ticket):
+        """Give up a ticket whose caller stopped waiting, queued or already granted"""
+        with self._cond:
+            if ticket.granted_at is None:
+                queue = self._background if ticket.background else self._queues.get(ticket.session_id, ())
+                if ticket in queue:
+                    self._remove(ticket)
+                return
+        self.release(ticket)
+
+    def release(self, ticket):
+        """Give back the slot of a granted ticket"""
+        with self._cond:
+            now = time.monotonic()
+            held = now - ticket.granted_at
+            self._service_time += 0.2 * (held - self._service_time)
+            self._in_use -= 1
+            self._dispatch(now)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, session_id, on_wait=None, background=False):
+        """Hold an upstream slot for the duration of the block"""
+        ticket = self.acquire(session_id, on_wait, background)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def stats(self):
+        """Return queue, slot and shedding counters"""
+        with self._cond:
+            return {
+                "queued": self._queued,
+                "background_queued": len(self._background),
+                "sessions_waiting": len(self._queues),
+                "in_use": self._in_use,
+                "service_time": self._service_time,
+                "granted": self.granted,
+                "shed": self.shed,
+            }
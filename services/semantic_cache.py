@@ -0,0 +1,325 @@
+import threading
+import time
+import zlib
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from difflib import SequenceMatcher
+
+import numpy as np
+
+from services.normalize import normalize_query
+
+# Words that do not change what a question asks about (English, then Arabic)
+STOPWORDS = frozenset("""
+a about an and any are as at be by can could do does for from how i in is it me much my of on or
+please some tell that the there this to what when where which who will with would you your
+\u0645\u0627 \u0645\u0627\u0630\u0627 \u0647\u064a \u0647\u0648 \u0641\u064a \u0645\u0646 \u0639\u0646 \u0647\u0644 \u0643\u0645 \u0639\u0644\u064a \u0627\u064a\u0647
+""".split())
+
+# Spelling slips tolerated between content words of five letters or more
+TYPO_RATIO = 0.85
+
+
+def content_words(normalized):
+    """The words of a normalized query that carry its subject, plurals folded"""
+    words = set()
+    for word in normalized.split():
+        if word in STOPWORDS:
+            continue
+        if word.isascii() and word.endswith("s") and not word.endswith("ss") and len(word) > 3:
+            word = word[:-1]
+        words.add(word)
+    return words
+
+
+def _covers(words, others):
+    for word in words:
+        if word in others:
+            continue
+        if len(word) < 5 or not any(SequenceMatcher(None, word, other).ratio() >= TYPO_RATIO
+                                    for other in others):
+            return False
+    return True
+
+
+def _epoch(moment):
+    """Seconds since the epoch of a datetime, naive ones (as pymongo returns them) taken as UTC"""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+def same_subject(a, b):
+    """Whether two normalized queries name the same things.
+
+    Every content word of each must appear in the other, give or take a
+    plural or a typo, so "requirements for Engineering" never matches
+    "requirements for Business" however similar the rest of the text is.
+    """
+    words_a, words_b = content_words(a), content_words(b)
+    return bool(words_a) and bool(words_b) and _covers(words_a, words_b) and _covers(words_b, words_a)
+
+
+class HashingVectorizer:
+    """Embed text as a signed, hashed bag of character n-grams and words.
+
+    Works the same for Arabic and English, needs no model download and is
+    stable across processes (crc32 rather than Python's salted hash), so
+    vectors computed by one replica can be compared with another's.
+    """
+
+    def __init__(self, dim=512, ngram_range=(3, 4)):
+        self.dim = dim
+        self.ngram_range = ngram_range
+
+    def _features(self, text):
+        padded = f" {text} "
+        for n in range(self.ngram_range[0], self.ngram_range[1] + 1):
+            for i in range(len(padded) - n + 1):
+                yield padded[i:i + n]
+        for word in text.split():
+            yield f"w:{word}"
+
+    def transform(self, text):
+        """Return the L2-normalized float32 vector for an already normalized text"""
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in self._features(text):
+            h = zlib.crc32(feature.encode("utf-8"))
+            vector[h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        return vector
+
+
+class SemanticCache:
+    """Answer cache matched by query similarity and shared through MongoDB.
+
+    Every entry stores its query vector next to the answer. Vectors are
+    kept in an in-memory matrix so a lookup is a single matrix-vector
+    product; the matrix is loaded from MongoDB in the background at startup
+    and then refreshed incrementally with entries written by other
+    replicas. While MongoDB is unreachable the cache keeps working locally
+    and new entries are queued until it comes back.
+
+    The hashed vectors only see spelling, so a similar score alone is not
+    enough: a candidate above `threshold` is served only when it also has
+    the same content words as the query (see `same_subject`).
+
+    Entries older than `ttl` seconds are no longer served, and MongoDB
+    expires them too. Once `max_entries` are held, a new answer takes the
+    place of an expired entry or else the least recently used one.
+    """
+
+    # Candidates above the threshold checked for the same subject, best first
+    CANDIDATES = 3
+
+    def __init__(self, collection_factory, namespace, threshold=0.9, dim=512,
+                 max_entries=20000, refresh_interval=30, ttl=86400):
+        self._collection_factory = collection_factory
+        self._collection = None
+        self.vectorizer = HashingVectorizer(dim=dim)
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.refresh_interval = refresh_interval
+        self.ttl = ttl
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._pending = deque(maxlen=1000)
+        self._reset_locked()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._thread = None
+
+    def _reset_locked(self):
+        self._matrix = np.zeros((64, self.vectorizer.dim), dtype=np.float32)
+        self._used = np.zeros(64)  # when each entry was last added or served, in epoch seconds
+        self._answers = []
+        self._queries = []
+        self._added = []  # when each entry was created, in epoch seconds
+        self._keys = {}  # normalized query -> index
+        self._ids = {}  # ids of the MongoDB documents loaded or written -> their created_at
+        self._last_seen = None
+
+    def start(self):
+        """Start the background loader/refresher thread"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="semantic-cache", daemon=True)
+                self._thread.start()
+
+    def set_namespace(self, namespace):
+        """Switch namespace, dropping entries built from another system prompt"""
+        with self._lock:
+            if namespace != self.namespace:
+                self.namespace = namespace
+                self._reset_locked()
+                self._pending.clear()
+
+    def lookup(self, query):
+        """Return the cached answer most similar to `query`, or None"""
+        key = normalize_query(query)
+        vector = self.vectorizer.transform(key)
+        now = time.time()
+        with self._lock:
+            count = len(self._answers)
+            matrix = self._matrix[:count]
+            answers = self._answers
+            queries = self._queries
+            added = self._added
+        if count:
+            scores = matrix @ vector
+            best = np.argsort(scores)[::-1][:self.CANDIDATES]
+            for i in best:
+                if scores[i] < self.threshold:
+                    break
+                if added[i] < now - self.ttl or not same_subject(key, queries[i]):
+                    continue
+                # A full cache overwrites rows in place, so check the score of the entry this answer belongs to
+                if self.vectorizer.transform(queries[i]) @ vector < self.threshold:
+                    continue
+                with self._lock:
+                    self.hits += 1
+                    if self._keys.get(queries[i]) == i:
+                        self._used[i] = now
+                return answers[i]
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def add(self, query, answer):
+        """Remember an answer locally and share it with the other replicas"""
+        key = normalize_query(query)
+        vector = self.vectorizer.transform(key)
+        doc = {
+            "normalized": key,
+            "query": query,
+            "answer": answer,
+            "vector": vector.tobytes(),
+            "dim": self.vectorizer.dim,
+            "prompt_hash": self.namespace,
+            "created_at": datetime.now(timezone.utc),
+        }
+        with self._lock:
+            if not self._append_locked(key, vector, answer, _epoch(doc["created_at"])):
+                return
+            self._pending.append(doc)
+
+    def _append_locked(self, key, vector, answer, created):
+        now = time.time()
+        if created < now - self.ttl:
+            return False
+        index = self._keys.get(key)
+        if index is not None:
+            if self._added[index] >= now - self.ttl:
+                return False
+            # An expired answer to the same question is replaced by the new one
+        elif len(self._answers) >= self.max_entries:
+            # Full: take the place of an expired entry, or else of the least recently used one
+            added = np.array(self._added)
+            index = int(np.argmin(np.where(added < now - self.ttl, -np.inf, self._used[:len(added)])))
+            del self._keys[self._queries[index]]
+            self.evictions += 1
+        if index is None:
+            index = len(self._answers)
+            if index == len(self._matrix):
+                grown = np.zeros((index * 2, self.vectorizer.dim), dtype=np.float32)
+                grown[:index] = self._matrix
+                self._matrix = grown
+                self._used = np.concatenate([self._used, np.zeros(index)])
+            # Replace rather than mutate so lookups holding the old lists stay consistent
+            self._answers = self._answers + [answer]
+            self._queries = self._queries + [key]
+            self._added = self._added + [created]
+        else:
+            self._answers = self._answers[:index] + [answer] + self._answers[index + 1:]
+            self._queries = self._queries[:index] + [key] + self._queries[index + 1:]
+            self._added = self._added[:index] + [created] + self._added[index + 1:]
+        self._matrix[index] = vector
+        self._used[index] = now
+        self._keys[key] = index
+        return True
+
+    def _run(self):
+        while True:
+            try:
+                if self._collection is None:
+                    collection = self._collection_factory()
+                    self._ensure_indexes(collection)
+                    self._collection = collection
+                self._flush_pending()
+                self._refresh()
+            except Exception as e:
+                print(f"Semantic cache sync failed, serving local entries: {str(e)}")
+            time.sleep(self.refresh_interval)
+
+    def _ensure_indexes(self, collection):
+        collection.create_index([("prompt_hash", 1), ("created_at", 1)])
+        try:
+            # MongoDB deletes entries once they are too old to be served
+            collection.create_index("created_at", expireAfterSeconds=int(self.ttl))
+        except Exception as e:
+            # An index left by a different SEMANTIC_CACHE_TTL, entries are still filtered on lookup
+            print(f"Semantic cache expiry index not created: {str(e)}")
+
+    def _flush_pending(self):
+        while True:
+            with self._lock:
+                if not self._pending:
+                    return
+                doc = self._pending.popleft()
+                namespace = self.namespace
+            if doc["prompt_hash"] != namespace:
+                continue
+            try:
+                result = self._collection.insert_one(dict(doc))
+            except Exception:
+                with self._lock:
+                    # Retried on the next sync, unless the queue has filled up meanwhile
+                    if doc["prompt_hash"] == self.namespace and len(self._pending) < self._pending.maxlen:
+                        self._pending.appendleft(doc)
+                raise
+            with self._lock:
+                self._ids[result.inserted_id] = _epoch(doc["created_at"])
+
+    def _refresh(self):
+        """Load entries added since the last refresh (by any replica)"""
+        query = {"prompt_hash": self.namespace, "dim": self.vectorizer.dim}
+        if self._last_seen is not None:
+            # Overlap a little to catch writes from replicas with skewed clocks
+            query["created_at"] = {"$gte": self._last_seen - timedelta(seconds=60)}
+        else:
+            query["created_at"] = {"$gte": datetime.now(timezone.utc) - timedelta(seconds=self.ttl)}
+        cursor = self._collection.find(query, {"normalized": 1, "answer": 1, "vector": 1, "created_at": 1})
+        for doc in cursor.sort("created_at", 1):
+            vector = np.frombuffer(doc["vector"], dtype=np.float32)
+            created = _epoch(doc["created_at"])
+            with self._lock:
+                if doc["_id"] not in self._ids:
+                    self._ids[doc["_id"]] = created
+                    self._append_locked(doc["normalized"], vector, doc["answer"], created)
+                self._last_seen = doc["created_at"]
+        if self._last_seen is not None:
+            with self._lock:
+                # Documents before the overlap are never read again, so their ids need not be kept
+                horizon = _epoch(self._last_seen) - 120
+                self._ids = {doc_id: created for doc_id, created in self._ids.items() if created >= horizon}
+
+    def __len__(self):
+        with self._lock:
+            return len(self._answers)
+
+    def stats(self):
+        """Return entry, hit/miss and eviction counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._answers),
+                "pending": len(self._pending),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "connected": self._collection is not None,
+            }
@@ -0,0 +1,122 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+def current_session_id(default="default"):
+    """Return the id of the Streamlit session running the current script"""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx(suppress_warning=True)
+    except Exception:
+        ctx = None
+    return ctx.session_id if ctx is not None else default
+
+
+class SessionEntry:
+    """A pooled per-session conversation plus the lock that serializes its turns"""
+
+    def __init__(self, session_id, conversation):
+        self.session_id = session_id
+        self.conversation = conversation
+        self.lock = threading.Lock()
+        self.turns = 0
+        self.last_used = time.monotonic()
+
+    @property
+    def size(self):
+        """Characters the conversation holds now, so folding history into a summary shrinks it"""
+        return self.conversation.chars
+
+    def record_turn(self, query, response_text):
+        """Account for one completed question/answer exchange"""
+        self.turns += 1
+        self.last_used = time.monotonic()
+
+
+class ChatSessionPool:
+    """Bounded, thread-safe LRU pool of conversations keyed by session id.
+
+    Entries are evicted least-recently-used first when the pool holds more
+    than `max_sessions` entries or more than `max_bytes` characters of
+    conversation held (summaries and the exchanges not yet folded into
+    them), and whenever they sit idle for longer than `idle_ttl`
+    seconds.
+    """
+
+    def __init__(self, factory, max_sessions=500, idle_ttl=1800, max_bytes=50_000_000):
+        self._factory = factory
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_bytes = max_bytes
+        self.evictions = 0
+
+    def get(self, session_id):
+        """Return the entry for a session, creating it on first use"""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None:
+                self._entries.move_to_end(session_id)
+                entry.last_used = time.monotonic()
+                return entry
+        # Build the conversation outside the pool lock so one slow start
+        # does not block every other session
+        conversation = self._factory()
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                entry = SessionEntry(session_id, conversation)
+                self._entries[session_id] = entry
+            self._entries.move_to_end(session_id)
+            self._evict_locked(keep=session_id)
+            return entry
+
+    def peek(self, session_id):
+        """Return the entry for a session if it exists, without creating it or marking it used"""
+        with self._lock:
+            return self._entries.get(session_id)
+
+    def discard(self, session_id):
+        """Drop a session's conversation so its next turn starts fresh"""
+        with self._lock:
+            return self._entries.pop(session_id, None) is not None
+
+    def touch(self, entry):
+        """Re-run the size based eviction after an entry grew"""
+        with self._lock:
+            self._evict_locked(keep=entry.session_id)
+
+    def _evict_locked(self, keep=None):
+        now = time.monotonic()
+        total = sum(e.size for e in self._entries.values())
+        for session_id in list(self._entries):
+            if session_id == keep:
+                continue
+            entry = self._entries[session_id]
+            over_count = len(self._entries) > self.max_sessions
+            over_bytes = total > self.max_bytes
+            idle = now - entry.last_used > self.idle_ttl
+            if not (over_count or over_bytes or idle):
+                # Entries are in LRU order, so the rest are newer than this one
+                break
+            if entry.lock.locked():
+                # A turn is in flight for this session, leave it alone
+                continue
+            del self._entries[session_id]
+            total -= entry.size
+            self.evictions += 1
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def stats(self):
+        """Return pool occupancy counters"""
+        with self._lock:
+            return {
+                "sessions": len(self._entries),
+                "bytes": sum(e.size for e in self._entries.values()),
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,79 @@
+import threading
+
+
+class _Call:
+    """One upstream call that any number of identical requests wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesce identical in-flight requests into a single upstream call.
+
+    The first caller for a key becomes the leader and performs the call;
+    callers arriving while it is still running wait for and share the
+    leader's result (or exception) instead of issuing their own.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.coalesced = 0
+
+    def begin(self, key):
+        """Join the flight for `key`, returning (call, is_leader)"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced += 1
+                return call, False
+            call = _Call()
+            self._calls[key] = call
+            self.calls += 1
+            return call, True
+
+    def finish(self, key, call, result=None, error=None):
+        """Publish the leader's outcome and release every waiter"""
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        call.result = result
+        call.error = error
+        call.done.set()
+
+    def wait(self, call, timeout=None):
+        """Block until the leader finishes and return its result"""
+        if not call.done.wait(timeout):
+            raise TimeoutError("Timed out waiting for an in-flight request")
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def do(self, key, fn):
+        """Run `fn` once for all concurrent callers sharing `key`"""
+        call, leader = self.begin(key)
+        if not leader:
+            return self.wait(call)
+        try:
+            result = fn()
+        except Exception as e:
+            self.finish(key, call, error=e)
+            raise
+        self.finish(key, call, result=result)
+        return result
+
+    def stats(self):
+        """Return in-flight and coalescing counters"""
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "waiting": sum(call.waiters for call in self._calls.values()),
+                "calls": self.calls,
+                "coalesced": self.coalesced,
+            }
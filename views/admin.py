@@ -0,0 +1,68 @@
+import streamlit as st
+from datetime import datetime, timedelta, timezone
+from database.mongodb import MongoDBConnector
+from database.rollups import percentile
+
+# How far back each granularity looks by default
+RANGES = {
+    "minute": timedelta(hours=2),
+    "hour": timedelta(days=2),
+    "day": timedelta(days=60),
+}
+
+def _totals(rollups, field):
+    """Sum a nested counter (languages, handlers, latency) across rollups"""
+    totals = {}
+    for rollup in rollups:
+        for key, count in (rollup.get(field) or {}).items():
+            totals[key] = totals.get(key, 0) + count
+    return totals
+
+def _ms(bound):
+    """Chartable percentile value (the open-ended top bucket has no bound)"""
+    return None if bound in (None, float("inf")) else bound
+
+def show():
+    st.markdown('<h1 class="main-header">Traffic Dashboard</h1>', unsafe_allow_html=True)
+    st.markdown('<p class="sub-header">Chat volume, errors and response times from the pre-aggregated rollups.</p>', unsafe_allow_html=True)
+
+    granularity = st.radio("Granularity", list(RANGES), index=1, horizontal=True)
+    end = datetime.now(timezone.utc)
+    # Only the counter documents are read, never the conversations themselves
+    rollups = MongoDBConnector().get_rollups(granularity, end - RANGES[granularity], end)
+    if not rollups:
+        st.info("No traffic recorded in this period yet.")
+        return
+
+    queries = sum(r.get("queries", 0) for r in rollups)
+    errors = sum(r.get("errors", 0) for r in rollups)
+    latency = {"latency": _totals(rollups, "latency")}
+    p95 = percentile(latency, 0.95)
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Questions", f"{queries:,}")
+    col2.metric("Error rate", f"{errors / queries:.1%}" if queries else "-")
+    col3.metric("p95 response time", f"≤ {p95 / 1000:g} s" if _ms(p95) is not None else "-")
+
+    periods = [r["period"] for r in rollups]
+    st.subheader("Questions and errors")
+    st.line_chart({
+        "period": periods,
+        "questions": [r.get("queries", 0) for r in rollups],
+        "errors": [r.get("errors", 0) for r in rollups],
+    }, x="period")
+
+    st.subheader("Response time (ms, histogram bucket upper bound)")
+    st.line_chart({
+        "period": periods,
+        "p50": [_ms(percentile(r, 0.5)) for r in rollups],
+        "p95": [_ms(percentile(r, 0.95)) for r in rollups],
+    }, x="period")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.subheader("Languages")
+        st.bar_chart({"questions": _totals(rollups, "languages")})
+    with col2:
+        st.subheader("Question types")
+        st.bar_chart({"questions": _totals(rollups, "handlers")})
@@ -1,20 +1,154 @@
 import streamlit as st
+from streamlit.errors import StreamlitAPIException
 from patterns.singleton import GeminiConnector
 from patterns.factory import ResponseFactory
 from patterns.decorator import BaseResponse, TimestampDecorator, FormattingDecorator
-from patterns.observer import ChatSubject, StreamlitChatObserver, DatabaseChatObserver
+from patterns.observer import (EventBus, StreamlitChatObserver, DatabaseChatObserver,
+                               MESSAGE_RECEIVED, RESPONSE_READY, ERROR)
 from database.mongodb import MongoDBConnector
+from services.session_pool import current_session_id
+from services.normalize import detect_language, normalize_query
+from services.rich_text import escape_html, render_markdown
+from services.semantic_cache import same_subject
+from services.metrics import REGISTRY
+from config import SAMPLE_QUESTIONS_MIN_SESSIONS, CHAT_HISTORY_WINDOW
 import time
+import uuid
 
-# Initialize the chat subject and observers
-chat_subject = ChatSubject()
-streamlit_observer = StreamlitChatObserver()
-db_connector = MongoDBConnector()
-db_observer = DatabaseChatObserver(db_connector)
+_fragment_seconds = REGISTRY.histogram("fragment_run_seconds", "Time of a run of a page fragment")
 
-# Attach observers
-chat_subject.attach(streamlit_observer)
-chat_subject.attach(db_observer)
+# Shown until visitors' questions rank other curated questions higher
+DEFAULT_SAMPLE_QUESTIONS = [
+    "What programs are offered at CIC?",
+    "What are the admission requirements for Engineering?",
+    "Tell me about the New Cairo campus.",
+    "How can I apply to CIC?",
+    "What are the tuition fees?",
+    "Can I study part of my degree in Canada?",
+    "What majors are in Mass Communication?",
+    "Is there a Computer Science program?"
+]
+
+# Questions that may be offered as samples; popular ones among them are shown first.
+# Only these are ever shown, never text typed by users.
+CURATED_SAMPLE_QUESTIONS = DEFAULT_SAMPLE_QUESTIONS + [
+    "What is the Dual Program?",
+    "Are there scholarships or financial aid?",
+    "Tell me about the Sheikh Zayed campus.",
+    "How can I contact CIC?",
+    "What majors are in Business Administration?",
+    "What does the School of Engineering offer?",
+]
+
+def _sample_questions(gemini_connector, count=len(DEFAULT_SAMPLE_QUESTIONS)):
+    """Curated sample questions, those asked by the most visitors in the last day first"""
+    keys = [normalize_query(question) for question in CURATED_SAMPLE_QUESTIONS]
+    askers = [0] * len(keys)
+    heavy_hitters = getattr(gemini_connector, "heavy_hitters", None)
+    popular = heavy_hitters.top(100, "day") if heavy_hitters is not None else []
+    for item in popular:
+        # Repeats from one session count once
+        if item["sessions"] < SAMPLE_QUESTIONS_MIN_SESSIONS:
+            continue
+        for i, key in enumerate(keys):
+            if item["key"] == key or same_subject(item["key"], key):
+                askers[i] += item["sessions"]
+                break
+    # Stable, so the defaults keep their order when nothing is popular
+    order = sorted(range(len(keys)), key=lambda i: -askers[i])
+    return [CURATED_SAMPLE_QUESTIONS[i] for i in order[:count]]
+
+def _message_html(role, content):
+    """Build the chat bubble HTML for one message"""
+    if role == "assistant":
+        # Answers are rendered as markdown; render_markdown escapes the text first
+        return f'<div class="chat-message bot-message"><strong>CIC Assistant:</strong>{render_markdown(content)}</div>'
+    safe_content = escape_html(content).replace("\n", "<br>")
+    if role == "user":
+        return f'<div class="chat-message user-message"><strong>You:</strong><br>{safe_content}</div>'
+    else:
+        return f'<div class="chat-message"><strong>System:</strong><br>{safe_content}</div>'
+
+def _cached_message_html(message):
+    """Return the bubble HTML of a history entry, rendering each message only once"""
+    rendered = st.session_state.setdefault('message_html', {})
+    if 'id' not in message:
+        # Entries from before messages carried ids
+        message['id'] = uuid.uuid4().hex
+    html = rendered.get(message['id'])
+    if html is None:
+        html = rendered[message['id']] = _message_html(message.get("role", "unknown"), message.get("content", ""))
+    return html
+
+def _render_message(container, message):
+    """Render one chat history entry into the chat container"""
+    container.markdown(_cached_message_html(message), unsafe_allow_html=True)
+
+def _render_history(container):
+    """Render the latest CHAT_HISTORY_WINDOW messages as a single element.
+
+    Older messages stay behind a "load earlier" button, so a rerun costs the
+    same however long the conversation gets.
+    """
+    history = st.session_state.get('chat_history', [])
+    window = st.session_state.get('history_window', CHAT_HISTORY_WINDOW)
+    hidden = max(0, len(history) - window)
+    if hidden:
+        if container.button(f"Load earlier messages ({hidden} more)", key="load_earlier_btn", use_container_width=True):
+            st.session_state.history_window = window + CHAT_HISTORY_WINDOW
+            _rerun_panel()
+    if history:
+        container.markdown("\n".join(_cached_message_html(message) for message in history[hidden:]), unsafe_allow_html=True)
+    rendered = st.session_state.get('message_html', {})
+    if len(rendered) > len(history):
+        # Drop the HTML of messages that are gone from the history
+        ids = {message.get('id') for message in history}
+        st.session_state.message_html = {key: html for key, html in rendered.items() if key in ids}
+
+def _event_bus():
+    """Return this session's event bus, subscribing the chat observers on first use"""
+    if 'event_bus' not in st.session_state:
+        bus = EventBus(current_session_id())
+        # The history lives in the session, so it is updated on the script thread
+        bus.subscribe(StreamlitChatObserver(), sync=True)
+        # Off the request path, and made inline rather than dropped when the dispatcher is backed up
+        bus.subscribe(DatabaseChatObserver(MongoDBConnector()), RESPONSE_READY, ERROR, durable=True)
+        st.session_state.event_bus = bus
+    return st.session_state.event_bus
+
+def _answer_question(question, gemini_connector, chat_container):
+    """Add a question to the chat and stream the assistant's answer into view"""
+    if 'chat_history' not in st.session_state:
+        st.session_state.chat_history = []
+    bus = _event_bus()
+    bus.publish(MESSAGE_RECEIVED, question=question)
+    _render_message(chat_container, st.session_state.chat_history[-1])
+    
+    placeholder = chat_container.empty()
+    chunks = []
+    started = time.perf_counter()
+    turn_fields = {
+        "language": detect_language(question),
+        "handler": ResponseFactory.classify(question).handler,
+    }
+    
+    def show_queue(position, eta):
+        # Shown until the answer starts, when Gemini is busy with other questions
+        ahead = f"{position} question{'s' if position != 1 else ''} ahead of yours" if position else "You're next"
+        placeholder.markdown(_message_html("assistant", f"*Waiting for a free slot: {ahead}, about {eta:.0f}s...*"),
+                             unsafe_allow_html=True)
+
+    try:
+        # Show the answer as it arrives instead of after the whole round trip
+        for chunk in gemini_connector.get_response_stream(question, on_queue=show_queue):
+            chunks.append(chunk)
+            placeholder.markdown(_message_html("assistant", "".join(chunks) + " ▌"), unsafe_allow_html=True)
+        bus.publish(RESPONSE_READY, question=question, answer="".join(chunks),
+                    latency_ms=(time.perf_counter() - started) * 1000, **turn_fields)
+    except Exception as e:
+        bus.publish(ERROR, question=question, error=str(e),
+                    latency_ms=(time.perf_counter() - started) * 1000, **turn_fields)
+    _render_message(placeholder, st.session_state.chat_history[-1])
 
 def show():
     st.markdown('<h1 class="main-header">CIC AI Assistant</h1>', unsafe_allow_html=True)
@@ -22,44 +156,40 @@ def show():
 
     # Initialize the Gemini API connection using Singleton
     gemini_connector = GeminiConnector()
+    _chat_panel(gemini_connector)
+
+def _rerun_panel():
+    """Rerun only the chat panel, or the whole app if this run was not a fragment rerun"""
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        # The panel ran as part of a full app run, where there is no fragment to rerun
+        st.rerun()
 
+@st.fragment
+def _chat_panel(gemini_connector):
+    """Chat display, input and actions, rerun on their own when a message is sent.
+
+    Sending, sample questions and clearing the chat rerun only this
+    fragment, not app.py with its CSS, sidebar and routing.
+    """
+    with _fragment_seconds.time(fragment="chat"):
+        _chat_panel_body(gemini_connector)
+
+def _chat_panel_body(gemini_connector):
     # --- Chat Display Area ---
     # Use a dedicated container with a specific height and scrollbar
     chat_container = st.container(height=400) # Adjust height as needed
     with chat_container:
+        # Display chat history
+        _render_history(chat_container)
+
         # Check for prefilled question from home page
         prefill_question = st.session_state.pop('prefill_chat', None)
         if prefill_question and 'chat_history' in st.session_state and not any(msg['content'] == prefill_question for msg in st.session_state.chat_history if msg['role'] == 'user'):
-             # Add prefilled question as user message and get response immediately
-             user_message = {"role": "user", "content": prefill_question, "timestamp": time.time()}
-             if 'chat_history' not in st.session_state:
-                 st.session_state.chat_history = []
-             st.session_state.chat_history.append(user_message)
-             try:
-                 response_text = gemini_connector.get_response(prefill_question)
-                 bot_message = {"role": "assistant", "content": response_text, "timestamp": time.time()}
-                 st.session_state.chat_history.append(bot_message)
-                 # Optionally save to DB here if needed
-                 # db_connector.save_conversation({...})
-             except Exception as e:
-                 error_message = {"role": "assistant", "content": f"Sorry, I encountered an error processing your request: {str(e)}", "timestamp": time.time()}
-                 st.session_state.chat_history.append(error_message)
-             # No rerun here, let the normal display flow handle it
-
-        # Display chat history
-        for message in st.session_state.get('chat_history', []):
-            role = message.get("role", "unknown")
-            content = message.get("content", "")
-            # Escape content safely
-            safe_content = content.replace('<', '&lt;').replace('>', '&gt;') \
-                                  .replace('{', '&#123;').replace('}', '&#125;')
-            
-            if role == "user":
-                chat_container.markdown(f'<div class="chat-message user-message"><strong>You:</strong><br>{safe_content}</div>', unsafe_allow_html=True)
-            elif role == "assistant":
-                chat_container.markdown(f'<div class="chat-message bot-message"><strong>CIC Assistant:</strong><br>{safe_content}</div>', unsafe_allow_html=True)
-            else:
-                 chat_container.markdown(f'<div class="chat-message"><strong>System:</strong><br>{safe_content}</div>', unsafe_allow_html=True)
+             # Add prefilled question as user message and stream the response below the history
+             _answer_question(prefill_question, gemini_connector, chat_container)
+             # No rerun here, the answer is already on screen
 
     st.markdown("--- ") # Separator
 
@@ -76,92 +206,42 @@ def show():
     with col_a:
         if st.button("✨ Sample Questions", key="show_samples_btn", use_container_width=True):
             st.session_state.show_samples = not st.session_state.get('show_samples', False)
-            st.rerun()
+            _rerun_panel()
     with col_b:
         if st.button("🔄 Clear Chat", key="clear_chat_btn", use_container_width=True):
             st.session_state.chat_history = []
+            st.session_state.message_html = {}
+            st.session_state.history_window = CHAT_HISTORY_WINDOW
             gemini_connector.reset_chat()
-            st.rerun()
+            _rerun_panel()
     with col_c:
         # Add a button to go back home or to resources
         if st.button("🏠 Back to Home", key="back_home_btn", use_container_width=True):
             st.session_state.page = "Home"
+            # Changing pages needs the whole app to run again
             st.rerun()
 
     # Process user input
     if submit_button and user_input:
-        # Add user message
-        user_message = {"role": "user", "content": user_input, "timestamp": time.time()}
-        if 'chat_history' not in st.session_state:
-            st.session_state.chat_history = []
-        st.session_state.chat_history.append(user_message)
-        
-        try:
-            # Get response from Gemini API
-            response_text = gemini_connector.get_response(user_input)
-            
-            # Simplified: Use direct response for now
-            display_text = response_text
-            
-            # Add bot message
-            bot_message = {"role": "assistant", "content": display_text, "timestamp": time.time()}
-            st.session_state.chat_history.append(bot_message)
-            
-            # Store in MongoDB (Simplified)
-            db_connector.save_conversation({
-                "user_query": user_input,
-                "bot_response": display_text,
-                "timestamp": time.time()
-            })
+        _answer_question(user_input, gemini_connector, chat_container)
             
-        except Exception as e:
-            error_message = {"role": "assistant", "content": f"Sorry, I encountered an error: {str(e)}", "timestamp": time.time()}
-            st.session_state.chat_history.append(error_message)
-            
-        # Rerun to display new messages
-        st.rerun()
+        # Rerun the chat panel so the history reflects the new turn
+        _rerun_panel()
 
     # Show sample questions if requested
     if st.session_state.get('show_samples', False):
         st.markdown("--- ")
         st.subheader("Sample Questions")
-        sample_questions = [
-            "What programs are offered at CIC?",
-            "What are the admission requirements for Engineering?",
-            "Tell me about the New Cairo campus.",
-            "How can I apply to CIC?",
-            "What are the tuition fees?",
-            "Can I study part of my degree in Canada?",
-            "What majors are in Mass Communication?",
-            "Is there a Computer Science program?"
-        ]
+        sample_questions = _sample_questions(gemini_connector)
         
         cols = st.columns(2) # Display samples in two columns
         col_idx = 0
         for question in sample_questions:
             with cols[col_idx % 2]:
                 if st.button(question, key=f"sample_{question}", use_container_width=True):
-                    # Set the question as input and submit immediately
-                    user_message = {"role": "user", "content": question, "timestamp": time.time()}
-                    if 'chat_history' not in st.session_state:
-                        st.session_state.chat_history = []
-                    st.session_state.chat_history.append(user_message)
-                    
-                    try:
-                        response_text = gemini_connector.get_response(question)
-                        bot_message = {"role": "assistant", "content": response_text, "timestamp": time.time()}
-                        st.session_state.chat_history.append(bot_message)
-                        
-                        # Store in MongoDB
-                        db_connector.save_conversation({
-                            "user_query": question,
-                            "bot_response": response_text,
-                            "timestamp": time.time()
-                        })
-                    except Exception as e:
-                        error_message = {"role": "assistant", "content": f"Sorry, I encountered an error: {str(e)}", "timestamp": time.time()}
-                        st.session_state.chat_history.append(error_message)
+                    # Submit the question immediately
+                    _answer_question(question, gemini_connector, chat_container)
                     
                     st.session_state.show_samples = False # Hide samples after selection
-                    st.rerun()
+                    _rerun_panel()
             col_idx += 1
\ No newline at end of file
@@ -1,6 +1,7 @@
 import streamlit as st
 import os
 from config import COMPANY_NAME
+from services.assets import picture_html
 
 def show():
     # Define image paths
@@ -10,12 +11,17 @@ def show():
     
     st.markdown(f'<h1 class="main-header">Welcome to {COMPANY_NAME}</h1>', unsafe_allow_html=True)
     
-    # Add Cairo campus image below the title with proper path
-    if os.path.exists(cairo_img_path):
+    # Add Cairo campus image below the title, from the built assets when available
+    cairo_html = picture_html("cairo", "CIC New Cairo Campus", sizes="(max-width: 768px) 100vw, 66vw",
+                              caption="CIC New Cairo Campus", lazy=False)
+    if cairo_html or os.path.exists(cairo_img_path):
         # Increase size by adjusting column proportions - wider middle column
         col1, col2, col3 = st.columns([1, 4, 1])  # Changed from [1, 2, 1] to [1, 4, 1] to make it larger
         with col2:
-            st.image(cairo_img_path, caption="CIC New Cairo Campus", use_container_width=True)
+            if cairo_html:
+                st.markdown(cairo_html, unsafe_allow_html=True)
+            else:
+                st.image(cairo_img_path, caption="CIC New Cairo Campus", use_container_width=True)
     else:
         st.error(f"Image not found: {cairo_img_path}")
         
@@ -77,8 +83,12 @@ def show():
     st.markdown("--- ")
     col_img, col_quote = st.columns([1, 2])
     with col_img:
-        # Add Zayed campus image with proper path
-        if os.path.exists(zayed_img_path):
+        # Add Zayed campus image, from the built assets when available
+        zayed_html = picture_html("zayed", "CIC Sheikh Zayed Campus", sizes="(max-width: 768px) 100vw, 33vw",
+                                  caption="CIC Sheikh Zayed Campus")
+        if zayed_html:
+            st.markdown(zayed_html, unsafe_allow_html=True)
+        elif os.path.exists(zayed_img_path):
             st.image(zayed_img_path, caption="CIC Sheikh Zayed Campus", use_container_width=True)
         else:
             st.error(f"Image not found: {zayed_img_path}")
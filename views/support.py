@@ -81,12 +81,6 @@ def show():
                     # Save to MongoDB
                     from database.mongodb import MongoDBConnector
                     db = MongoDBConnector()
-                    db.save_conversation({
-                        "type": "contact_form",
-                        "name": name,
-                        "email": email,
-                        "subject": subject,
-                        "message": message
-                    })
+                    db.save_contact_form(name, email, subject, message)
                 else:
                     st.error("Please fill out all required fields.")
\ No newline at end of file